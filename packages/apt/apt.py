@@ -2,91 +2,278 @@
 #-*- coding:utf-8 -*-
 
 from TxtStyle import *
-import sys, bisect
+import sys
+import threading
+import traceback
+from debfiles import DpkgStatus, iter_records, read_disk_usage
+from pkgindex import SearchIndex, RecordCache, PackageNames, BitSet, PrefixTable, mark_installed, find_upgradable
+from output import LineAssembler, parse_status
+from jobs import Job, Scheduler, PENDING, RUNNING, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from basket import Basket, INSTALL, REMOVE, PURGE
+from snapshot import load_snapshot, save_snapshot, diff_names
+from depgraph import DependencyIndex, InstalledGraph, preview
+from history import HistoryIndex
+from facets import FacetIndex, FACETS, INSTALLED
+from verify import Verification
+from fileindex import FileIndex, iter_package_files
+from metastore import PackageStore
+from procctl import command, report_file, read_report, format_usage, INTERACTIVE, BACKGROUND, MAINTENANCE
+from busyanim import BusyAnimation
 
-# a rotating "i am busy" widget to be shown during network io
-class BusyAnimation(QWidget):
-    expired = pyqtSignal()
+# runs a function in a worker thread and delivers its result in the
+# GUI thread. The function must not touch any widget
+class BackgroundCall(QObject):
+    finished = pyqtSignal(object)
+
+    def __init__(self, function, parent=None):
+        super(BackgroundCall, self).__init__(parent)
+        self.function = function
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        # the signal is queued to the thread of the receiver
+        try:
+            result = self.function()
+        except Exception:
+            traceback.print_exc()
+            result = None
+        self.finished.emit(result)
+
+# runs the latest request of a function in a worker thread, one at a
+# time. A request made while one runs replaces the one waiting, only the
+# result of the latest request is delivered
+class LatestCall(QObject):
+    finished = pyqtSignal(object)
+    idle = pyqtSignal()
+
+    def __init__(self, function, parent=None):
+        super(LatestCall, self).__init__(parent)
+        self.function = function
+        self.call = None
+        self.args = None
+
+    def request(self, *args):
+        self.args = args
+        if self.call == None:
+            self.start()
+
+    def cancel(self):
+        # the running call finishes but its result is dropped
+        self.args = None
+
+    def isRunning(self):
+        return self.call != None
+
+    def start(self):
+        args = self.args
+        self.call = BackgroundCall(lambda: self.function(*args), self)
+        self.call.finished.connect(lambda result: self.callFinished(args, result))
+        self.call.start()
+
+    def callFinished(self, args, result):
+        self.call.deleteLater()
+        self.call = None
+        if self.args is not args:
+            # requested again or cancelled meanwhile
+            if self.args != None:
+                self.start()
+                return
+        else:
+            self.args = None
+            self.finished.emit(result)
+        self.idle.emit()
+
+# a human readable size of a number of bytes
+def sizeText(size):
+    for unit in [ "B", "kB", "MB" ]:
+        if size < 1000:
+            return "{0:.0f} {1}".format(size, unit)
+        size /= 1000.0
+    return "{0:.1f} GB".format(size)
+
+# a model providing the package names on demand. The names are kept in
+# one compact sequence, the installed state in a bit set. If a basket
+# is set each row gets a check box to mark the package for a change
+class PacketListModel(QAbstractListModel):
+    icons = None
+    marked = pyqtSignal()
 
     def __init__(self, parent=None):
-        super(BusyAnimation, self).__init__(parent)
+        super(PacketListModel, self).__init__(parent)
+        self.names = PackageNames.from_names([])
+        self.installed = BitSet()
+        self.details = None
+        self.basket = None
+        self.prefixes = None
 
-        self.resize(64, 64)
-        self.move(QPoint(parent.width()/2-32, parent.height()/2-32))
+        # all rows share the same two icons
+        if PacketListModel.icons == None:
+            pix = QPixmap(16, 16)
+            pix.fill(Qt.transparent);
+            PacketListModel.icons = ( QIcon(pix),
+                QIcon(os.path.join(os.path.dirname(os.path.realpath(__file__)), "installed.png")) )
 
-        self.step = 0
-        self.percent = None
+    def setPacketList(self, names, installed, details=None):
+        self.beginResetModel()
+        self.names = names
+        self.installed = mark_installed(BitSet(len(names)), names, installed)
+        # optional text shown below each name
+        self.details = details
+        self.prefixes = None
+        self.endResetModel()
 
-        # animate at 5 frames/sec
-        self.atimer = QTimer(self)
-        self.atimer.timeout.connect(self.animate)
-        self.atimer.start(200)
+    def addPackets(self, names, installed, details=None):
+        if len(names) == 0:
+            return
+        first = len(self.names)
+        self.beginInsertRows(QModelIndex(), first, first + len(names) - 1)
+        if not isinstance(self.names, list):
+            self.names = list(self.names)
+        self.names.extend(names)
+        if self.details != None:
+            # every row needs a detail line
+            if not isinstance(self.details, list):
+                self.details = list(self.details)
+            self.details.extend(details if details != None else [ "" ] * len(names))
+        self.installed.resize(len(self.names))
+        mark_installed(self.installed, names, installed, first)
+        self.prefixes = None
+        self.endInsertRows()
 
-        # create small circle bitmaps for animation
-        self.dark = self.draw(16, QColor("#808080"))
-        self.bright = self.draw(16, QColor("#fcce04"))
-        
-    def progress(self, perc):
-        self.percent = perc
-        self.repaint()
-    
-    def draw(self, size, color):
-        img = QImage(size, size, QImage.Format_ARGB32)
-        img.fill(Qt.transparent)
-
-        painter = QPainter(img)
-        painter.setPen(Qt.white)
-        painter.setRenderHint(QPainter.Antialiasing, True)
-        painter.setBrush(QBrush(color))
-        painter.drawEllipse(0, 0, img.width()-1, img.height()-1)
-        painter.end()
+    def name(self, row):
+        return self.names[row]
 
-        return img
+    def prefixTable(self):
+        # built once per list when the letter bar needs it
+        if self.prefixes == None:
+            self.prefixes = PrefixTable(self.names)
+        return self.prefixes
 
-    def animate(self):
-        self.step += 45
-        self.repaint()
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.names)
 
-    def close(self):
-        self.atimer.stop()
-        super(BusyAnimation, self).close()
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            if self.details != None:
+                return self.names[index.row()] + "\n" + self.details[index.row()]
+            return self.names[index.row()]
+        if role == Qt.DecorationRole:
+            return self.icons[index.row() in self.installed]
+        if role == Qt.CheckStateRole and self.basket != None:
+            if self.names[index.row()] in self.basket:
+                return Qt.Checked
+            return Qt.Unchecked
+        return None
 
-    def paintEvent(self, event):
-        self.move(QPoint(self.parent().width()/2-32, self.parent().height()/2-32))
-        
-        radius = min(self.width(), self.height())/2 - 16
-        painter = QPainter()
-        painter.begin(self)
-
-        if self.percent != None:
-            font = painter.font()
-            # half the size than the current font size 
-            if font.pointSize() < 0:
-                font.setPixelSize(font.pixelSize() / 3)
-            else:
-                font.setPointSize(font.pointSize() / 3)
-            # set the modified font to the painter */
-            painter.setFont(font)
+    def flags(self, index):
+        flags = super(PacketListModel, self).flags(index)
+        if self.basket != None:
+            flags |= Qt.ItemIsUserCheckable
+        return flags
 
-            # draw text in center
-            painter.drawText(QRect(0, 0, self.width(), self.height()), Qt.AlignCenter, str(self.percent)+"%" )
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.CheckStateRole or self.basket == None or not index.isValid():
+            return False
+        row = index.row()
+        self.basket.toggle(self.names[row], row in self.installed)
+        self.dataChanged.emit(index, index)
+        self.marked.emit()
+        return True
 
-        painter.setRenderHint(QPainter.Antialiasing)
+# a bar at the right edge of a package list to jump to the packages
+# starting with a letter. Sliding over it jumps on the fly, tapping a
+# letter shows the two letter prefixes starting with it and tapping the
+# letter again goes back to all letters
+class LetterBar(QWidget):
+    jump = pyqtSignal(str)
 
-        painter.translate(self.width()/2, self.height()/2)
-        painter.rotate(45)
-        painter.rotate(self.step)
-        painter.drawImage(0,radius, self.bright)
-        for i in range(7):
-            painter.rotate(45)
-            painter.drawImage(0,radius, self.dark)
+    WIDTH = 32
+
+    def __init__(self, parent):
+        super(LetterBar, self).__init__(parent)
+        self.table = None
+        self.letter = ""
+        self.entries = [ ]
+        self.pressed = None
+        self.current = None
 
+    def setTable(self, table):
+        self.table = table
+        self.letter = ""
+        self.updateEntries()
+
+    def updateEntries(self):
+        self.entries = [ ]
+        if self.table != None:
+            if self.letter != "":
+                self.entries.append(self.letter)
+            self.entries.extend(self.table.prefixes(self.letter))
+        self.update()
+
+    def entryAt(self, y):
+        if len(self.entries) == 0:
+            return None
+        i = y * len(self.entries) // max(self.height(), 1)
+        return self.entries[min(max(i, 0), len(self.entries)-1)]
+
+    def mousePressEvent(self, event):
+        self.pressed = self.entryAt(event.pos().y())
+        self.current = self.pressed
+        if self.current != None:
+            self.jump.emit(self.current)
+
+    def mouseMoveEvent(self, event):
+        entry = self.entryAt(event.pos().y())
+        if entry != None and entry != self.current:
+            self.current = entry
+            self.jump.emit(entry)
+
+    def mouseReleaseEvent(self, event):
+        entry = self.entryAt(event.pos().y())
+        if entry != None and entry == self.pressed and len(entry) == 1:
+            # a tap on a letter, not a slide
+            self.letter = "" if entry == self.letter else entry
+            self.updateEntries()
+        self.pressed = None
+
+    def paintEvent(self, event):
+        if len(self.entries) == 0:
+            return
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(0, 0, 0, 48))
+        step = self.height() / len(self.entries)
+        font = painter.font()
+        font.setPixelSize(max(min(int(step * 0.8), 16), 6))
+        painter.setFont(font)
+        for i, entry in enumerate(self.entries):
+            if entry == self.letter:
+                painter.setPen(QColor("#fcce04"))
+            else:
+                painter.setPen(Qt.white)
+            painter.drawText(QRectF(0, i * step, self.width(), step), Qt.AlignCenter, entry)
         painter.end()
 
 class PacketListView(QListView):
 
     
     select = pyqtSignal(str)
+    visible = pyqtSignal(list)
+    marked = pyqtSignal()
+
+    # taps this close to the left edge of a row toggle its check box
+    # instead of opening the package
+    MARK_WIDTH = 40
+
+    # shorter lists are scrolled without the letter bar
+    LETTERS_MIN_ROWS = 50
     
     style = ( "font-size: 20px;"
               "background: #5c96cc;"
@@ -95,7 +282,7 @@ class PacketListView(QListView):
         
     def __init__(self, parent):
         super(PacketListView, self).__init__(parent)
-        self.model = QStandardItemModel()
+        self.model = PacketListModel(self)
         self.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.setModel(self.model)
         self.setStyleSheet(self.style)
@@ -104,31 +291,259 @@ class PacketListView(QListView):
         self.setLayoutMode( QListWidget.Batched );
         self.setBatchSize( 10 );
         self.clicked.connect(self.onClick)       
+        self.model.marked.connect(self.marked)
+        self.pressPos = None
 
-    def setPacketList(self, names, installed):
-        icon = QIcon(os.path.join(os.path.dirname(os.path.realpath(__file__)), "installed.png"))
-        pix = QPixmap(16, 16)
-        pix.fill(Qt.transparent);
-        noicn = QIcon(pix)
-
-        for n in names:
-            # use bisect on the sorted list since a regular "in" operation
-            # would be way too slow
-            index = bisect.bisect_left(installed, n)
-            if index > len(installed)-1 or installed[index] != n:            
-                self.model.appendRow(QStandardItem(noicn, n))
-            else:
-                self.model.appendRow(QStandardItem(icon, n))
-                
-        # with QStringListModel:
-        # self.model.setStringList(names)
+        # report the visible packages once scrolling stopped
+        self.scrollTimer = QTimer(self)
+        self.scrollTimer.setSingleShot(True)
+        self.scrollTimer.timeout.connect(self.emitVisible)
+        self.verticalScrollBar().valueChanged.connect(self.onScroll)
+
+        self.letters = LetterBar(self)
+        self.letters.jump.connect(self.jumpTo)
+        self.letters.hide()
+
+    def setPacketList(self, names, installed, details=None):
+        self.model.setPacketList(names, installed, details)
+        self.updateLetters()
+        self.onScroll()
+
+    def addPackets(self, names, installed, details=None):
+        self.model.addPackets(names, installed, details)
+        self.updateLetters()
+        self.onScroll()
+
+    def updateLetters(self):
+        if self.model.rowCount() < self.LETTERS_MIN_ROWS:
+            self.letters.setTable(None)
+            self.letters.hide()
+            self.setViewportMargins(0, 0, 0, 0)
+            return
+        self.letters.setTable(self.model.prefixTable())
+        self.setViewportMargins(0, 0, LetterBar.WIDTH, 0)
+        self.placeLetters()
+        self.letters.show()
+
+    def resizeEvent(self, event):
+        super(PacketListView, self).resizeEvent(event)
+        self.placeLetters()
+
+    def placeLetters(self):
+        # right of the rows, left of the scroll bar
+        rect = self.viewport().geometry()
+        self.letters.setGeometry(rect.right() + 1, rect.top(), LetterBar.WIDTH, rect.height())
+
+    def jumpTo(self, prefix):
+        rows = self.model.rowCount()
+        if rows == 0:
+            return
+        row = min(self.model.prefixTable().find(prefix), rows-1)
+        self.scrollTo(self.model.index(row), QAbstractItemView.PositionAtTop)
+
+    def setBasket(self, basket):
+        self.model.beginResetModel()
+        self.model.basket = basket
+        self.model.endResetModel()
+
+    def mousePressEvent(self, event):
+        self.pressPos = event.pos()
+        super(PacketListView, self).mousePressEvent(event)
+
+    def onScroll(self):
+        self.scrollTimer.start(250)
+
+    def emitVisible(self):
+        first = self.indexAt(QPoint(0, 0)).row()
+        if first < 0:
+            return
+        last = self.indexAt(QPoint(0, self.viewport().height()-1)).row()
+        if last < 0:
+            last = self.model.rowCount()-1
+        self.visible.emit([ self.model.name(r) for r in range(first, last+1) ])
             
     def onClick(self, index):
-        self.select.emit(self.model.data(index,0))
+        # the check box itself is handled by the model
+        if (self.model.basket != None and self.pressPos != None and
+            self.pressPos.x() - self.visualRect(index).left() < self.MARK_WIDTH):
+            return
+        self.select.emit(self.model.name(index.row()))
         
+# a package list which can be narrowed down by section, priority,
+# architecture and installed state. Each choice shows the number of
+# packages it leaves
+class FacetWidget(QWidget):
+    select = pyqtSignal(str)
+    visible = pyqtSignal(list)
+    marked = pyqtSignal()
+
+    def __init__(self, facets, installed, parent=None):
+        super(FacetWidget, self).__init__(parent)
+        self.facets = facets
+        self.installed = installed
+
+        vbox = QVBoxLayout()
+        self.setLayout(vbox)
+        vbox.setContentsMargins(0,0,0,0)
+        vbox.setSpacing(0)
+
+        # one combobox per facet, the values of each are kept in a
+        # list with None for "all"
+        self.combos = [ ]
+        self.values = { }
+        for facet in FACETS + (INSTALLED,):
+            combo = QComboBox(self)
+            combo.activated[int].connect(self.onFilter)
+            vbox.addWidget(combo)
+            self.combos.append((facet, combo))
+            self.values[facet] = [ None ]
+
+        self.list = PacketListView(self)
+        self.list.select.connect(self.select)
+        self.list.visible.connect(self.visible)
+        self.list.marked.connect(self.marked)
+        vbox.addWidget(self.list)
+
+        self.onFilter()
+
+    def setBasket(self, basket):
+        self.list.setBasket(basket)
+
+    def filters(self):
+        filters = { }
+        for facet, combo in self.combos:
+            if combo.currentIndex() > 0:
+                filters[facet] = self.values[facet][combo.currentIndex()]
+        return filters
+
+    def onFilter(self, index=None):
+        filters = self.filters()
+        names = self.facets.names()
+        rows = self.facets.select(filters, self.installed)
+        if rows == None:
+            self.list.setPacketList(names, self.installed)
+        else:
+            self.list.setPacketList([ names[r] for r in rows ], self.installed)
+
+        # the counts of each facet depend on the choices of the others
+        for facet, combo in self.combos:
+            others = dict((f, v) for f, v in filters.items() if f != facet)
+            rows = self.facets.select(others, self.installed)
+            counts = self.facets.counts(facet, rows, self.installed)
+            total = len(names) if rows == None else len(rows)
+            current = filters.get(facet)
+            combo.clear()
+            combo.addItem("All " + facet.lower() + " (" + str(total) + ")")
+            self.values[facet] = [ None ]
+            for value, count in counts:
+                combo.addItem(value + " (" + str(count) + ")")
+                self.values[facet].append(value)
+            if current != None and current not in self.values[facet]:
+                combo.addItem(current + " (0)")
+                self.values[facet].append(current)
+            combo.setCurrentIndex(self.values[facet].index(current))
+
+# a model reading the apt history page by page while the user scrolls
+class HistoryModel(QAbstractListModel):
+    PAGE_SIZE = 50
+
+    def __init__(self, history, parent=None):
+        super(HistoryModel, self).__init__(parent)
+        self.history = history
+        self.transactions = []
+
+    def transaction(self, row):
+        return self.transactions[row]
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.transactions)
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and len(self.transactions) < len(self.history)
+
+    def fetchMore(self, parent):
+        page = self.history.page(len(self.transactions), self.PAGE_SIZE)
+        if len(page) == 0:
+            return
+        first = len(self.transactions)
+        self.beginInsertRows(QModelIndex(), first, first + len(page) - 1)
+        self.transactions.extend(page)
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        t = self.transactions[index.row()]
+        changes = ", ".join(action + ": " + str(len(packages)) for action, packages in t.changes)
+        return " ".join(t.start.split()) + "  " + changes + "\n" + t.command
+
+class HistoryView(QListView):
+    select = pyqtSignal(object)
+
+    def __init__(self, history, parent):
+        super(HistoryView, self).__init__(parent)
+        self.model = HistoryModel(history, self)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.setModel(self.model)
+        self.setStyleSheet(PacketListView.style)
+        self.setAlternatingRowColors(True)
+        self.setUniformItemSizes(True)
+        self.clicked.connect(self.onClick)
+
+    def onClick(self, index):
+        self.select.emit(self.model.transaction(index.row()))
+
+class HistoryDialog(TouchDialog):
+    def __init__(self, transaction, parent):
+        TouchDialog.__init__(self, "History", parent)
+        self.text = QTextEdit()
+        self.text.setReadOnly(True)
+        t = transaction
+        self.text.append('<h3><font color="#fcce04">' + t.start + '</font></h3>' + t.command)
+        if t.requested_by != "":
+            self.text.append("Requested by " + t.requested_by)
+        for action, packages in t.changes:
+            self.text.append('<h3><font color="#fcce04">' + action + '</font></h3>' +
+                             "<br/>".join(name + " (" + versions + ")" for name, versions in packages))
+        if t.error != "":
+            self.text.append("<font color='red'><b>" + t.error + "</b></font>")
+        self.text.moveCursor(QTextCursor.Start)
+        self.setCentralWidget(self.text)
+
+# the files installed by a package. The list is read in chunks so the
+# dialog shows up at once even for packages with thousands of files
+class FilesDialog(TouchDialog):
+    def __init__(self, pkgname, parent):
+        TouchDialog.__init__(self, "Files", parent)
+        self.text = QPlainTextEdit()
+        self.text.setReadOnly(True)
+        self.setCentralWidget(self.text)
+        self.count = 0
+        self.chunks = iter_package_files(pkgname)
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.addChunk)
+        self.timer.start(0)
+
+    def addChunk(self):
+        chunk = next(self.chunks, None)
+        if chunk == None:
+            self.timer.stop()
+            if self.count == 0:
+                self.text.setPlainText("The package is not installed.")
+            return
+        self.count += len(chunk)
+        self.text.appendPlainText("\n".join(chunk))
+        if self.count == len(chunk):
+            self.text.moveCursor(QTextCursor.Start)
+
 class SearchWidget(QWidget):
     request = pyqtSignal(str)
+    query = pyqtSignal(str)
     select = pyqtSignal(str)
+    visible = pyqtSignal(list)
+    marked = pyqtSignal()
 
     def __init__(self, parent=None):
         super(SearchWidget, self).__init__(parent)
@@ -144,6 +559,7 @@ class SearchWidget(QWidget):
         hbox.setContentsMargins(0,0,0,0)
 
         self.lineEdit = QLineEdit(self)
+        self.lineEdit.textChanged.connect(self.onTextChanged)
         hbox.addWidget(self.lineEdit)
         searchBut = QPushButton("Go", self)
         searchBut.clicked.connect(self.doSearch)
@@ -152,24 +568,52 @@ class SearchWidget(QWidget):
         vbox.addWidget(searchBox)
         self.searchResults = PacketListView(self)
         self.searchResults.select.connect(self.onSelect)
+        self.searchResults.visible.connect(self.visible)
+        self.searchResults.marked.connect(self.marked)
         vbox.addWidget(self.searchResults)
 
+        # query the local index while the user types, a timer
+        # coalesces fast keystrokes
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.doQuery)
+
     def onSelect(self, pkgname):
         self.select.emit(pkgname)
+
+    def onTextChanged(self, text):
+        self.timer.start(100)
+
+    def doQuery(self):
+        self.query.emit(self.lineEdit.text())
         
     def doSearch(self):
+        # "Go" runs a full apt-cache search which also covers the
+        # long descriptions
+        self.timer.stop()
         self.request.emit(self.lineEdit.text())
 
-    def setResult(self, packages, installed):
-        self.searchResults.setPacketList(packages, installed)
+    def setResult(self, packages, installed, details=None):
+        self.searchResults.setPacketList(packages, installed, details)
+
+    def addResult(self, packages, installed):
+        self.searchResults.addPackets(packages, installed)
+
+    def setBasket(self, basket):
+        self.searchResults.setBasket(basket)
 
 class AppDialog(TouchDialog):
     request = pyqtSignal(str, str)
+    mark = pyqtSignal(str, str, str)
     
-    def __init__(self, package, parent):
-        TouchDialog.__init__(self, package["Package"], parent)
+    def __init__(self, packages, parent, impact=None):
+        # packages contains one record per available version
+        TouchDialog.__init__(self, packages[0]["Package"], parent)
 
-        self.package = package
+        self.packages = packages
+        self.package = packages[0]
+        # what installing or removing the package would do
+        self.impact = impact
         
         menu = self.addMenu()
         menu_inst = menu.addAction(QCoreApplication.translate("Menu", "Install"))
@@ -178,16 +622,76 @@ class AppDialog(TouchDialog):
         menu_remove.triggered.connect(self.on_remove)
         menu_purge = menu.addAction(QCoreApplication.translate("Menu", "Purge"))
         menu_purge.triggered.connect(self.on_purge)
+        menu_files = menu.addAction(QCoreApplication.translate("Menu", "Files"))
+        menu_files.triggered.connect(self.on_files)
+        menu.addSeparator()
+        menu_mark_inst = menu.addAction(QCoreApplication.translate("Menu", "Mark for install"))
+        menu_mark_inst.triggered.connect(self.on_mark_install)
+        menu_mark_remove = menu.addAction(QCoreApplication.translate("Menu", "Mark for removal"))
+        menu_mark_remove.triggered.connect(self.on_mark_remove)
+        menu_mark_purge = menu.addAction(QCoreApplication.translate("Menu", "Mark for purge"))
+        menu_mark_purge.triggered.connect(self.on_mark_purge)
         
-        text = QTextEdit()
-        text.setReadOnly(True)
-        for i in package:
-            text.append('<h3><font color="#fcce04">'+i+'</font></h3>'+package[i]+"\n")
-        text.moveCursor(QTextCursor.Start)
-        self.setCentralWidget(text)
+        vboxw = QWidget()
+        vbox = QVBoxLayout()
+        vbox.setContentsMargins(0,0,0,0)
+        vbox.setSpacing(0)
+        vboxw.setLayout(vbox)
+
+        # let the user choose if several versions are available
+        if len(packages) > 1:
+            versions = QComboBox()
+            for p in packages:
+                versions.addItem(p.get("Version", "?"))
+            versions.activated[int].connect(self.selectVersion)
+            vbox.addWidget(versions)
+
+        self.text = QTextEdit()
+        self.text.setReadOnly(True)
+        vbox.addWidget(self.text)
+        self.setCentralWidget(vboxw)
+        self.showPackage()
+
+    def selectVersion(self, index):
+        self.package = self.packages[index]
+        self.showPackage()
+
+    def showPackage(self):
+        self.text.clear()
+        if self.impact != None:
+            self.text.append(self.impactText())
+        for i in self.package:
+            self.text.append('<h3><font color="#fcce04">'+i+'</font></h3>'+self.package.html(i)+"\n")
+        self.text.moveCursor(QTextCursor.Start)
+
+    def impactText(self):
+        impact = self.impact
+        if not impact.installed:
+            text = '<h3><font color="#fcce04">Install</font></h3>'
+            if len(impact.install) > 0:
+                text += "Also installs " + str(len(impact.install)) + " packages: "
+                text += ", ".join(impact.install) + "<br/>"
+            text += "Download: " + sizeText(impact.download_size)
+            text += ", disk space: " + sizeText(1024 * impact.installed_size)
+        else:
+            text = '<h3><font color="#fcce04">Remove</font></h3>'
+            if len(impact.remove) > 0:
+                text += "Also removes " + str(len(impact.remove)) + " packages: "
+                text += ", ".join(impact.remove) + "<br/>"
+            text += "Frees: " + sizeText(1024 * impact.freed_size)
+        return text + "\n"
+
+    def selectedVersion(self):
+        # the selected version if it's not the default one
+        if self.package is not self.packages[0] and "Version" in self.package:
+            return self.package["Version"]
+        return ""
 
     def on_install(self):
-        self.request.emit("install", self.package["Package"])
+        pkg = self.package["Package"]
+        if self.selectedVersion() != "":
+            pkg = pkg + "=" + self.selectedVersion()
+        self.request.emit("install", pkg)
 
     def on_remove(self):
         self.request.emit("remove", self.package["Package"])
@@ -195,6 +699,52 @@ class AppDialog(TouchDialog):
     def on_purge(self):
         self.request.emit("purge", self.package["Package"])
 
+    def on_files(self):
+        dialog = FilesDialog(self.package["Package"], self)
+        dialog.exec_()
+
+    def on_mark_install(self):
+        self.mark.emit(INSTALL, self.package["Package"], self.selectedVersion())
+        self.close()
+
+    def on_mark_remove(self):
+        self.mark.emit(REMOVE, self.package["Package"], "")
+        self.close()
+
+    def on_mark_purge(self):
+        self.mark.emit(PURGE, self.package["Package"], "")
+        self.close()
+
+# collects the output of a command and appends it to a text widget at
+# most every 250ms, redrawing the log for every chunk would keep the
+# Qt thread busy
+class TextLog(QObject):
+    def __init__(self, text, interval=250):
+        super(TextLog, self).__init__(text)
+        self.text = text
+        self.chunks = []
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.flush)
+
+    def write(self, data):
+        self.chunks.append(data)
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def flush(self):
+        self.timer.stop()
+        if len(self.chunks) == 0:
+            return
+        data = b"".join(self.chunks).decode("utf-8", "replace")
+        self.chunks = []
+        cursor = self.text.textCursor()
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(data)
+        self.text.setTextCursor(cursor)
+        self.text.ensureCursorVisible()
+
 class AptDialog(TouchDialog):
     cmdControl = pyqtSignal(str)
         
@@ -212,6 +762,12 @@ class AptDialog(TouchDialog):
         self.text.moveCursor(QTextCursor.Start)
         vbox.addWidget(self.text)
 
+        # the progress apt-get reports, hidden until the first report
+        self.bar = QProgressBar()
+        self.bar.setRange(0, 100)
+        self.bar.hide()
+        vbox.addWidget(self.bar)
+
         # buttons for control
         self.hboxw = QWidget()
         hbox = QHBoxLayout()
@@ -236,6 +792,10 @@ class AptDialog(TouchDialog):
     def sendNo(self):
         self.cmdControl.emit("no")
         
+    def progress(self, perc):
+        self.bar.setValue(perc)
+        self.bar.show()
+
     def cmdFinished(self, code):
         if code == 0:
             self.text.append("\nCommand finished successfully")
@@ -254,14 +814,67 @@ class AptWidget(QWidget):
     
     APT_CACHE = "/usr/bin/apt-cache"
     APT_GET = "/usr/bin/apt-get"
-    DPKG = "/usr/bin/dpkg"
+
+    # max number of packages fetched at once in the background
+    PREFETCH_MAX = 20
+
+    # max number of concurrent apt-cache processes
+    MAX_JOBS = 2
+
+    # how the processes are run: queries the user waits for at normal
+    # priority, prefetching and apt-get only when the UI is idle
+    INTERACTIVE_POLICY = INTERACTIVE
+    BACKGROUND_POLICY = BACKGROUND
+    APT_GET_POLICY = MAINTENANCE
+
+    # number of packages shown by "Disk usage"
+    DISK_USAGE_MAX = 100
+
+    # min query length and max number of results of "Files"
+    FILE_QUERY_MIN = 3
+    FILE_QUERY_MAX = 200
 
     def onCommand(self, cmd):
+        self.command = cmd
         if cmd == "List all":
+            self.whenLoaded([ self.store ], self.listAll, "Reading the package lists ...")
+        elif cmd == "Installed":
             self.setContentPacketList(self)
-            self.apt_cache_cmd(['pkgnames'])
+            self.installed = self.dpkg.installed()
+            self.list.setPacketList(self.installed, self.installed)
+        elif cmd == "Upgradable":
+            self.whenLoaded([ self.store ], self.listUpgradable, "Reading the package lists ...")
+        elif cmd == "Categories":
+            self.whenLoaded([ self.facetIndex ], lambda: self.setContentFacets(self),
+                            "Reading the package lists ...")
         elif cmd == "Search":
             self.setContentSearch(self)
+        elif cmd == "Files":
+            self.setContentFiles(self)
+        elif cmd == "Changes":
+            self.setContentBasket(self)
+        elif cmd == "Disk usage":
+            # the largest installed packages with the space they use
+            # together, tapping one allows to remove it
+            self.setContentPacketList(self)
+            usage = read_disk_usage(self.dpkg.path, self.DISK_USAGE_MAX)
+            self.installed = self.dpkg.installed()
+            details = [ ]
+            cumulative = 0
+            for name, size in usage.largest:
+                cumulative += size
+                details.append(sizeText(1024 * size) + ", together " + sizeText(1024 * cumulative) +
+                               " ({0:.0f}%)".format(100.0 * cumulative / max(usage.total, 1)))
+            self.list.setPacketList([ u[0] for u in usage.largest ], self.installed, details)
+            self.showNotice(str(usage.count) + " packages use " + sizeText(1024 * usage.total))
+        elif cmd == "Verify":
+            self.startVerification()
+        elif cmd == "History":
+            self.history.update()
+            if len(self.history) == 0:
+                self.setContentString("The apt history is empty.", self)
+            else:
+                self.setContentHistory(self)
         elif cmd == "Update":
             self.setContentAptText(self)
             self.apt_get_cmd(["-y", "update"])
@@ -274,7 +887,58 @@ class AptWidget(QWidget):
         else:            
             self.setContentString(cmd, self)
 
+    def whenLoaded(self, indexes, action, message=None):
+        # the apt lists are read and the indexes built in the background
+        # if they changed, the busy animation shows meanwhile. Only the
+        # latest action is run
+        if all(index.current() for index in indexes):
+            action()
+            return
+        if message != None:
+            self.setContentString(message, self)
+        self.loadCall.request(indexes, action)
+        self.updateBusy()
+
+    def loadIndexes(self, indexes, action):
+        # runs in a worker thread
+        for index in indexes:
+            index.update()
+        return action
+
+    def loadFinished(self, action):
+        if action != None:
+            action()
+
+    def listAll(self):
+        self.setContentPacketList(self)
+        self.pkgnames = self.store.names()
+        self.list.setPacketList(self.pkgnames, self.installed)
+
+    def listUpgradable(self):
+        # compare the installed versions with the newest versions
+        # from the apt lists
+        self.setContentPacketList(self)
+        self.installed = self.dpkg.installed()
+        upgradable = find_upgradable(self.dpkg.versions(),
+                                     self.store.names(), self.store.versions())
+        if len(upgradable) == 0:
+            self.setContentString("All packages are up to date.", self)
+        else:
+            self.list.setPacketList([ u[0] for u in upgradable ], self.installed,
+                                    [ u[1] + " → " + u[2] for u in upgradable ])
+
     def removeOldContent(self):
+        # a running search would add its results to the old content
+        if self.searchJob != None:
+            self.scheduler.cancel(self.searchJob)
+            self.searchJob = None
+        self.fileQuery.cancel()
+        self.loadCall.cancel()
+        if self.verification != None:
+            self.verification.cancel()
+            self.verification = None
+            self.verifyTimer.stop()
+            self.updateBusy()
         if self.content != None:
             self.content.deleteLater()
             self.vbox.removeWidget(self.content)
@@ -284,6 +948,9 @@ class AptWidget(QWidget):
         self.removeOldContent()
         self.list = PacketListView(parent)
         self.list.select.connect(self.showPackage)
+        self.list.visible.connect(self.prefetch)
+        self.list.marked.connect(self.updateBasket)
+        self.list.setBasket(self.basket)
         self.vbox.addWidget(self.list)        
         self.content = self.list
         
@@ -292,16 +959,257 @@ class AptWidget(QWidget):
 
         self.search = SearchWidget()
         self.search.request.connect(self.doSearch)
+        self.search.query.connect(self.doQuery)
         self.search.select.connect(self.showPackage)
+        self.search.visible.connect(self.prefetch)
+        self.search.marked.connect(self.updateBasket)
+        self.search.setBasket(self.basket)
         self.vbox.addWidget(self.search)        
         self.content = self.search
 
+    def setContentFiles(self, parent):
+        # find the packages owning a file, the results show the
+        # package and the path
+        self.removeOldContent()
+        self.search = SearchWidget()
+        self.search.request.connect(self.doFileQuery)
+        self.search.query.connect(self.doFileQuery)
+        self.search.select.connect(self.showPackage)
+        self.search.visible.connect(self.prefetch)
+        self.search.marked.connect(self.updateBasket)
+        self.search.setBasket(self.basket)
+        self.vbox.addWidget(self.search)
+        self.content = self.search
+
+    def setContentFacets(self, parent):
+        self.removeOldContent()
+        self.installed = self.dpkg.installed()
+        self.facetWidget = FacetWidget(self.facetIndex, self.installed, parent)
+        self.facetWidget.select.connect(self.showPackage)
+        self.facetWidget.visible.connect(self.prefetch)
+        self.facetWidget.marked.connect(self.updateBasket)
+        self.facetWidget.setBasket(self.basket)
+        self.vbox.addWidget(self.facetWidget)
+        self.content = self.facetWidget
+
+    def setContentBasket(self, parent):
+        # the marked packages and a button to apply all changes at once
+        self.removeOldContent()
+        if len(self.basket) == 0:
+            self.setContentString("No changes marked. Tap the left edge of a package "
+                                  "or use its menu to mark it.", parent)
+            return
+
+        self.basketWidget = QWidget(parent)
+        vbox = QVBoxLayout()
+        vbox.setContentsMargins(0,0,0,0)
+        vbox.setSpacing(0)
+        self.basketWidget.setLayout(vbox)
+
+        names = list(self.basket)
+        self.list = PacketListView(self.basketWidget)
+        self.list.select.connect(self.showPackage)
+        self.list.marked.connect(self.updateBasket)
+        self.list.setBasket(self.basket)
+        self.list.setPacketList(names, self.installed,
+                                [ self.basket.describe(n) for n in names ])
+        vbox.addWidget(self.list)
+
+        applyBut = QPushButton("Apply", self.basketWidget)
+        applyBut.clicked.connect(self.applyBasket)
+        vbox.addWidget(applyBut)
+
+        self.vbox.addWidget(self.basketWidget)
+        self.content = self.basketWidget
+
+    def startVerification(self):
+        # the files are checked in background threads, the progress is
+        # polled
+        self.setContentString("Verifying the installed packages ...", self)
+        self.verification = Verification(self.dpkg.installed())
+        self.verification.start()
+        self.verifyTimer.start(250)
+        self.updateBusy()
+
+    def verifyProgress(self):
+        if self.busy != None:
+            self.busy.progress(self.verification.progress)
+        if not self.verification.done:
+            return
+        damaged = self.verification.damaged
+        error = self.verification.error
+        self.verification = None
+        self.verifyTimer.stop()
+        self.updateBusy()
+        if error != None:
+            self.setContentString("The check failed: " + str(error), self)
+        elif len(damaged) == 0:
+            self.setContentString("All installed files are intact.", self)
+        else:
+            self.setContentDamaged(damaged, self)
+
+    def setContentDamaged(self, damaged, parent):
+        # the damaged packages, a tap reinstalls one of them
+        self.removeOldContent()
+        widget = QWidget(parent)
+        vbox = QVBoxLayout()
+        vbox.setContentsMargins(0,0,0,0)
+        vbox.setSpacing(0)
+        widget.setLayout(vbox)
+
+        names = sorted(damaged)
+        self.list = PacketListView(widget)
+        self.list.select.connect(self.reinstall)
+        self.list.setPacketList(names, self.installed,
+                                [ str(len(damaged[n])) + " damaged or missing files" for n in names ])
+        vbox.addWidget(self.list)
+
+        reinstallBut = QPushButton("Reinstall all", widget)
+        reinstallBut.clicked.connect(lambda: self.reinstall(names))
+        vbox.addWidget(reinstallBut)
+
+        self.vbox.addWidget(widget)
+        self.content = widget
+
+    def reinstall(self, names):
+        if not isinstance(names, list):
+            names = [ names ]
+        self.runAptDialog("Reinstall", self.parent().parent(), ["install", "--reinstall"] + names)
+
+    def setContentHistory(self, parent):
+        self.removeOldContent()
+        self.historyView = HistoryView(self.history, parent)
+        self.historyView.select.connect(self.showTransaction)
+        self.vbox.addWidget(self.historyView)
+        self.content = self.historyView
+
+    def showTransaction(self, transaction):
+        dialog = HistoryDialog(transaction, self.parent().parent())
+        dialog.exec_()
+
+    def updateBasket(self):
+        # show the number of pending changes in the command list
+        text = "Changes"
+        if len(self.basket) > 0:
+            text += " (" + str(len(self.basket)) + ")"
+        self.combo.setItemText(self.basketIndex, text)
+
+    def markPackage(self, action, pkg, version):
+        self.basket.mark(pkg, action, version if version != "" else None)
+        self.updateBasket()
+
+    def applyBasket(self):
+        if len(self.basket) == 0:
+            return
+        self.runAptDialog("Apply changes", self.parent().parent(),
+                          self.basket.apt_args(), self.basketApplied)
+
+    def basketApplied(self, code):
+        # keep the marks if apt failed so the user can retry
+        if code == 0:
+            self.basket.clear()
+            self.updateBasket()
+        if self.content != None and self.content is self.basketWidget:
+            self.installed = self.dpkg.installed()
+            self.setContentBasket(self)
+
     def showPackage(self, pkgname):
-        self.apt_cache_cmd(["show", pkgname])
+        self.whenLoaded([ self.store ], lambda: self.showRecords(pkgname))
+
+    def showRecords(self, pkgname):
+        # the records are read from the apt lists, apt-cache is only
+        # asked for packages which aren't listed there
+        packages = self.store.records(pkgname)
+        if len(packages) == 0:
+            packages = self.showCache.get(pkgname)
+        if packages != None:
+            self.showPackageDialog(packages)
+            return
+
+        # only the latest tap counts
+        if self.showJob != None:
+            self.scheduler.cancel(self.showJob)
+        self.showJob = self.apt_cache_cmd(["show", pkgname], self.showFinished)
+
+    def showFinished(self, job, code, lines):
+        self.showJob = None
+        packages = self.groupRecords(lines)
+        for name in packages:
+            self.showCache.put(name, packages[name])
+        if len(packages) > 0:
+            self.showPackageDialog(next(iter(packages.values())))
+        elif code != 0:
+            print("ERROR:", code)
+
+    def prefetch(self, names):
+        # fetch the details of the visible packages in the background,
+        # a prefetch which didn't start yet is replaced by the new one.
+        # Nothing is fetched while the apt lists are read
+        if not self.store.current():
+            return
+        listed = self.store.names()
+        names = self.showCache.missing([ n for n in names if n not in listed ])[:self.PREFETCH_MAX]
+        if self.prefetchJob != None and self.prefetchJob.state == PENDING:
+            self.scheduler.cancel(self.prefetchJob)
+            self.prefetchJob = None
+        if len(names) == 0:
+            return
+        self.prefetchJob = self.apt_cache_cmd(["show"] + names, self.prefetchFinished,
+                                              priority=PRIORITY_BACKGROUND)
+
+    def prefetchFinished(self, job, code, lines):
+        # apt-cache fails if one of the packages is unknown but
+        # still prints the others
+        if self.prefetchJob is job:
+            self.prefetchJob = None
+        for name, packages in self.groupRecords(lines).items():
+            self.showCache.put(name, packages)
         
     def doSearch(self, str):
-        self.apt_cache_cmd(["search", str ] )
+        if self.searchJob != None:
+            self.scheduler.cancel(self.searchJob)
+        self.pkgnames = []
+        self.search.setResult([], self.installed)
+        self.searchJob = self.apt_cache_cmd(["search", str ], self.searchFinished,
+                                            self.parseSearchLines)
+
+    def searchFinished(self, job, code, lines):
+        self.searchJob = None
+        # the results were added while they arrived, apt-cache
+        # usually prints them sorted already
+        if any(a > b for a, b in zip(self.pkgnames, self.pkgnames[1:])):
+            self.pkgnames.sort()
+            self.search.setResult(self.pkgnames, self.installed)
+
+    def doQuery(self, str):
+        # the typed query replaces the results of a running "Go" search
+        if self.searchJob != None:
+            self.scheduler.cancel(self.searchJob)
+            self.searchJob = None
+            self.updateBusy()
+        self.whenLoaded([ self.searchIndex ], lambda: self.showQuery(str))
+
+    def showQuery(self, str):
+        results = self.searchIndex.search(str)
+        self.search.setResult([ r[0] for r in results ], self.installed,
+                              [ r[1] for r in results ])
         
+    def doFileQuery(self, str):
+        # the index is built and searched in the background, short
+        # queries would match almost every file
+        if len(str) >= self.FILE_QUERY_MIN:
+            self.fileQuery.request(str)
+        else:
+            self.fileQuery.cancel()
+            self.fileQueryFinished([ ])
+        self.updateBusy()
+
+    def fileQueryFinished(self, results):
+        if results == None:
+            results = [ ]
+        self.search.setResult([ r[1] for r in results ], self.installed,
+                              [ r[0] for r in results ])
+
     def setContentAptText(self, parent):
         self.removeOldContent()
         self.text = QTextEdit(self)
@@ -328,176 +1236,372 @@ class AptWidget(QWidget):
         # add command combobox
         self.combo = QComboBox(self)
         self.combo.addItem("List all")
+        self.combo.addItem("Installed")
+        self.combo.addItem("Upgradable")
+        self.combo.addItem("Categories")
         self.combo.addItem("Search")
+        self.combo.addItem("Files")
+        self.combo.addItem("Changes")
+        self.basketIndex = self.combo.count()-1
+        self.combo.addItem("Disk usage")
+        self.combo.addItem("History")
+        self.combo.addItem("Verify")
         self.combo.addItem("Update")
         self.combo.addItem("Upgrade")
         self.combo.addItem("Autoremove")
         self.combo.activated[str].connect(self.onCommand)
         self.combo.setCurrentIndex(-1)
         self.vbox.addWidget(self.combo)
+        self.command = ""
+
+        # a short message below the commands which hides itself
+        self.notice = QLabel(self)
+        self.notice.setWordWrap(True)
+        self.notice.setAlignment(Qt.AlignCenter)
+        self.notice.hide()
+        self.vbox.addWidget(self.notice)
+        self.noticeTimer = QTimer(self)
+        self.noticeTimer.setSingleShot(True)
+        self.noticeTimer.timeout.connect(self.notice.hide)
         
+        self.busy = None
+
+        # the impact shown in the package dialog is computed in the background
+        self.previewCall = None
+        self.previewPackages = None
+
+        # the dialog of the running apt-get command if any
+        self.aptDialog = None
+
+        # the files are searched in the background
+        self.fileQuery = LatestCall(lambda query: self.fileIndex.search(query, self.FILE_QUERY_MAX), self)
+        self.fileQuery.finished.connect(self.fileQueryFinished)
+        self.fileQuery.idle.connect(self.updateBusy)
+
+        # the apt lists are read in the background before a view uses them
+        self.loadCall = LatestCall(self.loadIndexes, self)
+        self.loadCall.finished.connect(self.loadFinished)
+        self.loadCall.idle.connect(self.updateBusy)
+
+        # the check of the installed files
+        self.verification = None
+        self.verifyTimer = QTimer(self)
+        self.verifyTimer.timeout.connect(self.verifyProgress)
+
+        # all apt processes are run by the scheduler
+        self.scheduler = Scheduler(self.startJob, self.terminateJob, self.MAX_JOBS)
+        self.aptJob = None
+        self.showJob = None
+        self.searchJob = None
+        self.prefetchJob = None
+
         # add empty content widget
         self.content = None
         self.setContentString("Please choose a command!", self)
 
         self.setLayout(self.vbox)        
-        self.busy = None
 
-        # immediately scan for installed apps
-        self.dpkg_cmd(["-l"])
-        
-    def processError(self):
-        pass
-        
-    def processOutput(self):
-        results = bytes(self.process.readAllStandardOutput()).decode()
-        if self.currentCmd.endswith("apt-get"):
-            self.text.append(results)
-        else:            
-            self.results = self.results + results
+        self.dpkg = DpkgStatus()
+
+        # the packages of the apt lists, read on demand. The other
+        # package indexes are derived from the store
+        self.store = PackageStore()
+        self.searchIndex = SearchIndex(self.store)
+        self.facetIndex = FacetIndex(self.store)
+
+        # the owners of the installed files
+        self.fileIndex = FileIndex()
+
+        # dependencies to preview the impact of installing or removing
+        self.depIndex = DependencyIndex(self.store)
+        self.installedGraph = InstalledGraph()
+
+        # transactions of the apt history log, read on demand
+        self.history = HistoryIndex()
+
+        # details of recently shown and visible packages which are
+        # not in the apt lists
+        self.showCache = RecordCache()
+
+        # changes to be applied in one apt-get transaction
+        self.basket = Basket()
+        self.basketWidget = None
+
+        # show the packages known when the app was closed at once and
+        # compare them with the current state once the window is visible
+        self.snapshot = load_snapshot()
+        if self.snapshot != None:
+            self.installed = self.snapshot.installed
+            self.showSnapshot()
+            # the lists and the dpkg status are read in the background
+            self.reconcileCall = BackgroundCall(self.compareSnapshot, self)
+            self.reconcileCall.finished.connect(self.reconcile)
+            self.reconcileCall.start()
+        else:
+            # immediately scan for installed apps
+            self.installed = self.dpkg.installed()
+
+    def showSnapshot(self):
+        cmd = self.snapshot.command
+        if cmd == "List all":
+            self.setContentPacketList(self)
+            self.list.setPacketList(self.snapshot.names, self.installed)
+        elif cmd == "Installed":
+            self.setContentPacketList(self)
+            self.list.setPacketList(self.snapshot.installed, self.installed)
+        else:
+            return
+        self.command = cmd
+        self.combo.setCurrentIndex(self.combo.findText(cmd))
+
+    def compareSnapshot(self):
+        # runs in a worker thread, the snapshot is not modified until
+        # the result arrived
+        names = self.store.names()
+        installed = self.dpkg.installed()
+        return ( installed, diff_names(self.snapshot.names, names),
+                 diff_names(self.snapshot.installed, installed) )
+
+    def reconcile(self, result):
+        self.reconcileCall = None
+        self.snapshot = None
+        if result == None:
+            self.installed = self.dpkg.installed()
+            return
+        self.installed, (added, removed), (newly, gone) = result
+
+        changes = []
+        for count, text in ( (len(added), "new"), (len(removed), "not available anymore"),
+                             (len(newly), "installed"), (len(gone), "removed") ):
+            if count > 0:
+                changes.append(str(count) + " " + text)
+        if len(changes) == 0:
+            return
+
+        # redraw the list shown from the snapshot at the same position
+        if self.command in ("List all", "Installed"):
+            pos = self.list.verticalScrollBar().value()
+            self.onCommand(self.command)
+            self.list.verticalScrollBar().setValue(pos)
+        self.showNotice("Since last start: " + ", ".join(changes))
+
+    def showNotice(self, text):
+        self.notice.setText(text)
+        self.notice.show()
+        self.noticeTimer.start(5000)
+
+    def saveSnapshot(self):
+        # only what is loaded already, quitting must not read the lists
+        names = self.store.names(update=False)
+        if names == None and self.snapshot != None:
+            names = self.snapshot.names
+        if names == None:
+            return
+        try:
+            save_snapshot(names, self.installed, self.command)
+        except OSError:
+            # not fatal, the next start is just slower
+            pass
+
+    def parseSearchLines(self, lines):
+        # search also returns a description. We don't really
+        # have space to display that ...
+        names = [ l.split(" - ", 1)[0].strip() for l in lines if " - " in l ]
+        self.pkgnames.extend(names)
+        self.search.addResult(names, self.installed)
+
+    def showPackageDialog(self, packages):
+        # the preview may have to build the dependency index first, the
+        # busy animation is shown meanwhile. Only the latest tap is shown
+        self.previewPackages = packages
+        if self.previewCall == None:
+            self.startPreview()
+        self.updateBusy()
+
+    def startPreview(self):
+        packages = self.previewPackages
+        name = packages[0]["Package"]
+        self.previewCall = BackgroundCall(lambda: preview(self.depIndex, self.installedGraph, name), self)
+        self.previewCall.finished.connect(lambda impact: self.previewFinished(packages, impact))
+        self.previewCall.start()
+
+    def previewFinished(self, packages, impact):
+        self.previewCall = None
+        if packages is not self.previewPackages:
+            # tapped again meanwhile
+            self.startPreview()
+            return
+        self.previewPackages = None
+        self.updateBusy()
 
-    def showPackageDialog(self, package):
         # make sure we register this as a child window of the root
-        self.appDialog = AppDialog(package, self.parent().parent())
+        self.appDialog = AppDialog(packages, self.parent().parent(), impact)
         self.appDialog.request.connect(self.appRequest)
+        self.appDialog.mark.connect(self.markPackage)
         self.appDialog.exec_()
 
     def appRequest(self, cmd, pkg):
+        self.runAptDialog(cmd, self.appDialog, [cmd, pkg])
+
+    def runAptDialog(self, title, parent, parms, finished=None):
         # open a apt text dialog
-        dialog = AptDialog(cmd, self.appDialog)
+        dialog = AptDialog(title, parent)
         self.text = dialog.getText()
 
         # make sure the dialog notices when the command finishs
         self.cmdFinished.connect(dialog.cmdFinished)
         dialog.cmdControl.connect(self.appControl)
 
-        self.apt_get_cmd([cmd, pkg])
+        self.aptDialog = dialog
+        self.apt_get_cmd(parms, finished)
         dialog.exec_()
+        self.aptDialog = None
 
         # update internal list of installed packages
-        self.dpkg_cmd(["-l"])
+        self.installed = self.dpkg.installed()
 
     def appControl(self, c):
+        if self.aptJob == None:
+            return
         if c == "yes":
-            self.process.write("y\n".encode())
+            self.aptJob.process.write("y\n".encode())
         elif c == "no":
-            self.process.write("n\n".encode())
+            self.aptJob.process.write("n\n".encode())
         else:
             print("unexpected control:", c)
         
-    def parseShowResults(self, str):
-        def htmlize(str):
-            str = str.replace("&", "&amp;")
-            str = str.replace("<", "&lt;")
-            str = str.replace(">", "&gt;")
-            return str
-        
-        # split into lines and process line by line
-        results = { }
-        name = None
-        for line in str.split("\n"):
-            # ignore empty lines
-            if len(line) > 0:
-                if not line.startswith(" "):
-                    # we expect at least one ':' in each line
-                    if len(line.split(":")) > 1:
-                        name = line.split(":")[0].strip()
-                        value = ":".join(line.split(":")[1:]).strip()
-                        results[name] = htmlize(value)
-                else:
-                    # lines starting with space extend the previous line
-                    # a line contaning a dot only is a newline
-                    if line.strip() == ".":
-                        results[name] = results[name] + "<br/><p>"
-                    else:
-                        results[name] = results[name] + " " + htmlize(line.strip())
-
-        return results
+    def groupRecords(self, lines):
+        # parse the output of "apt-cache show" and group the records
+        # (one per version) by package
+        packages = { }
+        for record in iter_records(lines):
+            if "Package" in record:
+                packages.setdefault(record["Package"], [ ]).append(record)
+        return packages
                     
-    def finished(self, code, status):
-        if code == 0:
-            if self.currentCmd == "pkgnames": # apt-cache pkgnames
-                self.pkgnames = []
-                for pkgname in self.results.split("\n"):
-                    pkgname = pkgname.strip()
-                    if len(pkgname) > 0:
-                        self.pkgnames.append(pkgname)
-                self.pkgnames.sort()
-                self.list.setPacketList(self.pkgnames, self.installed)
-            elif self.currentCmd == "search": # apt-cache search
-                self.pkgnames = []
-                # search also returns a description. We don't really
-                # have space to display that ...
-                for p in self.results.split("\n"):
-                    if len(p.split()) > 1:
-                        self.pkgnames.append(p.split()[0].strip())
-                self.pkgnames.sort()
-                self.search.setResult(self.pkgnames, self.installed)
-            elif self.currentCmd == "show": # apt-cache show
-                package = self.parseShowResults(self.results)                
-                self.cmd_done()
-                self.showPackageDialog(package)
-                return
-            elif self.currentCmd == "-l": # dpkg -l
-                self.installed = []
-                for p in self.results.split("\n"):
-                    parts = p.split()
-                    if len(parts) >= 5:
-                        flag,name,ver,arch = parts[0:4]
-                        desc = " ".join(parts[4:])
-
-                        # the arch flags allows some kind of sanity check
-                        if arch == "all" or arch == "amd64" or arch == "i386" or arch == "armhf":
-                            # ii are installed files
-                            # rc are deinstalled files with config left
-                            if flag == "ii":
-                                self.installed.append(name.split(":")[0])
-
-                # we now have packages _and_ know the installed files
-                # most installed packages should also be in pkgnames
-                self.installed.sort()
-            elif self.currentCmd.endswith("apt-get"): # sudo apt-get ...
-                pass
-            else:
-                print("Current command unknown:", self.currentCmd)
+    def startJob(self, job):
+        # called by the scheduler to start the process of a job
+        process = QProcess(self)
+        job.process = process
+        process.readyReadStandardOutput.connect(lambda: self.jobOutput(job))
+        process.readyReadStandardError.connect(lambda: self.jobErrorOutput(job))
+        process.finished.connect(lambda code, status: self.jobFinished(job, code))
+        process.error.connect(lambda error: self.jobError(job, error))
+        # the resources apt-get used are reported when it finished
+        if job.exclusive:
+            policy = self.APT_GET_POLICY
+            job.report = report_file()
+        elif job.priority == PRIORITY_BACKGROUND:
+            policy = self.BACKGROUND_POLICY
         else:
-            print("ERROR:", code)
-            # TODO: display error message
+            policy = self.INTERACTIVE_POLICY
+        program, args = command(job.program, job.args, policy, job.report)
+        process.start(program, args)
 
-        self.cmd_done()
-        self.cmdFinished.emit(code)
-                
-    def cmd_done(self):            
-        self.currentCmd = None
-        self.busy.close()
-        self.busy = None
-        self.combo.setEnabled(True)        
-        
-    def do_cmd(self, cmd, parms):
-        self.process  = QProcess(self)
-        self.process.readyReadStandardOutput.connect(self.processOutput)
-        self.process.readyReadStandardError.connect(self.processError)
-        self.process.finished.connect(self.finished)
+    def terminateJob(self, job):
+        # the report wrapper passes SIGTERM on, killing it would leave
+        # the job running
+        if job.report != None:
+            job.process.terminate()
+        else:
+            job.process.kill()
 
-        self.currentCmd = parms[0]
-            
-        self.results = ""
-        self.process.start(cmd, parms )
-            
-        self.combo.setEnabled(False)
-        self.busy = BusyAnimation(self)
-        self.busy.show()
-        
-    def apt_cache_cmd(self, parms):
-        self.do_cmd(self.APT_CACHE, parms)
+    def jobOutput(self, job):
+        data = bytes(job.process.readAllStandardOutput())
+        # ignore the output of cancelled jobs
+        if job.state == RUNNING and job.on_output != None:
+            job.on_output(data)
+
+    def jobErrorOutput(self, job):
+        data = bytes(job.process.readAllStandardError())
+        if job.state == RUNNING and job.on_error != None:
+            job.on_error(data)
+
+    def jobError(self, job, error):
+        # a process which failed to start never finishes
+        if error == QProcess.FailedToStart:
+            self.jobFinished(job, -1)
+
+    def jobFinished(self, job, code):
+        job.process.deleteLater()
+        if job.report != None:
+            job.usage = read_report(job.report)
+        self.scheduler.finished(job, code)
+        self.updateBusy()
 
-    def apt_get_cmd(self, parms):
-        cmd = [ self.APT_GET ]
+    def updateBusy(self):
+        # show the busy animation while the user waits for a job, the
+        # commands are disabled while the system is modified
+        jobs = self.scheduler.running + self.scheduler.pending
+        busy = any(j.priority != PRIORITY_BACKGROUND for j in jobs) or self.verification != None \
+               or self.previewCall != None or self.fileQuery.isRunning() or self.loadCall.isRunning()
+        if busy and self.busy == None:
+            self.busy = BusyAnimation(self)
+            self.busy.show()
+        elif not busy and self.busy != None:
+            self.busy.close()
+            self.busy = None
+        self.combo.setEnabled(not any(j.exclusive for j in jobs))
+
+    def apt_cache_cmd(self, parms, finished, lines=None, priority=PRIORITY_INTERACTIVE):
+        # complete output lines are passed to "lines" as they arrive,
+        # otherwise they are collected and passed to "finished"
+        collected = []
+        output = LineAssembler(lines if lines != None else collected.extend)
+
+        def on_finished(job, code):
+            output.close()
+            finished(job, code, collected)
+
+        job = self.scheduler.submit(Job(self.APT_CACHE, parms, priority,
+                                        on_output=output.feed, on_finished=on_finished))
+        self.updateBusy()
+        return job
+
+    def apt_get_cmd(self, parms, finished=None):
+        # apt-get modifies the system and thus runs exclusively. It prompts
+        # without a newline, so the output is not split into lines.
+        # The progress records are written to stderr
+        cmd = [ self.APT_GET, "-o", "APT::Status-Fd=2" ]
         cmd.extend(parms)
-        self.do_cmd("sudo", cmd)
+        self.aptLog = TextLog(self.text)
+        self.aptErrors = LineAssembler(self.aptErrorLines)
+        self.aptPercent = None
+        self.aptDone = finished
+        self.aptJob = self.scheduler.submit(Job("sudo", cmd, exclusive=True,
+                                                on_output=self.aptLog.write,
+                                                on_error=self.aptErrors.feed,
+                                                on_finished=self.aptFinished))
+        self.updateBusy()
 
-    def dpkg_cmd(self, parms):
-        self.do_cmd(self.DPKG, parms)
+    def aptErrorLines(self, lines):
+        for line in lines:
+            status = parse_status(line)
+            if status == None:
+                # a real error message
+                if line.strip() != "":
+                    self.aptLog.write((line + "\n").encode())
+            elif status.kind == "pmerror":
+                self.aptLog.write(("E: " + status.item + ": " + status.message + "\n").encode())
+            elif status.kind != "pmconffile" and int(status.percent) != self.aptPercent:
+                self.aptPercent = int(status.percent)
+                # a dialog hides the busy animation, it shows the percentage itself
+                if self.aptDialog != None:
+                    self.aptDialog.progress(self.aptPercent)
+                elif self.busy != None:
+                    self.busy.progress(self.aptPercent)
+
+    def aptFinished(self, job, code):
+        if code != 0:
+            print("ERROR:", code)
+        self.aptErrors.close()
+        if job.usage != None:
+            self.aptLog.write(("\n" + format_usage(job.usage) + "\n").encode())
+        self.aptLog.flush()
+        self.aptJob = None
+        self.cmdFinished.emit(code)
+        if self.aptDone != None:
+            self.aptDone(code)
         
 class FtcGuiApplication(TouchApplication):
     def __init__(self, args):
@@ -506,6 +1610,7 @@ class FtcGuiApplication(TouchApplication):
         self.w = TxtWindow("Apt")
 
         self.apt = AptWidget(self.w)
+        self.aboutToQuit.connect(self.apt.saveSnapshot)
     
         self.vbox = QVBoxLayout()
         self.vbox.setContentsMargins(0,0,0,0)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""\
+Collects package changes which are applied in one apt-get transaction.
+
+A single ``apt-get install`` call can also remove and purge packages
+(``name-`` and ``name_``), so apt solves the dependencies and dpkg runs
+its triggers only once for all changes.
+"""
+
+INSTALL, REMOVE, PURGE = 'install', 'remove', 'purge'
+
+# Suffix which tells "apt-get install" what to do with a package
+_SUFFIX = {INSTALL: '', REMOVE: '-', PURGE: '_'}
+
+
+class Basket(object):
+    """\
+    The pending changes, at most one per package.
+    """
+    def __init__(self):
+        self._changes = {}
+
+    def __len__(self):
+        return len(self._changes)
+
+    def __contains__(self, name):
+        return name in self._changes
+
+    def __iter__(self):
+        """\
+        Iterates over the names of the marked packages in sorted order.
+        """
+        return iter(sorted(self._changes))
+
+    def mark(self, name, action, version=None):
+        """\
+        Marks a package, replacing a previous mark of the same package.
+
+        :param str name: The package name.
+        :param str action: One of ``INSTALL``, ``REMOVE`` or ``PURGE``.
+        :param str version: The version to install, the candidate version
+                            by default.
+        """
+        if action not in _SUFFIX:
+            raise ValueError('Unknown action: {0}'.format(action))
+        self._changes[name] = (action, version if action == INSTALL else None)
+
+    def unmark(self, name):
+        """\
+        Removes the mark of a package, if any.
+
+        :param str name: The package name.
+        """
+        self._changes.pop(name, None)
+
+    def toggle(self, name, installed):
+        """\
+        Unmarks a marked package, otherwise marks an installed package
+        for removal and any other package for installation.
+
+        :param str name: The package name.
+        :param bool installed: ``True`` if the package is installed.
+        :return: The new action or ``None`` if the package was unmarked.
+        """
+        if name in self._changes:
+            del self._changes[name]
+            return None
+        action = REMOVE if installed else INSTALL
+        self.mark(name, action)
+        return action
+
+    def action(self, name):
+        """\
+        Returns the action a package is marked for or ``None``.
+
+        :param str name: The package name.
+        """
+        change = self._changes.get(name)
+        return change[0] if change is not None else None
+
+    def describe(self, name):
+        """\
+        Returns a short text describing the change of a package.
+
+        :param str name: The package name.
+        """
+        action, version = self._changes[name]
+        if version:
+            return '{0} {1}'.format(action, version)
+        return action
+
+    def clear(self):
+        """\
+        Removes all marks.
+        """
+        self._changes.clear()
+
+    def apt_args(self):
+        """\
+        Returns the apt-get arguments which apply all changes at once.
+
+        :return: A list of arguments, i.e. ``['install', 'vim', 'nano-']``.
+        """
+        args = ['install']
+        for name in self:
+            action, version = self._changes[name]
+            if version:
+                name = '{0}={1}'.format(name, version)
+            args.append(name + _SUFFIX[action])
+        return args
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""\
+Benchmarks of the parsing and indexing code of the Apt app.
+
+Runs without a display on synthetic data sized like a Raspbian archive.
+For each stage the best time of several runs and the peak memory
+allocated by Python are reported, optionally as JSON file::
+
+    python3 benchmark.py --output results.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+from collections import OrderedDict
+
+from debfiles import DpkgStatus, iter_records
+from pkgindex import SearchIndex, BitSet, PrefixTable, mark_installed, find_upgradable
+from output import LineAssembler
+from snapshot import save_snapshot, load_snapshot, diff_names
+from depgraph import DependencyIndex, InstalledGraph, preview
+from facets import FacetIndex, SECTION, ARCHITECTURE, INSTALLED, NOT_INSTALLED
+from fileindex import FileIndex
+from metastore import PackageStore
+
+_WORDS = ('library', 'python', 'tool', 'data', 'module', 'server', 'client', 'graphics',
+          'network', 'documentation', 'development', 'files', 'utility', 'shared', 'runtime')
+
+
+def _name(i):
+    return 'pkg{0}-{1}'.format(i, _WORDS[i % len(_WORDS)])
+
+
+def _stanza(i, version, status=None):
+    lines = ['Package: ' + _name(i)]
+    if status is not None:
+        lines.append('Status: ' + status)
+    lines.extend([
+        'Architecture: armhf',
+        'Version: ' + version,
+        'Priority: optional',
+        'Section: ' + _WORDS[i % 7],
+        'Installed-Size: {0}'.format(i % 5000 + 10),
+        'Depends: libc6 (>= 2.28), {0}'.format(_name((i * 7) % 1000)),
+        'Description: {0} {1} for {2}'.format(_WORDS[i % 11], _WORDS[i % 13], _WORDS[i % 5]),
+        ' The {0} package provides the {1} {2}.'.format(_name(i), _WORDS[i % 3], _WORDS[i % 4]),
+        ' .',
+        ' It is part of a synthetic archive used for benchmarks.',
+    ])
+    return '\n'.join(lines) + '\n\n'
+
+
+def make_fixtures(directory, packages=60000, installed=2000, versions=3):
+    """\
+    Writes a "Packages" file, a dpkg status file with the file lists of
+    the installed packages and the output of ``apt-cache show``.
+
+    :param str directory: The destination directory.
+    :param int packages: Number of available packages.
+    :param int installed: Number of installed packages, every other one has
+                          an older version than available.
+    :param int versions: Number of versions of each package shown.
+    :return: A dict with the paths and the installed package names.
+    """
+    lists = os.path.join(directory, 'lists')
+    os.makedirs(lists)
+    with open(os.path.join(lists, 'archive_dists_buster_main_binary-armhf_Packages'), 'w') as f:
+        for i in range(packages):
+            f.write(_stanza(i, '1.{0}-1'.format(i % 10)))
+
+    step = max(packages // installed, 1)
+    names = [_name(i) for i in range(0, packages, step)][:installed]
+    status = os.path.join(directory, 'status')
+    with open(status, 'w') as f:
+        for n, i in enumerate(range(0, packages, step)):
+            if n >= installed:
+                break
+            version = '1.{0}-{1}'.format(i % 10, n % 2)
+            f.write(_stanza(i, version, 'install ok installed'))
+            # removed packages with config files are listed as well
+            f.write(_stanza(packages + n, '0.1', 'deinstall ok config-files'))
+
+    # about 40 files per package like a desktop installation
+    info = os.path.join(directory, 'info')
+    os.makedirs(info)
+    for n, name in enumerate(names):
+        with open(os.path.join(info, name + '.list'), 'w') as f:
+            f.write('/.\n/usr\n/usr/share\n/usr/share/doc\n/usr/share/doc/{0}\n'.format(name))
+            for j in range(35):
+                f.write('/usr/lib/{0}/{1}/{2}.py\n'.format(_WORDS[n % 15], name, _WORDS[j % 15] + str(j)))
+            f.write('/usr/bin/{0}\n'.format(name))
+
+    show = []
+    for i in range(0, min(packages, 20)):
+        for v in range(versions):
+            show.append(_stanza(i, '1.{0}-1'.format(v)))
+    return {'lists': lists, 'status': status, 'info': info, 'installed': names,
+            'show': ''.join(show).encode('utf-8')}
+
+
+def _chunks(data, size=4096):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def stages(fixtures, cache_dir):
+    """\
+    Returns the benchmark stages.
+
+    :return: A list of tuples ``(name, function)``, the functions are run
+             in this order and each depends on the previous ones only
+             through the files they wrote.
+    """
+    state = {}
+
+    def store_build():
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        store = PackageStore(fixtures['lists'], cache_dir)
+        state['store'] = store
+        state['names'] = store.names()
+        state['versions'] = store.versions()
+
+    def store_load():
+        store = PackageStore(fixtures['lists'], cache_dir)
+        store.names()
+        store.versions()
+
+    def store_records():
+        # what opening the package dialogs and showing a page of rows does
+        store = PackageStore(fixtures['lists'], cache_dir)
+        names = store.names()
+        for i in range(0, len(names), max(len(names) // 20, 1)):
+            store.records(names[i])
+        for view in store.packages(names[0]) + [store.packages(names[i])[0] for i in range(20)]:
+            view.section, view.version, view.installed_size
+
+    # the indexes derived from the store, which is built already
+    def search_index_build():
+        index = SearchIndex(state['store'], cache_dir)
+        if os.path.exists(index.path):
+            os.remove(index.path)
+        index.search('x')
+
+    def search_queries():
+        index = SearchIndex(state['store'], cache_dir)
+        for query in ('p', 'py', 'python', 'pkg1 library', 'network server', 'pkg59999-library'):
+            index.search(query)
+
+    def dpkg_status():
+        dpkg = DpkgStatus(fixtures['status'])
+        state['installed'] = dpkg.installed()
+        state['installed_versions'] = dpkg.versions()
+
+    def show_output():
+        lines = []
+        assembler = LineAssembler(lines.extend)
+        for chunk in _chunks(fixtures['show']):
+            assembler.feed(chunk)
+        assembler.close()
+        packages = {}
+        for record in iter_records(lines):
+            packages.setdefault(record['Package'], []).append(record)
+            record.html('Description')
+
+    def search_output():
+        # the lines "apt-cache search" prints
+        data = '\n'.join(n + ' - ' + _WORDS[i % 11] for i, n in enumerate(state['names'])).encode('utf-8')
+        names = []
+        assembler = LineAssembler(lambda lines: names.extend(
+            l.split(' - ', 1)[0].strip() for l in lines if ' - ' in l))
+        for chunk in _chunks(data):
+            assembler.feed(chunk)
+        assembler.close()
+
+    def list_model():
+        # what the list model does for "List all"
+        names = state['names']
+        mark_installed(BitSet(len(names)), names, state['installed'])
+        table = PrefixTable(names)
+        for letter in table.prefixes():
+            table.find(letter)
+
+    def upgradable():
+        find_upgradable(state['installed_versions'], state['names'], state['versions'])
+
+    def dependency_index_build():
+        index = DependencyIndex(state['store'], cache_dir)
+        if os.path.exists(index.path):
+            os.remove(index.path)
+        state['depends'] = index
+        index.depends(_name(0))
+
+    def dependency_preview():
+        installed = InstalledGraph(fixtures['status'])
+        for i in range(0, len(state['names']), max(len(state['names']) // 20, 1)):
+            preview(state['depends'], installed, state['names'][i])
+
+    def facet_index_build():
+        index = FacetIndex(state['store'], cache_dir)
+        if os.path.exists(index.path):
+            os.remove(index.path)
+        state['facets'] = index
+        index.names()
+
+    def facet_queries():
+        # what choosing a section and then the not installed packages does
+        index = state['facets']
+        installed = state['installed']
+        for filters in ({}, {SECTION: 'python'}, {SECTION: 'python', INSTALLED: NOT_INSTALLED}):
+            index.select(filters, installed)
+            for facet in (SECTION, ARCHITECTURE, INSTALLED):
+                others = dict((f, v) for f, v in filters.items() if f != facet)
+                index.counts(facet, index.select(others, installed), installed)
+
+    def file_index_build():
+        index = FileIndex(fixtures['status'], fixtures['info'], cache_dir)
+        if os.path.exists(index.path):
+            os.remove(index.path)
+        state['files'] = index
+        len(index)
+
+    def file_queries():
+        index = state['files']
+        for name in state['installed'][::max(len(state['installed']) // 20, 1)]:
+            index.owners('/usr/bin/' + name)
+        for query in ('bin/', 'python', 'no such file'):
+            index.search(query)
+
+    def snapshot():
+        path = os.path.join(cache_dir, 'snapshot.idx')
+        save_snapshot(state['names'], state['installed'], 'List all', path)
+        loaded = load_snapshot(path)
+        diff_names(loaded.names, state['names'])
+        diff_names(loaded.installed, state['installed'])
+
+    return [('store_build', store_build), ('store_load', store_load), ('store_records', store_records),
+            ('search_index_build', search_index_build), ('search_queries', search_queries),
+            ('dpkg_status', dpkg_status), ('show_output', show_output),
+            ('search_output', search_output), ('list_model', list_model),
+            ('upgradable', upgradable), ('dependency_index_build', dependency_index_build),
+            ('dependency_preview', dependency_preview), ('facet_index_build', facet_index_build),
+            ('facet_queries', facet_queries), ('file_index_build', file_index_build),
+            ('file_queries', file_queries), ('snapshot', snapshot)]
+
+
+def _measure(function, repeat):
+    # timing without tracemalloc which slows down allocations
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    try:
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def _commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(packages=60000, installed=2000, versions=3, repeat=3, only=None):
+    """\
+    Runs the benchmarks.
+
+    :param int packages: Number of available packages.
+    :param int installed: Number of installed packages.
+    :param int versions: Number of versions per package in the show output.
+    :param int repeat: Number of timed runs per stage.
+    :param only: A list of stage names to report, all by default.
+    :return: The results as a dict.
+    """
+    directory = tempfile.mkdtemp(prefix='apt-bench-')
+    try:
+        fixtures = make_fixtures(directory, packages, installed, versions)
+        results = OrderedDict()
+        for name, function in stages(fixtures, os.path.join(directory, 'cache')):
+            seconds, peak = _measure(function, repeat)
+            if only is None or name in only:
+                results[name] = OrderedDict([('seconds', seconds), ('peak_bytes', peak)])
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return OrderedDict([
+        ('commit', _commit()),
+        ('python', platform.python_version()),
+        ('machine', platform.machine()),
+        ('parameters', OrderedDict([('packages', packages), ('installed', installed),
+                                    ('versions', versions), ('repeat', repeat)])),
+        ('stages', results),
+    ])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks the Apt app without a display.')
+    parser.add_argument('--packages', type=int, default=60000, help='number of available packages')
+    parser.add_argument('--installed', type=int, default=2000, help='number of installed packages')
+    parser.add_argument('--versions', type=int, default=3, help='versions per shown package')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per stage')
+    parser.add_argument('--stage', action='append', help='report this stage only (repeatable)')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    results = run(args.packages, args.installed, args.versions, args.repeat, args.stage)
+    for name, result in results['stages'].items():
+        print('{0:20} {1:10.4f} s {2:10.1f} KiB'.format(name, result['seconds'],
+                                                        result['peak_bytes'] / 1024.0))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
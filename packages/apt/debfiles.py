@@ -0,0 +1,445 @@
+# -*- coding: utf-8 -*-
+"""\
+Readers for the files of the Debian package management.
+
+The readers work on the files directly, no ``dpkg`` or ``apt-cache``
+process is spawned.
+"""
+import os
+import re
+import glob
+import heapq
+import threading
+from collections import namedtuple
+
+DPKG_STATUS = '/var/lib/dpkg/status'
+DPKG_INFO = '/var/lib/dpkg/info'
+APT_LISTS = '/var/lib/apt/lists'
+
+# Read files in chunks of this size
+_CHUNK_SIZE = 1 << 16
+
+
+def file_stamp(path):
+    """\
+    Returns a value which changes whenever the file is modified.
+
+    :param str path: Path to the file.
+    :return: A tuple ``(mtime, size)`` or ``None`` if the file does not exist.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def iter_paragraphs(f, chunk_size=_CHUNK_SIZE):
+    """\
+    Yields the paragraphs ("stanzas") of a deb822 file.
+
+    The file is read in chunks, only the current chunk and the paragraph
+    which spans the chunk boundary are held in memory.
+
+    :param f: A file object opened in binary mode.
+    :param int chunk_size: Number of bytes to read at once.
+    :return: An iterator over the paragraphs (bytes).
+    """
+    rest = b''
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        paragraphs = (rest + chunk).split(b'\n\n')
+        rest = paragraphs.pop()
+        for paragraph in paragraphs:
+            paragraph = paragraph.strip(b'\n')
+            if paragraph:
+                yield paragraph
+    rest = rest.strip(b'\n')
+    if rest:
+        yield rest
+
+
+def paragraph_field(paragraph, name):
+    """\
+    Returns the (first line of the) value of a field of a paragraph.
+
+    :param bytes paragraph: The paragraph.
+    :param bytes name: The field name, i.e. ``b'Package'``.
+    :return: The stripped value (bytes) or ``None`` if the field is missing.
+    """
+    key = name + b':'
+    if paragraph.startswith(key):
+        start = len(key)
+    else:
+        start = paragraph.find(b'\n' + key)
+        if start < 0:
+            return None
+        start += len(key) + 1
+    end = paragraph.find(b'\n', start)
+    if end < 0:
+        end = len(paragraph)
+    return paragraph[start:end].strip()
+
+
+def _escape(s):
+    return s.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+class Record(dict):
+    """\
+    A paragraph of a deb822 file which maps the field names to their values.
+
+    The continuation lines of multi-line values are separated by newlines,
+    the leading space of each continuation line is removed.
+    """
+    def html(self, name):
+        """\
+        Returns the value of a field as HTML.
+
+        The value is escaped on request only. Continuation lines are joined,
+        a line containing a dot only starts a new paragraph.
+
+        :param str name: The field name.
+        """
+        lines = self[name].split('\n')
+        result = [_escape(lines[0])]
+        for line in lines[1:]:
+            line = line.strip()
+            if line == '.':
+                result.append('<br/><p>')
+            else:
+                result.append(' ' + _escape(line))
+        return ''.join(result)
+
+
+def iter_records(lines):
+    """\
+    Parses deb822 data, i.e. the output of ``apt-cache show``, the dpkg status
+    file or a "Packages" file.
+
+    The data is processed in one pass, each paragraph is returned as soon as
+    it is complete.
+
+    :param lines: An iterable of lines (str), line terminators are ignored.
+    :return: An iterator over :class:`Record` instances.
+    """
+    record = Record()
+    name = None
+    continuation = None
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if not line.strip():
+            # An empty line finishes the paragraph
+            if continuation:
+                record[name] = '\n'.join(continuation)
+                continuation = None
+            if record:
+                yield record
+                record = Record()
+            name = None
+        elif line[0] in ' \t':
+            # Lines starting with space extend the value of the previous field
+            if name is not None:
+                if continuation is None:
+                    continuation = [record[name]]
+                continuation.append(line[1:])
+        else:
+            if continuation:
+                record[name] = '\n'.join(continuation)
+                continuation = None
+            field, colon, value = line.partition(':')
+            if colon:
+                name = field.strip()
+                record[name] = value.strip()
+            else:
+                name = None
+    if continuation:
+        record[name] = '\n'.join(continuation)
+    if record:
+        yield record
+
+
+def read_records(path):
+    """\
+    Reads all paragraphs of a deb822 file.
+
+    :param str path: The path to the file, i.e. the dpkg status file.
+    :return: An iterator over :class:`Record` instances.
+    """
+    with open(path, 'rb') as f:
+        for paragraph in iter_paragraphs(f):
+            for record in iter_records(paragraph.decode('utf-8', 'replace').split('\n')):
+                yield record
+
+
+# The uncompressed translations of the descriptions, the language is
+# the suffix, i.e. "..._i18n_Translation-en"
+_TRANSLATION_PATTERN = re.compile(r'_Translation-([A-Za-z_]+)$')
+
+
+def _order(c):
+    # Sort order of a non-digit character, see dpkg's lib/dpkg/version.c
+    if c == '~':
+        return -1
+    if 'A' <= c <= 'Z' or 'a' <= c <= 'z':
+        return ord(c)
+    return ord(c) + 256
+
+
+def _isdigit(s, i):
+    return i < len(s) and '0' <= s[i] <= '9'
+
+
+def _verrevcmp(a, b):
+    # Compares upstream versions or revisions acc. to dpkg
+    i = j = 0
+    while i < len(a) or j < len(b):
+        # Compare the non-digit prefix
+        while (i < len(a) and not _isdigit(a, i)) or (j < len(b) and not _isdigit(b, j)):
+            ac = _order(a[i]) if i < len(a) and not _isdigit(a, i) else 0
+            bc = _order(b[j]) if j < len(b) and not _isdigit(b, j) else 0
+            if ac != bc:
+                return ac - bc
+            i += 1
+            j += 1
+        # Compare the numeric part
+        while i < len(a) and a[i] == '0':
+            i += 1
+        while j < len(b) and b[j] == '0':
+            j += 1
+        first_diff = 0
+        while _isdigit(a, i) and _isdigit(b, j):
+            if not first_diff:
+                first_diff = ord(a[i]) - ord(b[j])
+            i += 1
+            j += 1
+        if _isdigit(a, i):
+            return 1
+        if _isdigit(b, j):
+            return -1
+        if first_diff:
+            return first_diff
+    return 0
+
+
+def split_version(version):
+    """\
+    Splits a Debian version into epoch, upstream version and revision.
+
+    :param str version: The version, i.e. ``1:2.0-3``
+    :return: A tuple ``(epoch (int), upstream version, revision)``
+    """
+    epoch = 0
+    colon = version.find(':')
+    if colon >= 0 and version[:colon].isdigit():
+        epoch = int(version[:colon])
+        version = version[colon + 1:]
+    upstream, dash, revision = version.rpartition('-')
+    if not dash:
+        upstream, revision = revision, ''
+    return epoch, upstream, revision
+
+
+def version_compare(a, b):
+    """\
+    Compares two Debian versions like ``dpkg --compare-versions``.
+
+    :param str a: A version.
+    :param str b: Another version.
+    :return: A negative number if `a` is older than `b`, ``0`` if the versions
+             are equal or a positive number if `a` is newer than `b`.
+    """
+    if a == b:
+        return 0
+    a_epoch, a_upstream, a_revision = split_version(a)
+    b_epoch, b_upstream, b_revision = split_version(b)
+    if a_epoch != b_epoch:
+        return a_epoch - b_epoch
+    return _verrevcmp(a_upstream, b_upstream) or _verrevcmp(a_revision, b_revision)
+
+
+# The end of the package name within a relation, i.e. "libc6:any (>= 2.28) [armhf]"
+_RELATION_NAME_END = re.compile(r'[\s:(\[<]')
+
+
+def parse_relations(value):
+    """\
+    Parses a relationship field like ``Depends`` or ``Provides``.
+
+    Version constraints, architecture qualifiers and restrictions are
+    ignored.
+
+    :param str value: The field value, i.e. ``libc6 (>= 2.28), mawk | gawk``
+    :return: A list of groups, each a list of alternative package names,
+             i.e. ``[['libc6'], ['mawk', 'gawk']]``.
+    """
+    groups = []
+    for group in value.split(','):
+        names = []
+        for alternative in group.split('|'):
+            alternative = alternative.strip()
+            if alternative:
+                m = _RELATION_NAME_END.search(alternative)
+                names.append(alternative[:m.start()] if m else alternative)
+        if names:
+            groups.append(names)
+    return groups
+
+
+def packages_files(lists_dir=APT_LISTS):
+    """\
+    Returns the sorted list of the "Packages" files apt downloaded.
+
+    :param str lists_dir: The apt lists directory.
+    """
+    return sorted(glob.glob(os.path.join(lists_dir, '*_Packages')))
+
+
+def translation_files(lists_dir=APT_LISTS):
+    """\
+    Returns the list of the "Translation" files apt downloaded, the
+    English ones first.
+
+    Debian moves the descriptions from the "Packages" files to these
+    files, the packages only keep their ``Description-md5``.
+
+    :param str lists_dir: The apt lists directory.
+    """
+    paths = [path for path in glob.glob(os.path.join(lists_dir, '*_Translation-*'))
+             if _TRANSLATION_PATTERN.search(path)]
+    return sorted(paths, key=lambda path: (not path.endswith('-en'), path))
+
+
+def read_translations(path, translations=None):
+    """\
+    Reads the short descriptions from a "Translation" file.
+
+    :param str path: Path to the file, the language is the suffix of the
+                     name, i.e. ``..._Translation-en``.
+    :param dict translations: A dict to update, a new dict is created by
+                              default. Known descriptions are kept.
+    :return: A dict mapping the ``Description-md5`` to the first line of the
+             description (both bytes).
+    """
+    if translations is None:
+        translations = {}
+    m = _TRANSLATION_PATTERN.search(path)
+    if m is None:
+        return translations
+    field = 'Description-{0}'.format(m.group(1)).encode('ascii')
+    with open(path, 'rb') as f:
+        for paragraph in iter_paragraphs(f):
+            md5 = paragraph_field(paragraph, b'Description-md5')
+            description = paragraph_field(paragraph, field)
+            if md5 and description:
+                translations.setdefault(md5, description)
+    return translations
+
+
+def read_installed(path=DPKG_STATUS):
+    """\
+    Reads the installed packages from the dpkg status file.
+
+    :param str path: Path to the dpkg status file.
+    :return: A dict mapping the package names to the installed versions.
+    """
+    versions = {}
+    with open(path, 'rb') as f:
+        for paragraph in iter_paragraphs(f):
+            status = paragraph_field(paragraph, b'Status')
+            # "install ok installed", "hold ok installed", ...
+            if status is not None and status.endswith(b' installed'):
+                name = paragraph_field(paragraph, b'Package').decode('utf-8')
+                version = paragraph_field(paragraph, b'Version')
+                versions[name] = version.decode('utf-8') if version is not None else ''
+    return versions
+
+
+DiskUsage = namedtuple('DiskUsage', ['largest', 'total', 'count'])
+DiskUsage.__doc__ = """\
+The disk space used by the installed packages.
+
+``largest`` is a list of tuples ``(name, size)`` of the largest packages,
+the largest first. ``total`` is the size of all ``count`` installed
+packages. Sizes are in KiB like dpkg's ``Installed-Size``.
+"""
+
+
+def read_disk_usage(path=DPKG_STATUS, n=100):
+    """\
+    Finds the largest installed packages in one pass over the dpkg status
+    file.
+
+    Only the `n` largest packages are kept while reading.
+
+    :param str path: Path to the dpkg status file.
+    :param int n: Number of packages to return.
+    :return: A :class:`DiskUsage` instance.
+    """
+    heap = []
+    total = count = 0
+    with open(path, 'rb') as f:
+        for paragraph in iter_paragraphs(f):
+            status = paragraph_field(paragraph, b'Status')
+            if status is None or not status.endswith(b' installed'):
+                continue
+            size = paragraph_field(paragraph, b'Installed-Size')
+            size = int(size) if size is not None and size.isdigit() else 0
+            total += size
+            count += 1
+            # A min-heap of the largest packages found so far
+            if len(heap) < n:
+                heapq.heappush(heap, (size, paragraph_field(paragraph, b'Package')))
+            elif size > heap[0][0]:
+                heapq.heapreplace(heap, (size, paragraph_field(paragraph, b'Package')))
+    largest = [(name.decode('utf-8'), size) for size, name in sorted(heap, reverse=True)]
+    return DiskUsage(largest=largest, total=total, count=count)
+
+
+class DpkgStatus(object):
+    """\
+    Provides the installed packages.
+
+    The dpkg status file is only read again if its modification time
+    or size changed.
+    """
+    def __init__(self, path=DPKG_STATUS):
+        """\
+        :param str path: Path to the dpkg status file.
+        """
+        self.path = path
+        self._stamp = None
+        self._installed = []
+        self._versions = {}
+        # the status may be read by a worker thread
+        self._lock = threading.Lock()
+
+    def changed(self):
+        """\
+        Returns if the status file was modified since it was read.
+        """
+        return file_stamp(self.path) != self._stamp
+
+    def _update(self):
+        with self._lock:
+            stamp = file_stamp(self.path)
+            if stamp != self._stamp:
+                self._versions = read_installed(self.path) if stamp is not None else {}
+                self._installed = sorted(self._versions)
+                self._stamp = stamp
+
+    def installed(self):
+        """\
+        Returns the sorted list of installed package names.
+        """
+        self._update()
+        return self._installed
+
+    def versions(self):
+        """\
+        Returns a dict mapping the installed packages to their versions.
+        """
+        self._update()
+        return self._versions
@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+"""\
+Dependency graphs to preview what installing or removing a package does.
+
+The previews follow ``Depends`` and ``Pre-Depends`` only and ignore version
+constraints, conflicts and pinning. They are meant to give an idea of the
+impact at once, apt-get still decides what is actually done.
+"""
+from array import array
+from collections import namedtuple
+from debfiles import DPKG_STATUS, file_stamp, iter_paragraphs, paragraph_field, parse_relations
+from pkgindex import DerivedIndex, PackageNames, uint_array
+from metastore import PRE_DEPENDS, DEPENDS, PROVIDES
+
+_DEPENDS_FIELDS = (b'Pre-Depends', b'Depends')
+
+Impact = namedtuple('Impact', ['installed', 'install', 'download_size', 'installed_size',
+                               'remove', 'freed_size'])
+Impact.__doc__ = """\
+The preview of installing and removing a package.
+
+``installed`` tells if the package is installed already.
+``install`` and ``remove`` are sorted lists of the other packages which
+are installed or removed as well. The download size is in bytes, the
+installed and freed sizes in KiB, like dpkg's ``Installed-Size``.
+"""
+
+
+def _field(paragraph, name):
+    value = paragraph_field(paragraph, name)
+    return value.decode('utf-8', 'replace') if value is not None else ''
+
+
+def _int_field(paragraph, name):
+    value = paragraph_field(paragraph, name)
+    return int(value) if value is not None and value.isdigit() else 0
+
+
+def _depends(paragraph):
+    groups = []
+    for name in _DEPENDS_FIELDS:
+        groups.extend(parse_relations(_field(paragraph, name)))
+    return groups
+
+
+def _provides(paragraph):
+    return [group[0] for group in parse_relations(_field(paragraph, b'Provides'))]
+
+
+class DependencyIndex(DerivedIndex):
+    """\
+    The dependencies and sizes of the newest version of each package of a
+    :class:`metastore.PackageStore`.
+
+    The package names and the virtual package names get consecutive ids,
+    the dependencies are stored as arrays of ids: for each group the number
+    of alternatives followed by their ids. The sizes are read from the
+    store.
+    """
+    FILENAME = 'depends.idx'
+    MAGIC = b'PKGDEPS2'
+
+    def _relations(self, field):
+        # The parsed field of the newest version of each package, each
+        # distinct value of the store is parsed once
+        pool, ids = self.store.column(field)
+        parsed = [parse_relations(value) for value in pool]
+        return [parsed[ids[row]] for row in self.store.newest_rows()]
+
+    def _build(self, paths):
+        names = self.store.names()
+        pre_depends = self._relations(PRE_DEPENDS)
+        depends = self._relations(DEPENDS)
+        provides = self._relations(PROVIDES)
+        ids = dict((name, i) for i, name in enumerate(names))
+        providers = {}
+        for i, groups in enumerate(provides):
+            for group in groups:
+                providers.setdefault(group[0], array('I')).append(i)
+        # Unknown packages are kept as virtual packages without providers,
+        # they may be installed from elsewhere
+        for groups in pre_depends + depends:
+            for group in groups:
+                for target in group:
+                    if target not in ids and target not in providers:
+                        providers[target] = array('I')
+        virtuals = PackageNames.from_names(providers)
+
+        provider_offsets = array('I', [0])
+        provider_ids = array('I')
+        for virtual in virtuals:
+            provider_ids.extend(providers[virtual])
+            provider_offsets.append(len(provider_ids))
+
+        for i, virtual in enumerate(virtuals):
+            ids.setdefault(virtual, i + len(names))
+
+        depend_offsets = array('I', [0])
+        depend_ids = array('I')
+        for i in range(len(names)):
+            for group in pre_depends[i] + depends[i]:
+                depend_ids.append(len(group))
+                depend_ids.extend(ids[t] for t in group)
+            depend_offsets.append(len(depend_ids))
+        return virtuals.sections() + [provider_offsets, provider_ids, depend_offsets, depend_ids]
+
+    def _load(self, sections):
+        # the packages of the store, then the virtual packages
+        self._names = self.store.names()
+        self._newest = self.store.newest_rows()
+        self._download_sizes = self.store.numbers('Size')
+        self._installed_sizes = self.store.numbers('Installed-Size')
+        self._virtuals = PackageNames.from_sections(*sections[0:2])
+        self._provider_offsets = uint_array(sections[2])
+        self._provider_ids = uint_array(sections[3])
+        self._depend_offsets = uint_array(sections[4])
+        self._depend_ids = uint_array(sections[5])
+
+    def _name(self, i):
+        if i < len(self._names):
+            return self._names[i]
+        return self._virtuals[i - len(self._names)]
+
+    def _providers(self, i):
+        i -= len(self._names)
+        return self._provider_ids[self._provider_offsets[i]:self._provider_offsets[i + 1]]
+
+    def _groups(self, i):
+        ids = self._depend_ids[self._depend_offsets[i]:self._depend_offsets[i + 1]]
+        pos = 0
+        while pos < len(ids):
+            count = ids[pos]
+            yield ids[pos + 1:pos + 1 + count]
+            pos += count + 1
+
+    def sizes(self, name):
+        """\
+        Returns the download size (bytes) and the installed size (KiB) of a
+        package or ``None`` if the package is unknown.
+        """
+        self._update()
+        return self._sizes(name)
+
+    def _sizes(self, name):
+        i = self._names.find(name)
+        if i < 0:
+            return None
+        row = self._newest[i]
+        return self._download_sizes[row], self._installed_sizes[row]
+
+    def depends(self, name):
+        """\
+        Returns the dependencies of a package.
+
+        :param str name: The package name.
+        :return: A list of groups of alternative package names.
+        """
+        self._update()
+        i = self._names.find(name)
+        if i < 0:
+            return []
+        return [[self._name(t) for t in group] for group in self._groups(i)]
+
+    def install_set(self, name, installed):
+        """\
+        Returns the packages which are installed along with a package.
+
+        Unsatisfied dependencies are resolved with the first alternative, a
+        virtual package by its first provider.
+
+        :param str name: The package name.
+        :param InstalledGraph installed: The installed packages.
+        :return: A sorted list of the names of the packages to install
+                 including `name` unless it is installed already.
+        """
+        self._update()
+        return self._install_set(name, installed)
+
+    def _install_set(self, name, installed):
+        first = self._names.find(name)
+        if first < 0:
+            return []
+        count = len(self._names)
+        selected = {first}
+        queue = [first]
+        while queue:
+            for group in self._groups(queue.pop()):
+                satisfied = False
+                choice = None
+                for t in group:
+                    if installed.satisfies(self._name(t)):
+                        satisfied = True
+                        break
+                    candidates = [t] if t < count else self._providers(t)
+                    if any(c in selected for c in candidates):
+                        satisfied = True
+                        break
+                    if choice is None and len(candidates) > 0:
+                        choice = candidates[0]
+                if not satisfied and choice is not None:
+                    selected.add(choice)
+                    queue.append(choice)
+        if name in installed:
+            selected.discard(first)
+        return sorted(self._names[i] for i in selected)
+
+    def total_size(self, names):
+        """\
+        Returns the download size (bytes) and installed size (KiB) of
+        several packages.
+        """
+        self._update()
+        return self._total_size(names)
+
+    def _total_size(self, names):
+        download = installed = 0
+        for name in names:
+            sizes = self._sizes(name)
+            if sizes is not None:
+                download += sizes[0]
+                installed += sizes[1]
+        return download, installed
+
+
+class InstalledGraph(object):
+    """\
+    The dependencies of the installed packages read from the dpkg status
+    file, with a reverse lookup.
+
+    The status file is only read again if it was modified.
+    """
+    def __init__(self, path=DPKG_STATUS):
+        """\
+        :param str path: Path to the dpkg status file.
+        """
+        self.path = path
+        self._stamp = None
+        self._depends = {}
+        self._sizes = {}
+        self._providers = {}
+        self._provides = {}
+        self._reverse = None
+
+    def _update(self):
+        stamp = file_stamp(self.path)
+        if stamp == self._stamp:
+            return
+        self._depends = {}
+        self._sizes = {}
+        self._providers = {}
+        self._provides = {}
+        self._reverse = None
+        if stamp is not None:
+            with open(self.path, 'rb') as f:
+                for paragraph in iter_paragraphs(f):
+                    status = paragraph_field(paragraph, b'Status')
+                    if status is None or not status.endswith(b' installed'):
+                        continue
+                    name = _field(paragraph, b'Package')
+                    self._depends[name] = _depends(paragraph)
+                    self._sizes[name] = _int_field(paragraph, b'Installed-Size')
+                    self._provides[name] = _provides(paragraph)
+                    for virtual in self._provides[name]:
+                        self._providers.setdefault(virtual, []).append(name)
+        self._stamp = stamp
+
+    def __contains__(self, name):
+        self._update()
+        return name in self._depends
+
+    def satisfies(self, name):
+        """\
+        Returns if a package of this name or providing it is installed.
+        """
+        self._update()
+        return name in self._depends or name in self._providers
+
+    def installed_size(self, name):
+        """\
+        Returns the installed size of a package in KiB.
+        """
+        self._update()
+        return self._sizes.get(name, 0)
+
+    def reverse(self, name):
+        """\
+        Returns the installed packages which depend on a package or on a
+        virtual package it provides.
+
+        :param str name: The package name.
+        :return: A set of names.
+        """
+        self._update()
+        if self._reverse is None:
+            self._reverse = {}
+            for package, groups in self._depends.items():
+                for group in groups:
+                    for target in group:
+                        self._reverse.setdefault(target, set()).add(package)
+        result = set(self._reverse.get(name, ()))
+        for virtual in self._provides.get(name, ()):
+            result.update(self._reverse.get(virtual, ()))
+        result.discard(name)
+        return result
+
+    def _available(self, name, removed):
+        if name in self._depends and name not in removed:
+            return True
+        return any(p not in removed for p in self._providers.get(name, ()))
+
+    def removal_set(self, name):
+        """\
+        Returns the installed packages which break if a package is removed
+        and thus are removed as well.
+
+        :param str name: The package name.
+        :return: A sorted list of names, without `name`.
+        """
+        self._update()
+        if name not in self._depends:
+            return []
+        removed = {name}
+        queue = [name]
+        while queue:
+            for package in self.reverse(queue.pop()):
+                if package in removed:
+                    continue
+                for group in self._depends[package]:
+                    if not any(self._available(t, removed) for t in group):
+                        removed.add(package)
+                        queue.append(package)
+                        break
+        removed.discard(name)
+        return sorted(removed)
+
+
+def preview(available, installed, name):
+    """\
+    Returns the impact of installing and of removing a package.
+
+    :param DependencyIndex available: The available packages.
+    :param InstalledGraph installed: The installed packages.
+    :param str name: The package name.
+    :return: An :class:`Impact` instance.
+    """
+    # the apt lists are checked once per preview
+    available._update()
+    install = available._install_set(name, installed)
+    download, installed_size = available._total_size(install)
+    remove = installed.removal_set(name)
+    freed = sum(installed.installed_size(n) for n in remove)
+    if name in installed:
+        freed += installed.installed_size(name)
+    return Impact(installed=name in installed,
+                  install=[n for n in install if n != name], download_size=download,
+                  installed_size=installed_size, remove=remove, freed_size=freed)
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""\
+Facets to browse the available packages by category.
+
+For each facet (the section, priority and architecture) the index keeps
+the value of each package and the sorted list of packages of each value.
+The values are those of the newest version in the package store. Whether
+a package is installed is a facet as well, it is taken from the dpkg
+status when the facets are queried.
+"""
+from array import array
+from collections import Counter
+from pkgindex import DerivedIndex, PackageNames, BitSet, mark_installed, uint_array
+
+SECTION, PRIORITY, ARCHITECTURE, INSTALLED = 'Section', 'Priority', 'Architecture', 'Installed'
+
+# The facets read from the apt lists
+FACETS = (SECTION, PRIORITY, ARCHITECTURE)
+
+# The values of the INSTALLED facet
+IS_INSTALLED, NOT_INSTALLED = 'installed', 'not installed'
+
+_UNKNOWN = 'unknown'
+
+
+def _value(value, facet):
+    # The facet value of a field of the store
+    if not value:
+        return _UNKNOWN
+    if facet == SECTION:
+        # "non-free/games" belongs to "games" as well, the store keeps the
+        # section as listed
+        value = value.rpartition('/')[2]
+    return value
+
+
+class FacetIndex(DerivedIndex):
+    """\
+    The facets of all packages of a :class:`metastore.PackageStore`.
+    """
+    FILENAME = 'facets.idx'
+    MAGIC = b'PKGFACT2'
+
+    _bits = None
+
+    def _build(self, paths):
+        names = self.store.names()
+        newest = self.store.newest_rows()
+        sections = []
+        for facet in FACETS:
+            pool, field_ids = self.store.column(facet)
+            # the facet value of each distinct field
+            field_values = [_value(value, facet) for value in pool]
+            postings = {}
+            for row in range(len(names)):
+                postings.setdefault(field_values[field_ids[newest[row]]], array('I')).append(row)
+            values = PackageNames.from_names(postings)
+            ids = array('I', bytes(4 * len(names)))
+            offsets = array('I', [0])
+            rows = array('I')
+            for value_id, value in enumerate(values):
+                for row in postings[value]:
+                    ids[row] = value_id
+                rows.extend(postings[value])
+                offsets.append(len(rows))
+            sections.extend(values.sections() + [ids, offsets, rows])
+        return sections
+
+    def _load(self, sections):
+        # the rows are the packages of the store
+        self._names = self.store.names()
+        self._facets = {}
+        for i, facet in enumerate(FACETS):
+            first = 5 * i
+            self._facets[facet] = (PackageNames.from_sections(*sections[first:first + 2]),
+                                   uint_array(sections[first + 2]),
+                                   uint_array(sections[first + 3]),
+                                   uint_array(sections[first + 4]))
+
+    def names(self):
+        """\
+        Returns the names of all packages (a :class:`PackageNames` instance),
+        the rows returned by :meth:`select` are indexes of this sequence.
+        """
+        self._update()
+        return self._names
+
+    def _installed(self, installed):
+        # The installed list of DpkgStatus is only replaced if it changed
+        if self._bits is None or self._bits[0] is not installed or self._bits[1] is not self._names:
+            self._bits = (installed, self._names,
+                          mark_installed(BitSet(len(self._names)), self._names, installed))
+        return self._bits[2]
+
+    def _rows(self, facet, value, installed):
+        # The set of the rows of one facet value
+        if facet == INSTALLED:
+            bits = self._installed(installed)
+            if value == IS_INSTALLED:
+                return set(bits)
+            return set(range(len(self._names))) - set(bits)
+        values, ids, offsets, rows = self._facets[facet]
+        i = values.find(value)
+        if i < 0:
+            return set()
+        return set(rows[offsets[i]:offsets[i + 1]])
+
+    def select(self, filters, installed=()):
+        """\
+        Returns the packages which have all of the provided facet values.
+
+        :param dict filters: Maps facets to the required values.
+        :param installed: An iterable of the installed package names.
+        :return: A sorted list of rows or ``None`` if there are no filters,
+                 meaning all packages.
+        """
+        self._update()
+        result = None
+        for facet, value in filters.items():
+            rows = self._rows(facet, value, installed)
+            result = rows if result is None else result & rows
+        return sorted(result) if result is not None else None
+
+    def counts(self, facet, rows=None, installed=()):
+        """\
+        Counts the packages of each value of a facet.
+
+        :param str facet: The facet.
+        :param rows: The rows to count as returned by :meth:`select`, all
+                     packages by default.
+        :param installed: An iterable of the installed package names, used
+                          for the ``INSTALLED`` facet only.
+        :return: A list of tuples ``(value, count)``, the most frequent value
+                 first. Values without packages are omitted.
+        """
+        self._update()
+        if facet == INSTALLED:
+            bits = self._installed(installed)
+            if rows is None:
+                found = bits.count()
+                total = len(self._names)
+            else:
+                found = sum(1 for row in rows if row in bits)
+                total = len(rows)
+            counts = [(IS_INSTALLED, found), (NOT_INSTALLED, total - found)]
+        else:
+            values, ids, offsets, postings = self._facets[facet]
+            if rows is None:
+                counts = [(values[i], offsets[i + 1] - offsets[i]) for i in range(len(values))]
+            else:
+                counts = [(values[i], n) for i, n in Counter(ids[row] for row in rows).items()]
+        counts.sort(key=lambda c: (-c[1], c[0]))
+        return [c for c in counts if c[1] > 0]
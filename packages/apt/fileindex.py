@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""\
+Index of the files installed by the packages, like ``dpkg -S``.
+
+The index is built from the ``/var/lib/dpkg/info/*.list`` files. Each
+directory is stored once, the files are stored by their base name grouped
+by directory. It is rebuilt whenever the dpkg status changed.
+"""
+import os
+import glob
+import heapq
+import bisect
+from array import array
+from debfiles import DPKG_STATUS, DPKG_INFO
+from pkgindex import CACHE_DIR, CachedIndex, PackageNames, uint_array
+
+# Read the file lists in chunks of this size
+_CHUNK_SIZE = 1 << 16
+
+
+def list_file(name, info_dir=DPKG_INFO):
+    """\
+    Returns the path of the file list of an installed package.
+
+    :param str name: The package name, optionally with architecture.
+    :param str info_dir: The dpkg info directory.
+    :return: The path or ``None`` if the package is not installed.
+    """
+    path = os.path.join(info_dir, name + '.list')
+    if os.path.exists(path):
+        return path
+    # Packages of "Multi-Arch: same" have the architecture in the name
+    found = glob.glob(os.path.join(info_dir, glob.escape(name) + ':*.list'))
+    return found[0] if found else None
+
+
+def iter_package_files(name, info_dir=DPKG_INFO):
+    """\
+    Yields the files installed by a package while the list is read.
+
+    :param str name: The package name.
+    :param str info_dir: The dpkg info directory.
+    :return: An iterator over lists of paths (str).
+    """
+    path = list_file(name, info_dir)
+    if path is None:
+        return
+    rest = b''
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(_CHUNK_SIZE)
+            if not chunk:
+                break
+            lines = (rest + chunk).split(b'\n')
+            rest = lines.pop()
+            yield [l.decode('utf-8', 'surrogateescape') for l in lines if l and l != b'/.']
+    if rest and rest != b'/.':
+        yield [rest.decode('utf-8', 'surrogateescape')]
+
+
+def _split(path):
+    # "/usr/bin/vim" -> (b"/usr/bin", b"vim"), "/bin" -> (b"/", b"bin")
+    directory, _, name = path.rpartition(b'/')
+    return directory or b'/', name
+
+
+class FileIndex(CachedIndex):
+    """\
+    Maps the installed files to their packages.
+    """
+    FILENAME = 'files.idx'
+    MAGIC = b'PKGFILE1'
+
+    def __init__(self, status=DPKG_STATUS, info_dir=DPKG_INFO, cache_dir=CACHE_DIR):
+        """\
+        :param str status: Path to the dpkg status file.
+        :param str info_dir: The dpkg info directory.
+        :param str cache_dir: Directory to store the index.
+        """
+        super(FileIndex, self).__init__(cache_dir=cache_dir)
+        self.status = status
+        self.info_dir = info_dir
+
+    def _sources(self):
+        # dpkg writes the status whenever a package was (un)installed
+        return [self.status]
+
+    def _build(self, paths):
+        entries = []
+        packages = set()
+        for path in glob.glob(os.path.join(self.info_dir, '*.list')):
+            name = os.path.basename(path)[:-len('.list')].split(':', 1)[0].encode('utf-8')
+            packages.add(name)
+            with open(path, 'rb') as f:
+                for line in f:
+                    line = line.rstrip(b'\n')
+                    if line and line != b'/.':
+                        entries.append(_split(line) + (name,))
+        entries.sort()
+        packages = PackageNames.from_names(packages)
+        ids = dict((packages.raw(i), i) for i in range(len(packages)))
+        directories = PackageNames.from_names(set(e[0] for e in entries))
+        offsets = array('I', [0])
+        owners = array('I')
+        for i, (directory, name, package) in enumerate(entries):
+            if i > 0 and directory != entries[i - 1][0]:
+                offsets.append(i)
+            owners.append(ids[package])
+        offsets.append(len(entries))
+        if not entries:
+            offsets = array('I', [0])
+        names = PackageNames.from_strings(e[1] for e in entries)
+        return packages.sections() + directories.sections() + [offsets] + names.sections() + [owners]
+
+    def _load(self, sections):
+        self._packages = PackageNames.from_sections(*sections[0:2])
+        self._directories = PackageNames.from_sections(*sections[2:4])
+        self._offsets = uint_array(sections[4])
+        self._names = PackageNames.from_sections(*sections[5:7])
+        self._owners = uint_array(sections[7])
+
+    def __len__(self):
+        self._update()
+        return len(self._names)
+
+    def owners(self, path):
+        """\
+        Returns the packages which installed a file or directory.
+
+        :param str path: The absolute path.
+        :return: A sorted list of package names.
+        """
+        self._update()
+        directory, name = _split(path.rstrip('/').encode('utf-8', 'surrogateescape'))
+        d = self._directories.find(directory)
+        if d < 0:
+            return []
+        last = self._offsets[d + 1]
+        i = self._names.bisect(name, self._offsets[d], last)
+        result = []
+        while i < last and self._names.raw(i) == name:
+            result.append(self._packages[self._owners[i]])
+            i += 1
+        return result
+
+    def _files(self, directories):
+        # yields the files of the directories
+        for d in directories:
+            for i in range(self._offsets[d], self._offsets[d + 1]):
+                yield i
+
+    def _starting(self, directories, name):
+        # yields the files of the directories starting with a name
+        for d in directories:
+            last = self._offsets[d + 1]
+            first = self._names.bisect(name, self._offsets[d], last)
+            for i in range(first, self._names.bisect(name + b'\xff', first, last)):
+                yield i
+
+    def search(self, query, limit=200):
+        """\
+        Finds the files whose path contains a string.
+
+        The directories and the base names are searched separately, a query
+        with a slash matches the directories ending with the part before
+        the last slash.
+
+        :param str query: The string, i.e. ``bin/python3``
+        :param int limit: Maximum number of results.
+        :return: A list of tuples ``(path, package)`` sorted by path.
+        """
+        self._update()
+        query = query.encode('utf-8', 'surrogateescape')
+        if not query:
+            return []
+        # all files of a matching directory match
+        found = [self._files(self._directories.containing(query))]
+        if b'/' not in query:
+            found.append(self._names.containing(query))
+        else:
+            directory, _, name = query.rpartition(b'/')
+            if directory:
+                # the files of the root directory are found by the name
+                found.append(self._starting((d for d in self._directories.containing(directory, end=True)
+                                             if self._directories.raw(d) != b'/'), name))
+            else:
+                found.append(self._names.containing(name, start=True))
+
+        # the files are sorted by path
+        result = []
+        previous = None
+        for i in heapq.merge(*found):
+            if i == previous:
+                continue
+            previous = i
+            directory = self._directories.raw(bisect.bisect_right(self._offsets, i) - 1)
+            prefix = b'/' if directory == b'/' else directory + b'/'
+            result.append(((prefix + self._names.raw(i)).decode('utf-8', 'surrogateescape'),
+                           self._packages[self._owners[i]]))
+            if len(result) >= limit:
+                break
+        return result
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""\
+Reader of the apt history log.
+
+apt appends one paragraph per transaction to ``history.log``, logrotate
+moves older transactions to ``history.log.1.gz``, ``history.log.2.gz``
+and so on. The logs are read as a stream, only the position and start
+time of each transaction is kept in memory. The transactions themselves
+are read again when they are shown.
+"""
+import os
+import re
+import glob
+import gzip
+import time
+from array import array
+from collections import namedtuple
+from debfiles import file_stamp
+
+HISTORY_LOG = '/var/log/apt/history.log'
+
+# The fields listing the changed packages
+ACTIONS = ('Install', 'Reinstall', 'Upgrade', 'Downgrade', 'Remove', 'Purge')
+
+Transaction = namedtuple('Transaction', ['start', 'end', 'command', 'requested_by',
+                                         'changes', 'error'])
+Transaction.__doc__ = """\
+A transaction of the apt history.
+
+``changes`` is a list of tuples ``(action, packages)`` in the order of
+:data:`ACTIONS`, ``packages`` a list of tuples ``(name, versions)``,
+i.e. ``('vim:armhf', '2:8.1.0875-5, automatic')``.
+"""
+
+# "vim:armhf (2:8.1.0875-5, automatic)"
+_PACKAGE_PATTERN = re.compile(r'([^\s,()]+) \(([^)]*)\)')
+
+_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def history_files(path=HISTORY_LOG):
+    """\
+    Returns the history log and its rotated copies, the oldest first.
+
+    :param str path: Path to the current history log.
+    """
+    def rotation(name):
+        # history.log.3.gz -> 3, history.log.1 -> 1
+        number = name[len(path) + 1:].split('.', 1)[0]
+        return int(number) if number.isdigit() else 0
+
+    rotated = [p for p in glob.glob(path + '.*') if rotation(p) > 0]
+    rotated.sort(key=rotation, reverse=True)
+    if os.path.exists(path):
+        rotated.append(path)
+    return rotated
+
+
+def _open(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def parse_time(value):
+    """\
+    Converts a date of the history log to seconds since the epoch.
+
+    :param str value: The date, i.e. ``2019-07-10  12:56:29``
+    :return: The local time in seconds or ``0`` if the date is invalid.
+    """
+    try:
+        return int(time.mktime(time.strptime(' '.join(value.split()), _TIME_FORMAT)))
+    except (ValueError, OverflowError):
+        return 0
+
+
+def parse_transaction(lines):
+    """\
+    Parses the paragraph of a transaction.
+
+    :param lines: An iterable of lines (str).
+    :return: A :class:`Transaction`.
+    """
+    fields = {}
+    for line in lines:
+        name, colon, value = line.partition(':')
+        if colon:
+            fields[name.strip()] = value.strip()
+    changes = []
+    for action in ACTIONS:
+        if action in fields:
+            changes.append((action, _PACKAGE_PATTERN.findall(fields[action])))
+    return Transaction(start=fields.get('Start-Date', ''), end=fields.get('End-Date', ''),
+                       command=fields.get('Commandline', ''),
+                       requested_by=fields.get('Requested-By', ''),
+                       changes=changes, error=fields.get('Error', ''))
+
+
+class _LogFile(object):
+    # The transactions of one file: their offsets and start times
+    def __init__(self, path):
+        self.path = path
+        self.stamp = None
+        self.offsets = array('Q')
+        self.times = array('q')
+        self.end = 0
+
+    def scan(self):
+        stamp = file_stamp(self.path)
+        if stamp == self.stamp:
+            return
+        # The current log only grows until it is rotated, continue
+        # where the last scan ended
+        if self.path.endswith('.gz') or self.stamp is None or stamp[1] < self.stamp[1]:
+            self.offsets = array('Q')
+            self.times = array('q')
+            self.end = 0
+        with _open(self.path) as f:
+            f.seek(self.end)
+            pos = self.end
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # A line which is still being written
+                    break
+                if line.startswith(b'Start-Date:'):
+                    self.offsets.append(pos)
+                    self.times.append(parse_time(line[11:].decode('utf-8', 'replace')))
+                pos += len(line)
+            self.end = pos
+        self.stamp = stamp
+
+
+class HistoryIndex(object):
+    """\
+    The transactions of the apt history, the newest first.
+    """
+    def __init__(self, path=HISTORY_LOG):
+        """\
+        :param str path: Path to the current history log.
+        """
+        self.path = path
+        self._order = []
+        self._counts = array('I')
+
+    def update(self):
+        """\
+        Scans the logs which were modified since the last update.
+
+        Rotated logs are recognized by their modification time and size,
+        so they are not read again after logrotate renamed them.
+        """
+        known = list(self._order)
+        order = []
+        for path in history_files(self.path):
+            stamp = file_stamp(path)
+            log = next((l for l in known if l.path == path), None)
+            if log is None or (path != self.path and log.stamp != stamp):
+                # Look for the same file under its old name
+                log = next((l for l in known if l.stamp is not None and l.stamp == stamp), None)
+            if log is None:
+                log = _LogFile(path)
+            else:
+                known.remove(log)
+            log.path = path
+            log.scan()
+            order.append(log)
+        self._order = order
+        self._counts = array('I', [len(log.offsets) for log in order])
+
+    def __len__(self):
+        return sum(self._counts)
+
+    def _locate(self, i):
+        # Index of the file and of the transaction within, the newest first
+        if i < 0:
+            i += len(self)
+        for log in reversed(self._order):
+            if i < len(log.offsets):
+                return log, len(log.offsets) - 1 - i
+            i -= len(log.offsets)
+        raise IndexError(i)
+
+    def time(self, i):
+        """\
+        Returns the start time of a transaction in seconds since the epoch.
+
+        :param int i: The index, ``0`` is the newest transaction.
+        """
+        log, j = self._locate(i)
+        return log.times[j]
+
+    def page(self, first, count):
+        """\
+        Reads some transactions.
+
+        Each file is opened once per page and read from the oldest of the
+        requested transactions on.
+
+        :param int first: The index of the first transaction, ``0`` is the
+                          newest one.
+        :param int count: The maximum number of transactions.
+        :return: A list of :class:`Transaction` instances, the newest first.
+        """
+        result = []
+        last = min(first + count, len(self))
+        i = first
+        while i < last:
+            log, j = self._locate(i)
+            # transactions j, j-1, ... of this file are requested
+            n = min(last - i, j + 1)
+            lowest = j - n + 1
+            found = []
+            with _open(log.path) as f:
+                f.seek(log.offsets[lowest])
+                for k in range(lowest, j + 1):
+                    end = log.offsets[k + 1] if k + 1 < len(log.offsets) else log.end
+                    data = f.read(end - log.offsets[k])
+                    found.append(parse_transaction(data.decode('utf-8', 'replace').split('\n')))
+            result.extend(reversed(found))
+            i += n
+        return result
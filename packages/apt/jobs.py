@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""\
+Scheduling of the apt and dpkg processes.
+
+Read-only queries (``apt-cache``) may run concurrently, commands which
+modify the system (``apt-get``) take an exclusive lock and run alone.
+The scheduler does not start processes itself, it calls the provided
+launcher, so it can be used with ``QProcess`` or ``subprocess``.
+"""
+import itertools
+
+# Lower values are started first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BACKGROUND = 2
+
+PENDING, RUNNING, FINISHED, CANCELLED = 'pending', 'running', 'finished', 'cancelled'
+
+_sequence = itertools.count()
+
+
+class Job(object):
+    """\
+    A command to run.
+    """
+    def __init__(self, program, args, priority=PRIORITY_NORMAL, exclusive=False,
+                 on_output=None, on_finished=None, on_error=None):
+        """\
+        :param str program: The program to run.
+        :param list args: A list of arguments (strings).
+        :param int priority: One of the ``PRIORITY_*`` constants.
+        :param bool exclusive: ``True`` if the job must not run concurrently
+                               with any other job.
+        :param on_output: A function accepting a chunk of output (bytes).
+        :param on_finished: A function accepting the job and the exit code.
+                            It is not called if the job was cancelled.
+        :param on_error: A function accepting a chunk of the error output
+                         (bytes), the error output is discarded by default.
+        """
+        self.program = program
+        self.args = list(args)
+        self.priority = priority
+        self.exclusive = exclusive
+        self.on_output = on_output
+        self.on_finished = on_finished
+        self.on_error = on_error
+        self.state = PENDING
+        # The process handle, set by the launcher
+        self.process = None
+        # The report file and the resources used, set by the launcher if
+        # it measures them
+        self.report = None
+        self.usage = None
+        self._seq = next(_sequence)
+
+    def __repr__(self):
+        return '<Job {0} {1} ({2})>'.format(self.program, ' '.join(self.args), self.state)
+
+
+class Scheduler(object):
+    """\
+    Starts jobs acc. to their priority, a concurrency limit and the
+    exclusive lock.
+
+    A pending exclusive job blocks all jobs queued behind it, so it
+    cannot be starved by a stream of read-only queries.
+    """
+    def __init__(self, launch, terminate, max_jobs=2):
+        """\
+        :param launch: A function which starts the process of a job.
+        :param terminate: A function which stops the process of a running job.
+        :param int max_jobs: Maximum number of concurrently running jobs.
+        """
+        self._launch = launch
+        self._terminate = terminate
+        self.max_jobs = max_jobs
+        self._pending = []
+        self._running = []
+
+    @property
+    def running(self):
+        """\
+        Returns the list of running jobs.
+        """
+        return list(self._running)
+
+    @property
+    def pending(self):
+        """\
+        Returns the list of pending jobs in the order they will be started.
+        """
+        return sorted(self._pending, key=lambda job: (job.priority, job._seq))
+
+    def submit(self, job):
+        """\
+        Adds a job and starts it if possible.
+
+        :param Job job: The job.
+        :return: The job.
+        """
+        job.state = PENDING
+        self._pending.append(job)
+        self._schedule()
+        return job
+
+    def cancel(self, job):
+        """\
+        Cancels a pending job or terminates a running job.
+
+        :param Job job: The job.
+        """
+        if job.state == PENDING:
+            self._pending.remove(job)
+            job.state = CANCELLED
+        elif job.state == RUNNING:
+            job.state = CANCELLED
+            self._terminate(job)
+
+    def finished(self, job, code):
+        """\
+        Must be called when the process of a job finished.
+
+        :param Job job: The job.
+        :param int code: The exit code.
+        """
+        if job in self._running:
+            self._running.remove(job)
+        if job.state != CANCELLED:
+            job.state = FINISHED
+            if job.on_finished is not None:
+                job.on_finished(job, code)
+        self._schedule()
+
+    def _schedule(self):
+        for job in self.pending:
+            if job.state != PENDING:
+                # Started or cancelled by a nested call
+                continue
+            if len(self._running) >= self.max_jobs:
+                break
+            if any(running.exclusive for running in self._running):
+                break
+            if job.exclusive and self._running:
+                break
+            self._pending.remove(job)
+            self._running.append(job)
+            job.state = RUNNING
+            self._launch(job)
@@ -0,0 +1,404 @@
+# -*- coding: utf-8 -*-
+"""\
+Column-oriented store of the package records of the apt lists.
+
+Each paragraph of the "Packages" files is a row. The fields the views
+filter and sort by are kept in columns: strings which repeat (versions,
+sections, maintainers, ...) as ids into pools of unique strings, sizes as
+integers. Everything else, like the long description, stays in the
+"Packages" files. The store keeps the position of each paragraph and the
+files are memory-mapped, a paragraph is decoded when it is shown.
+
+Rows are sorted by package name, the versions of a package the newest
+first.
+
+The store is the only reader of the "Packages" files, the search, facet
+and dependency indexes are derived from its columns.
+"""
+import mmap
+from array import array
+from functools import cmp_to_key
+from debfiles import Record, iter_records, paragraph_field, version_compare, packages_files, \
+    translation_files, read_translations
+from pkgindex import CachedIndex, PackageNames, StringTable, uint_array
+
+VERSION, SECTION, PRIORITY, ARCHITECTURE, MAINTAINER = \
+    'Version', 'Section', 'Priority', 'Architecture', 'Maintainer'
+DESCRIPTION, PRE_DEPENDS, DEPENDS, PROVIDES = 'Description', 'Pre-Depends', 'Depends', 'Provides'
+
+# The fields kept as ids into string pools. The description is the first
+# line only, taken from the "Translation" files if the "Packages" files
+# just have its md5
+POOLED = (VERSION, SECTION, PRIORITY, ARCHITECTURE, MAINTAINER, DESCRIPTION,
+          PRE_DEPENDS, DEPENDS, PROVIDES)
+
+# The fields kept as integers
+NUMERIC = ('Installed-Size', 'Size')
+
+# Sections per pooled field: the pool (2) and the ids
+_POOL_SECTIONS = 3
+
+
+def _paragraphs(mm):
+    # Yields the start and end offsets of the paragraphs of a deb822 file
+    pos = 0
+    size = len(mm)
+    while pos < size:
+        while pos < size and mm[pos:pos + 1] == b'\n':
+            pos += 1
+        if pos >= size:
+            break
+        end = mm.find(b'\n\n', pos)
+        if end < 0:
+            end = size
+        yield pos, end
+        pos = end + 2
+
+
+def _map(path):
+    # Memory-maps a file, returns None if it is empty or unreadable
+    try:
+        with open(path, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+
+def _number(value):
+    # Integer columns are unsigned 32 bit
+    return min(int(value), 0xffffffff) if value is not None and value.isdigit() else 0
+
+
+def _pool(values):
+    # The unique values and the id of each value
+    pool = PackageNames.from_names(set(values))
+    ids = dict((pool.raw(i), i) for i in range(len(pool)))
+    return pool, array('I', [ids[v] for v in values])
+
+
+class PackageView(object):
+    """\
+    A row of the :class:`PackageStore`.
+
+    The fields are read from the columns on access, the views hold
+    nothing but the row.
+    """
+    __slots__ = ('_store', 'row')
+
+    def __init__(self, store, row):
+        self._store = store
+        self.row = row
+
+    @property
+    def name(self):
+        return self._store._names[self._store._name_ids[self.row]]
+
+    @property
+    def version(self):
+        return self._store.field(self.row, VERSION)
+
+    @property
+    def section(self):
+        return self._store.field(self.row, SECTION)
+
+    @property
+    def priority(self):
+        return self._store.field(self.row, PRIORITY)
+
+    @property
+    def architecture(self):
+        return self._store.field(self.row, ARCHITECTURE)
+
+    @property
+    def maintainer(self):
+        return self._store.field(self.row, MAINTAINER)
+
+    @property
+    def summary(self):
+        """\
+        The first line of the description.
+        """
+        return self._store.field(self.row, DESCRIPTION)
+
+    @property
+    def installed_size(self):
+        """\
+        The installed size in KiB.
+        """
+        return self._store._numbers['Installed-Size'][self.row]
+
+    @property
+    def size(self):
+        """\
+        The download size in bytes.
+        """
+        return self._store._numbers['Size'][self.row]
+
+    def paragraph(self):
+        """\
+        Returns the paragraph of the "Packages" file (bytes).
+        """
+        return self._store.paragraph(self.row)
+
+    def record(self):
+        """\
+        Parses the paragraph, returns a :class:`debfiles.Record`.
+        """
+        lines = self.paragraph().decode('utf-8', 'replace').split('\n')
+        record = next(iter_records(lines), Record())
+        if 'Description' not in record and self.summary:
+            # the text is in a "Translation" file
+            record['Description'] = self.summary
+        return record
+
+    @property
+    def description(self):
+        """\
+        The full description, decoded on access.
+        """
+        return self.record().get('Description', '')
+
+    def __repr__(self):
+        return 'PackageView({0!r}, {1!r})'.format(self.name, self.version)
+
+
+class PackageStore(CachedIndex):
+    """\
+    The records of all packages available in the apt lists.
+    """
+    FILENAME = 'metadata.idx'
+    MAGIC = b'PKGMETA2'
+
+    def _sources(self):
+        return packages_files(self.lists_dir) + translation_files(self.lists_dir)
+
+    def _build(self, paths):
+        rows = []
+        seen = set()
+        # one object per distinct value while the rows are collected
+        interned = [{} for f in POOLED]
+        description = POOLED.index(DESCRIPTION)
+        # the rows without a description and its md5
+        untranslated = []
+        translations = {}
+        for file_id, path in enumerate(paths):
+            if not path.endswith('_Packages'):
+                read_translations(path, translations)
+                continue
+            mm = _map(path)
+            if mm is None:
+                continue
+            try:
+                for start, end in _paragraphs(mm):
+                    paragraph = mm[start:end]
+                    name = paragraph_field(paragraph, b'Package')
+                    if name is None:
+                        continue
+                    fields = tuple(interned[k].setdefault(v, v) for k, v in enumerate(
+                        paragraph_field(paragraph, f.encode('ascii')) or b'' for f in POOLED))
+                    # the same version is often listed for several suites
+                    key = (name, fields[0], fields[3])
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    numbers = tuple(_number(paragraph_field(paragraph, f.encode('ascii'))) for f in NUMERIC)
+                    if not fields[description]:
+                        md5 = paragraph_field(paragraph, b'Description-md5')
+                        if md5:
+                            untranslated.append((len(rows), md5))
+                    rows.append((name, fields, numbers, file_id, start, end - start))
+            finally:
+                mm.close()
+        for i, md5 in untranslated:
+            text = translations.get(md5)
+            if text:
+                fields = list(rows[i][1])
+                fields[description] = interned[description].setdefault(text, text)
+                rows[i] = (rows[i][0], tuple(fields)) + rows[i][2:]
+
+        newest_first = cmp_to_key(lambda a, b: version_compare(b[1][0].decode('utf-8', 'replace'),
+                                                               a[1][0].decode('utf-8', 'replace')))
+        rows.sort(key=lambda r: r[0])
+        names = PackageNames.from_names(set(r[0] for r in rows))
+        first = array('I', [0])
+        ordered = []
+        i = 0
+        while i < len(rows):
+            j = i + 1
+            while j < len(rows) and rows[j][0] == rows[i][0]:
+                j += 1
+            ordered.extend(sorted(rows[i:j], key=newest_first) if j - i > 1 else rows[i:j])
+            first.append(j)
+            i = j
+
+        sections = names.sections() + [first]
+        sections += StringTable.from_strings(paths).sections()
+        sections += [array('I', [r[3] for r in ordered]),
+                     array('I', [r[4] for r in ordered]),
+                     array('I', [r[5] for r in ordered])]
+        for k in range(len(NUMERIC)):
+            sections.append(array('I', [r[2][k] for r in ordered]))
+        for k in range(len(POOLED)):
+            pool, ids = _pool([r[1][k] for r in ordered])
+            sections += pool.sections() + [ids]
+        return sections
+
+    def _load(self, sections):
+        self._close()
+        self._names = PackageNames.from_sections(*sections[0:2])
+        self._first = uint_array(sections[2])
+        self._paths = StringTable.from_sections(*sections[3:5])
+        self._files = uint_array(sections[5])
+        self._starts = uint_array(sections[6])
+        self._lengths = uint_array(sections[7])
+        self._numbers = {}
+        for k, f in enumerate(NUMERIC):
+            self._numbers[f] = uint_array(sections[8 + k])
+        self._pools = {}
+        pos = 8 + len(NUMERIC)
+        for f in POOLED:
+            self._pools[f] = (PackageNames.from_sections(*sections[pos:pos + 2]),
+                              uint_array(sections[pos + 2]))
+            pos += _POOL_SECTIONS
+        # the package of each row
+        self._name_ids = array('I')
+        for i in range(len(self._names)):
+            self._name_ids.extend([i] * (self._first[i + 1] - self._first[i]))
+
+    def _close(self):
+        for mm in getattr(self, '_maps', {}).values():
+            if mm is not None:
+                mm.close()
+        self._maps = {}
+
+    def __len__(self):
+        self._update()
+        return len(self._files)
+
+    def names(self, update=True):
+        """\
+        Returns the package names (a :class:`PackageNames` instance).
+
+        :param bool update: If ``False`` the names loaded last are returned
+                            without checking the apt lists, ``None`` if the
+                            store was not loaded yet.
+        """
+        if not update:
+            return getattr(self, '_names', None)
+        self._update()
+        return self._names
+
+    def versions(self):
+        """\
+        Returns the newest version of each package in the order of the
+        names.
+        """
+        self._update()
+        return _Newest(self, VERSION)
+
+    def summaries(self):
+        """\
+        Returns the first line of the description of the newest version of
+        each package in the order of the names.
+        """
+        self._update()
+        return _Newest(self, DESCRIPTION)
+
+    def newest_rows(self):
+        """\
+        Returns the row of the newest version of each package in the order
+        of the names.
+        """
+        self._update()
+        return self._first[:-1]
+
+    def column(self, name):
+        """\
+        Returns a pooled column.
+
+        :param str name: One of :data:`POOLED`.
+        :return: A tuple ``(pool, ids)``, the pool is a :class:`PackageNames`
+                 instance of the distinct values, the ids are the index of
+                 the value of each row.
+        """
+        self._update()
+        return self._pools[name]
+
+    def numbers(self, name):
+        """\
+        Returns an integer column, the value of each row.
+
+        :param str name: One of :data:`NUMERIC`.
+        """
+        self._update()
+        return self._numbers[name]
+
+    def rows(self, name):
+        """\
+        Returns the rows of a package, the newest version first.
+
+        :param str name: The package name.
+        :return: A range, empty if the package is unknown.
+        """
+        self._update()
+        i = self._names.find(name)
+        if i < 0:
+            return range(0)
+        return range(self._first[i], self._first[i + 1])
+
+    def __contains__(self, name):
+        return len(self.rows(name)) > 0
+
+    def packages(self, name):
+        """\
+        Returns a :class:`PackageView` of each version of a package, the
+        newest first.
+        """
+        return [PackageView(self, row) for row in self.rows(name)]
+
+    def records(self, name):
+        """\
+        Returns the parsed paragraphs of each version of a package, like
+        ``apt-cache show`` does.
+
+        :return: A list of :class:`debfiles.Record` instances, the newest
+                 version first.
+        """
+        return [PackageView(self, row).record() for row in self.rows(name)]
+
+    def field(self, row, name):
+        """\
+        Returns a pooled field of a row (str).
+
+        :param int row: The row.
+        :param str name: One of :data:`POOLED`.
+        """
+        pool, ids = self._pools[name]
+        return pool[ids[row]]
+
+    def paragraph(self, row):
+        """\
+        Returns the paragraph of a row (bytes).
+        """
+        file_id = self._files[row]
+        mm = self._maps.get(file_id)
+        if mm is None:
+            mm = self._maps[file_id] = _map(self._paths[file_id])
+        start = self._starts[row]
+        if mm is None or start + self._lengths[row] > len(mm):
+            # the file changed since the store was loaded
+            return b''
+        return mm[start:start + self._lengths[row]]
+
+
+class _Newest(object):
+    # A pooled field of the first row of each package
+    def __init__(self, store, name):
+        self._store = store
+        self._name = name
+
+    def __len__(self):
+        return len(self._store._names)
+
+    def __getitem__(self, i):
+        return self._store.field(self._store._first[i], self._name)
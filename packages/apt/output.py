@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""\
+Helpers to process the output of apt and dpkg processes.
+"""
+import re
+from collections import namedtuple
+
+
+class LineAssembler(object):
+    """\
+    Assembles the chunks read from a process into complete lines.
+
+    Complete lines are passed to a callback as soon as they arrive, a
+    partial line is kept until the rest of it was read. Each byte is
+    copied a constant number of times, regardless of the number of chunks.
+    """
+    def __init__(self, callback, encoding='utf-8'):
+        """\
+        :param callback: A function accepting a list of lines (str, without
+                         line terminators).
+        :param str encoding: The encoding of the output.
+        """
+        self._callback = callback
+        self._encoding = encoding
+        self._parts = []
+
+    def feed(self, data):
+        """\
+        Adds a chunk of output.
+
+        :param bytes data: The chunk.
+        """
+        end = data.rfind(b'\n')
+        if end < 0:
+            if data:
+                self._parts.append(data)
+            return
+        self._parts.append(data[:end])
+        block = b''.join(self._parts)
+        self._parts = [data[end + 1:]] if end + 1 < len(data) else []
+        self._emit(block)
+
+    def close(self):
+        """\
+        Passes the last line to the callback even if it is not terminated.
+        """
+        if self._parts:
+            block = b''.join(self._parts)
+            self._parts = []
+            self._emit(block)
+
+    def _emit(self, block):
+        self._callback(block.decode(self._encoding, 'replace').split('\n'))
+
+
+# A line apt writes to APT::Status-Fd, i.e.
+# "pmstatus:libc6:armhf:42.8571:Unpacking libc6 (armhf)"
+_STATUS_PATTERN = re.compile(r'^(dlstatus|pmstatus|pmerror|pmconffile):'
+                             r'(.*?):(\d+(?:\.\d*)?):(.*)$')
+
+Status = namedtuple('Status', ['kind', 'item', 'percent', 'message'])
+
+
+def parse_status(line):
+    """\
+    Parses a progress record apt writes to the APT::Status-Fd.
+
+    :param str line: A line without line terminator.
+    :return: A :class:`Status` instance or ``None`` if the line is no
+             progress record.
+    """
+    m = _STATUS_PATTERN.match(line)
+    if not m:
+        return None
+    kind, item, percent, message = m.groups()
+    return Status(kind=kind, item=item, percent=float(percent), message=message)
@@ -0,0 +1,785 @@
+# -*- coding: utf-8 -*-
+"""\
+Package indexes which are built from the apt lists and kept on disk.
+
+An index is rebuilt only if the files it was built from changed, i.e.
+after ``apt-get update``.
+"""
+import os
+import re
+import mmap
+import heapq
+import bisect
+import struct
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+from debfiles import APT_LISTS, file_stamp, packages_files, version_compare
+
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'ftc-apt')
+
+# magic, SHA-1 of the source files' stamps, number of sections
+_HEADER = struct.Struct('=8s20sI')
+
+
+def sources_key(paths):
+    """\
+    Returns a key which identifies the current state of the provided files.
+
+    :param paths: An iterable of file paths.
+    :return: The SHA-1 digest (bytes) of the names, mtimes and sizes.
+    """
+    h = hashlib.sha1()
+    for path in paths:
+        h.update(repr((path, file_stamp(path))).encode('utf-8'))
+    return h.digest()
+
+
+def write_atomic(path, chunks):
+    """\
+    Writes the chunks to a temporary file and renames it to `path`.
+
+    Readers never see a partially written file.
+
+    :param str path: The destination.
+    :param chunks: An iterable of bytes-like objects.
+    """
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    tmp = '{0}.{1}.tmp'.format(path, os.getpid())
+    with open(tmp, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(tmp, path)
+
+
+def write_sections(path, magic, key, sections):
+    """\
+    Writes an index file.
+
+    The file consists of a header, the sizes of the sections and the
+    sections. Each section is padded to a multiple of four bytes.
+
+    :param str path: The destination.
+    :param bytes magic: Eight bytes which identify the file format.
+    :param bytes key: The key of the source files, see :func:`sources_key`.
+    :param sections: A list of bytes-like objects.
+    """
+    sizes = array('I', [memoryview(section).nbytes for section in sections])
+    chunks = [_HEADER.pack(magic, key, len(sections)), sizes]
+    for size, section in zip(sizes, sections):
+        chunks.append(section)
+        if size % 4:
+            chunks.append(bytes(4 - size % 4))
+    write_atomic(path, chunks)
+
+
+def read_sections(path, magic, key):
+    """\
+    Memory-maps an index file written by :func:`write_sections`.
+
+    :param str path: The index file.
+    :param bytes magic: The expected file format.
+    :param bytes key: The expected key of the source files.
+    :return: A list of memoryviews or ``None`` if the file does not exist,
+             is invalid or outdated.
+    """
+    try:
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if len(mm) < _HEADER.size:
+        return None
+    file_magic, file_key, count = _HEADER.unpack_from(mm)
+    pos = _HEADER.size + count * 4
+    if file_magic != magic or file_key != key or len(mm) < pos:
+        return None
+    view = memoryview(mm)
+    sections = []
+    for size in view[_HEADER.size:pos].cast('I'):
+        sections.append(view[pos:pos + size])
+        pos += size + (-size % 4)
+    if pos > len(mm):
+        return None
+    return sections
+
+
+def uint_array(buf):
+    """\
+    Returns a memoryview of unsigned ints of a buffer.
+
+    :param buf: An ``array('I')`` or a bytes-like object.
+    """
+    view = memoryview(buf)
+    if view.format != 'B':
+        view = view.cast('B')
+    return view.cast('I')
+
+
+class StringTable(object):
+    """\
+    An immutable sequence of strings.
+
+    The strings are stored newline-delimited in one buffer, the offsets array
+    contains the start of each string plus the end of the buffer. Strings are
+    decoded on access only.
+    """
+    def __init__(self, blob, offsets):
+        """\
+        :param blob: The bytes-like buffer containing the strings.
+        :param offsets: A sequence of ``len(strings) + 1`` start offsets.
+        """
+        self._blob = blob
+        self._offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings):
+        """\
+        Creates the sequence from an iterable of strings.
+
+        :param strings: An iterable of str or bytes without newlines.
+        """
+        strings = [s.encode('utf-8') if isinstance(s, str) else s for s in strings]
+        offsets = array('I', [0])
+        pos = 0
+        for s in strings:
+            pos += len(s) + 1
+            offsets.append(pos)
+        blob = b'\n'.join(strings) + b'\n' if strings else b''
+        return cls(blob, offsets)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def raw(self, i):
+        """\
+        Returns the name at index `i` as bytes.
+        """
+        return bytes(self._blob[self._offsets[i]:self._offsets[i + 1] - 1])
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.raw(i).decode('utf-8')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.raw(i).decode('utf-8')
+
+    def containing(self, s, start=False, end=False):
+        """\
+        Yields the indexes of the strings containing `s` in ascending order.
+
+        :param s: A str or bytes without newlines.
+        :param bool start: Only the strings starting with `s`.
+        :param bool end: Only the strings ending with `s`.
+        """
+        if isinstance(s, str):
+            s = s.encode('utf-8')
+        # each string is followed by a newline
+        pattern = re.compile((b'(?<![^\n])' if start else b'') + re.escape(s) + (b'(?=\n)' if end else b''))
+        pos = 0
+        while True:
+            match = pattern.search(self._blob, pos)
+            if match is None:
+                return
+            i = bisect.bisect_right(self._offsets, match.start()) - 1
+            if i >= len(self):
+                # an empty match after the last string
+                return
+            yield i
+            # continue with the next string
+            pos = self._offsets[i + 1]
+
+    @classmethod
+    def from_sections(cls, offsets, blob):
+        """\
+        Creates the sequence from the sections returned by :meth:`sections`.
+        """
+        return cls(memoryview(blob), uint_array(offsets))
+
+    def sections(self):
+        """\
+        Returns the offsets table and the buffer as bytes-like objects.
+        """
+        return [self._offsets, self._blob]
+
+
+class PackageNames(StringTable):
+    """\
+    A sorted sequence of unique package names.
+    """
+    @classmethod
+    def from_names(cls, names):
+        """\
+        Creates the sequence from an iterable of names.
+
+        :param names: An iterable of str or bytes, the names must be unique.
+        """
+        return cls.from_strings(sorted(n.encode('utf-8') if isinstance(n, str) else n for n in names))
+
+    def bisect(self, name, lo=0, hi=None):
+        """\
+        Returns the index of the first name which is not less than `name`.
+
+        :param name: A str or bytes.
+        """
+        if isinstance(name, str):
+            name = name.encode('utf-8')
+        if hi is None:
+            hi = len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.raw(mid) < name:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def find(self, name):
+        """\
+        Returns the index of `name` or ``-1`` if the name is unknown.
+        """
+        if isinstance(name, str):
+            name = name.encode('utf-8')
+        i = self.bisect(name)
+        if i < len(self) and self.raw(i) == name:
+            return i
+        return -1
+
+    def __contains__(self, name):
+        return self.find(name) >= 0
+
+
+class BitSet(object):
+    """\
+    A set of indexes which stores one bit per index.
+    """
+    def __init__(self, size=0):
+        self._bits = bytearray((size + 7) >> 3)
+        self._size = size
+
+    def __len__(self):
+        return self._size
+
+    def resize(self, size):
+        """\
+        Changes the number of indexes, new indexes are not in the set.
+        """
+        nbytes = (size + 7) >> 3
+        if nbytes > len(self._bits):
+            self._bits.extend(bytes(nbytes - len(self._bits)))
+        else:
+            del self._bits[nbytes:]
+            if size & 7 and nbytes:
+                self._bits[-1] &= (1 << (size & 7)) - 1
+        self._size = size
+
+    def add(self, i):
+        self._bits[i >> 3] |= 1 << (i & 7)
+
+    def discard(self, i):
+        self._bits[i >> 3] &= ~(1 << (i & 7)) & 0xff
+
+    def __contains__(self, i):
+        return 0 <= i < self._size and bool(self._bits[i >> 3] & (1 << (i & 7)))
+
+    def __iter__(self):
+        for i in range(self._size):
+            if self._bits[i >> 3] & (1 << (i & 7)):
+                yield i
+
+    def count(self):
+        """\
+        Returns the number of indexes in the set.
+        """
+        return sum(bin(b).count('1') for b in self._bits)
+
+
+def mark_installed(bits, names, installed, start=0):
+    """\
+    Adds the indexes of the installed packages to a bit set.
+
+    :param BitSet bits: The bit set, the index of ``names[0]`` is `start`.
+    :param names: A :class:`PackageNames` instance or a sequence of names.
+    :param installed: An iterable of the installed package names.
+    :param int start: Offset of the names within the bit set.
+    """
+    if isinstance(names, PackageNames):
+        # Usually there are much less installed packages than names
+        for name in installed:
+            i = names.find(name)
+            if i >= 0:
+                bits.add(start + i)
+    else:
+        installed = set(installed)
+        for i, name in enumerate(names, start):
+            if name in installed:
+                bits.add(i)
+    return bits
+
+
+# The characters package names start with, in sort order
+_PREFIX_ALPHABET = '0123456789abcdefghijklmnopqrstuvwxyz'
+# Maps characters and their codes to their position in the alphabet
+_PREFIX_INDEX = dict([(c, i) for i, c in enumerate(_PREFIX_ALPHABET)] +
+                     [(ord(c), i) for i, c in enumerate(_PREFIX_ALPHABET)])
+
+
+def _first_chars(names):
+    # Yields the first two characters (str) or codes (int) of each name,
+    # ``None`` stands for the end of the name
+    if isinstance(names, StringTable):
+        blob, offsets = names._blob, names._offsets
+        for i in range(len(names)):
+            start = offsets[i]
+            length = offsets[i + 1] - start - 1
+            yield (blob[start] if length > 0 else None, blob[start + 1] if length > 1 else None)
+    else:
+        for name in names:
+            yield (name[0] if name else None, name[1] if len(name) > 1 else None)
+
+
+class PrefixTable(object):
+    """\
+    The rows to jump to for the one and two character prefixes of a list
+    of package names.
+
+    For each prefix the row of the first name starting with it is kept. A
+    prefix without names maps to the row of the next prefix, the end of a
+    sorted list if there is none. Names of an unsorted list, i.e. ranked
+    search results, are found at their first occurrence.
+    """
+    def __init__(self, names):
+        """\
+        :param names: A :class:`StringTable` or a sequence of str.
+        """
+        size = len(_PREFIX_ALPHABET)
+        # the second character of a pair is 1 + its position in the
+        # alphabet, 0 stands for the end of the name and the characters
+        # "+-." which sort before the digits
+        width = size + 1
+        first = [None] * (size * width)
+        rows = 0
+        for row, (a, b) in enumerate(_first_chars(names)):
+            rows = row + 1
+            i = _PREFIX_INDEX.get(a)
+            if i is None:
+                continue
+            key = i * width + _PREFIX_INDEX.get(b, -1) + 1
+            if first[key] is None:
+                first[key] = row
+        self._rows = rows
+        self._width = width
+        self._pairs = array('I', bytes(4 * len(first)))
+        self._letters = array('I', bytes(4 * size))
+        self._present = [[] for i in range(size)]
+        following = rows
+        for i in reversed(range(size)):
+            letter = None
+            for key in reversed(range(i * width, (i + 1) * width)):
+                if first[key] is not None:
+                    following = first[key]
+                    letter = following if letter is None else min(letter, following)
+                    if key % width > 0:
+                        self._present[i].append(_PREFIX_ALPHABET[i] + _PREFIX_ALPHABET[key % width - 1])
+                self._pairs[key] = following
+            self._letters[i] = following if letter is None else letter
+            if letter is not None:
+                self._present[i].reverse()
+                self._present[i].insert(0, _PREFIX_ALPHABET[i])
+
+    def __len__(self):
+        return self._rows
+
+    def prefixes(self, letter=''):
+        """\
+        Returns the prefixes the names start with.
+
+        :param str letter: An empty string for the first letters, or a
+                           letter for the two character prefixes starting
+                           with it.
+        :return: A sorted list of str.
+        """
+        if letter == '':
+            return [p[0] for p in self._present if p]
+        i = _PREFIX_INDEX.get(letter.lower())
+        return self._present[i][1:] if i is not None else []
+
+    def find(self, prefix):
+        """\
+        Returns the row to show for a prefix.
+
+        :param str prefix: One or two characters, more are ignored.
+        :return: The row, ``len(self)`` if no name starts with the prefix
+                 or one of the following ones.
+        """
+        prefix = prefix.lower()
+        i = _PREFIX_INDEX.get(prefix[:1])
+        if i is None:
+            return 0 if prefix[:1] < _PREFIX_ALPHABET[0] else self._rows
+        if len(prefix) == 1:
+            return self._letters[i]
+        return self._pairs[i * self._width + _PREFIX_INDEX.get(prefix[1], -1) + 1]
+
+
+def find_upgradable(installed, names, versions):
+    """\
+    Returns the installed packages for which a newer version is available.
+
+    :param dict installed: Maps the installed packages to their versions.
+    :param PackageNames names: All available packages.
+    :param StringTable versions: The newest available version of each package.
+    :return: A sorted list of tuples ``(name, installed version, new version)``.
+    """
+    result = []
+    for name in sorted(installed):
+        i = names.find(name)
+        if i >= 0:
+            candidate = versions[i]
+            if version_compare(candidate, installed[name]) > 0:
+                result.append((name, installed[name], candidate))
+    return result
+
+
+class RecordCache(object):
+    """\
+    A bounded cache of package records.
+
+    The least recently used records are dropped if the cache is full. All
+    records are dropped if the apt lists changed.
+    """
+    def __init__(self, maxsize=256, lists_dir=APT_LISTS):
+        """\
+        :param int maxsize: Maximum number of records.
+        :param str lists_dir: The apt lists directory.
+        """
+        self.maxsize = maxsize
+        self.lists_dir = lists_dir
+        self._records = OrderedDict()
+        self._key = None
+
+    def _check(self):
+        key = sources_key(packages_files(self.lists_dir))
+        if key != self._key:
+            self._records.clear()
+            self._key = key
+
+    def __len__(self):
+        return len(self._records)
+
+    def get(self, name):
+        """\
+        Returns the record of a package or ``None`` if it is not cached.
+        """
+        self._check()
+        record = self._records.get(name)
+        if record is not None:
+            self._records.move_to_end(name)
+        return record
+
+    def put(self, name, record):
+        """\
+        Adds or replaces the record of a package.
+        """
+        self._check()
+        self._records[name] = record
+        self._records.move_to_end(name)
+        while len(self._records) > self.maxsize:
+            self._records.popitem(last=False)
+
+    def missing(self, names):
+        """\
+        Returns the names of the packages which are not cached.
+
+        :param names: An iterable of package names.
+        :return: A list of names.
+        """
+        self._check()
+        return [name for name in names if name not in self._records]
+
+
+class CachedIndex(object):
+    """\
+    Base class of the indexes which are built from the apt lists.
+
+    Subclasses provide the file name and format of the index and implement
+    ``_build`` and ``_load``. They may override ``_sources`` to build the
+    index from other files. An index may be loaded by a worker thread while
+    the GUI thread uses it, updates are serialized by a lock.
+    """
+    FILENAME = None
+    MAGIC = None
+
+    def __init__(self, lists_dir=APT_LISTS, cache_dir=CACHE_DIR):
+        """\
+        :param str lists_dir: The apt lists directory.
+        :param str cache_dir: Directory to store the index.
+        """
+        self.lists_dir = lists_dir
+        self.path = os.path.join(cache_dir, self.FILENAME)
+        self._key = None
+        self._lock = threading.RLock()
+
+    def _sources(self):
+        """\
+        Returns the paths of the files the index is built from, the
+        "Packages" files by default.
+        """
+        return packages_files(self.lists_dir)
+
+    def current(self):
+        """\
+        Returns ``True`` if the index is loaded and the source files did not
+        change, i.e. using it reads no files. Doesn't wait for an update
+        running in another thread.
+        """
+        return self._key is not None and self._key == sources_key(self._sources())
+
+    def update(self):
+        """\
+        Loads the index now, i.e. in a worker thread before it is used by
+        the GUI thread.
+        """
+        self._update()
+
+    def _update(self):
+        """\
+        Loads the index, rebuilds it iff the source files changed.
+        """
+        with self._lock:
+            paths = self._sources()
+            key = sources_key(paths)
+            if key != self._key:
+                sections = read_sections(self.path, self.MAGIC, key)
+                if sections is None:
+                    sections = self._build(paths)
+                    try:
+                        write_sections(self.path, self.MAGIC, key, sections)
+                    except OSError:
+                        # Not fatal, the index is built again next time
+                        pass
+                self._load(sections)
+                self._key = key
+
+    def _build(self, paths):
+        """\
+        Builds the index from the files returned by ``_sources``.
+
+        :return: A list of bytes-like objects.
+        """
+        raise NotImplementedError()
+
+    def _load(self, sections):
+        """\
+        Sets up the index from the sections returned by ``_build``.
+        """
+        raise NotImplementedError()
+
+
+class DerivedIndex(CachedIndex):
+    """\
+    Base class of the indexes computed from the columns of a
+    :class:`metastore.PackageStore` instead of the apt lists.
+
+    The index is rebuilt when the sources of the store changed, ``_build``
+    reads the store only.
+    """
+    def __init__(self, store, cache_dir=CACHE_DIR):
+        """\
+        :param PackageStore store: The store.
+        :param str cache_dir: Directory to store the index.
+        """
+        super(DerivedIndex, self).__init__(store.lists_dir, cache_dir)
+        self.store = store
+
+    def _sources(self):
+        return self.store._sources()
+
+
+_WORD_PATTERN = re.compile(r'[a-z0-9]+')
+
+# Shorter query words only match the beginning of package names
+_MIN_TERM_LENGTH = 2
+
+
+def _terms(name, description):
+    """\
+    Returns the search terms of a package.
+    """
+    terms = set(_WORD_PATTERN.findall(name))
+    terms.add(name)
+    terms.update(_WORD_PATTERN.findall(description.lower()))
+    return terms
+
+
+class SearchIndex(DerivedIndex):
+    """\
+    Inverted index of the package names and short descriptions of a
+    :class:`metastore.PackageStore`.
+
+    Each term (the package name, the words of the name and of the
+    description) maps to the sorted list of packages which contain it. A
+    query word matches all terms it is a prefix of, so the index can be
+    queried while the user types.
+    """
+    FILENAME = 'search.idx'
+    MAGIC = b'PKGSRCH4'
+
+    def _build(self, paths):
+        names = self.store.names()
+        descriptions = self.store.summaries()
+        postings = {}
+        for doc, name in enumerate(names):
+            for term in _terms(name, descriptions[doc]):
+                postings.setdefault(term, array('I')).append(doc)
+        terms = PackageNames.from_names(postings)
+        offsets = array('I', [0])
+        docs = array('I')
+        for term in terms:
+            docs.extend(postings[term])
+            offsets.append(len(docs))
+        # the packages ordered by the length of the name, then by name
+        order = array('I', sorted(range(len(names)), key=lambda doc: len(names.raw(doc))))
+        ranks = array('I', bytes(4 * len(order)))
+        for rank, doc in enumerate(order):
+            ranks[doc] = rank
+        return terms.sections() + [offsets, docs, order, ranks]
+
+    def _load(self, sections):
+        # the documents are the packages of the store
+        self._names = self.store.names()
+        self._descriptions = self.store.summaries()
+        self._terms = PackageNames.from_sections(*sections[0:2])
+        self._offsets = uint_array(sections[2])
+        self._docs = uint_array(sections[3])
+        self._order = uint_array(sections[4])
+        self._ranks = uint_array(sections[5])
+
+    def _prefixed(self, word):
+        """\
+        Returns the range of the packages whose names start with `word`.
+        """
+        first = self._names.bisect(word)
+        return first, self._names.bisect(word + '\uffff', first)
+
+    def _postings(self, word):
+        """\
+        Returns the range of the terms starting with a query word.
+        """
+        first = self._terms.bisect(word)
+        return first, self._terms.bisect(word + '\uffff', first)
+
+    def _matches(self, words):
+        """\
+        Returns the set of packages matching all query words.
+
+        The words matching the fewest packages are intersected first, the
+        documents of the others are only looked up if there are few left.
+        """
+        lists = []
+        for word in words:
+            if len(word) < _MIN_TERM_LENGTH:
+                first, last = self._prefixed(word)
+                lists.append((last - first, None, first, last))
+            else:
+                # the documents of consecutive terms are consecutive
+                first, last = self._postings(word)
+                lists.append((self._offsets[last] - self._offsets[first], (first, last),
+                              self._offsets[first], self._offsets[last]))
+        lists.sort(key=lambda l: l[0])
+        docs = None
+        for size, terms, start, end in lists:
+            if size == 0:
+                return set()
+            if terms is None:
+                # a package name range
+                docs = set(range(start, end)) if docs is None else docs.intersection(range(start, end))
+            elif docs is None:
+                docs = set(self._docs[start:end])
+            elif len(docs) * (terms[1] - terms[0]) * 32 < size:
+                # bisecting the sorted documents of each term is cheaper
+                docs = set(doc for doc in docs if any(self._contains(self._offsets[i], self._offsets[i + 1], doc)
+                                                      for i in range(*terms)))
+            else:
+                docs.intersection_update(self._docs[start:end])
+            if not docs:
+                break
+        return docs
+
+    def _contains(self, start, end, doc):
+        i = bisect.bisect_left(self._docs, doc, start, end)
+        return i < end and self._docs[i] == doc
+
+    def _shortest(self, first, last, limit):
+        """\
+        Returns up to `limit` packages of a range of names, the shortest
+        names first.
+        """
+        if (last - first) ** 2 < limit * len(self._order):
+            return heapq.nsmallest(limit, range(first, last), key=self._ranks.__getitem__)
+        # a large range, most of the shortest names are in it
+        docs = []
+        for doc in self._order:
+            if first <= doc < last:
+                docs.append(doc)
+                if len(docs) == limit:
+                    break
+        return docs
+
+    def search(self, query, limit=200):
+        """\
+        Returns the packages matching all words of the query.
+
+        Packages whose name equals or starts with the query are ranked first,
+        followed by packages which contain the words in their names.
+
+        :param str query: The query, i.e. ``pyth seri``
+        :param int limit: Maximum number of results.
+        :return: A list of tuples ``(name, short description)``.
+        """
+        self._update()
+        words = query.lower().split()
+        if not words or limit <= 0:
+            return []
+        first, last = self._prefixed(words[0])
+        if len(words) == 1:
+            # the packages starting with the word rank before the others
+            best = self._shortest(first, last, limit)
+            if len(best) == limit:
+                return self._results(best)
+            docs = self._matches(words)
+            docs.difference_update(range(first, last))
+        else:
+            best = []
+            docs = self._matches(words)
+
+        # only the packages containing a word in their names have a score,
+        # the others are ranked by the names
+        hits = {}
+        raw = self._names.raw
+        for word in words if docs else ():
+            if len(docs) < len(self._names) // 8:
+                named = [doc for doc in docs if word.encode('utf-8') in raw(doc)]
+            else:
+                named = docs.intersection(self._names.containing(word))
+            for doc in named:
+                hits[doc] = hits.get(doc, 0) + 10
+        for doc in docs.intersection(range(first, last)):
+            hits[doc] = hits.get(doc, 0) + 50
+        exact = self._names.find(' '.join(words))
+        if exact in hits:
+            hits[exact] += 100
+        best.extend(heapq.nsmallest(limit - len(best), hits, key=lambda doc: (-hits[doc], self._ranks[doc])))
+        if len(best) < limit:
+            docs.difference_update(hits)
+            best.extend(heapq.nsmallest(limit - len(best), docs, key=self._ranks.__getitem__))
+        return self._results(best)
+
+    def _results(self, docs):
+        return [(self._names[doc], self._descriptions[doc]) for doc in docs]
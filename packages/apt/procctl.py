@@ -0,0 +1 @@
+../common/procctl.py
\ No newline at end of file
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""\
+The state of the Apt app saved on exit, so the next start can show the
+last known packages at once and check them afterwards.
+"""
+import os
+from collections import namedtuple
+from pkgindex import CACHE_DIR, PackageNames, write_sections, read_sections
+
+SNAPSHOT_PATH = os.path.join(CACHE_DIR, 'snapshot.idx')
+
+_MAGIC = b'APTSNAP1'
+
+# The snapshot is used regardless of the apt lists, it has no source key
+_KEY = bytes(20)
+
+Snapshot = namedtuple('Snapshot', ['names', 'installed', 'command'])
+
+
+def save_snapshot(names, installed, command='', path=SNAPSHOT_PATH):
+    """\
+    Saves a snapshot.
+
+    :param names: All available packages, a :class:`PackageNames` instance
+                  or an iterable of names.
+    :param installed: An iterable of the installed package names.
+    :param str command: The command which was shown last.
+    :param str path: The snapshot file.
+    """
+    if not isinstance(names, PackageNames):
+        names = PackageNames.from_names(names)
+    installed = PackageNames.from_names(installed)
+    write_sections(path, _MAGIC, _KEY, names.sections() + installed.sections() +
+                   [command.encode('utf-8')])
+
+
+def load_snapshot(path=SNAPSHOT_PATH):
+    """\
+    Memory-maps a snapshot.
+
+    :param str path: The snapshot file.
+    :return: A :class:`Snapshot` or ``None`` if there is no valid snapshot.
+    """
+    sections = read_sections(path, _MAGIC, _KEY)
+    if sections is None or len(sections) != 5:
+        return None
+    return Snapshot(names=PackageNames.from_sections(*sections[0:2]),
+                    installed=PackageNames.from_sections(*sections[2:4]),
+                    command=bytes(sections[4]).decode('utf-8'))
+
+
+def diff_names(old, new):
+    """\
+    Compares two sorted sequences of package names in one pass.
+
+    :param old: The sorted names of the snapshot.
+    :param new: The sorted current names.
+    :return: A tuple ``(added, removed)`` of sorted lists.
+    """
+    added = []
+    removed = []
+    old = iter(old)
+    new = iter(new)
+    a = next(old, None)
+    b = next(new, None)
+    while a is not None and b is not None:
+        if a == b:
+            a = next(old, None)
+            b = next(new, None)
+        elif a < b:
+            removed.append(a)
+            a = next(old, None)
+        else:
+            added.append(b)
+            b = next(new, None)
+    while a is not None:
+        removed.append(a)
+        a = next(old, None)
+    while b is not None:
+        added.append(b)
+        b = next(new, None)
+    return added, removed
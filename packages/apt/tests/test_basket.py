@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""Tests regarding the basket of pending package changes.
+"""
+import pytest
+from basket import Basket, INSTALL, REMOVE, PURGE
+
+
+def test_empty():
+    basket = Basket()
+    assert len(basket) == 0
+    assert list(basket) == []
+    assert basket.apt_args() == ['install']
+
+
+def test_one_transaction():
+    basket = Basket()
+    basket.mark('vim', INSTALL)
+    basket.mark('nano', REMOVE)
+    basket.mark('ed', PURGE)
+    basket.mark('git', INSTALL, '1:2.20.1-2')
+    assert basket.apt_args() == ['install', 'ed_', 'git=1:2.20.1-2', 'nano-', 'vim']
+
+
+def test_mark_replaces():
+    basket = Basket()
+    basket.mark('vim', INSTALL, '2:8.1')
+    basket.mark('vim', PURGE, '2:8.1')
+    assert len(basket) == 1
+    assert basket.action('vim') == PURGE
+    # a version is only used for installation
+    assert basket.describe('vim') == 'purge'
+    assert basket.apt_args() == ['install', 'vim_']
+
+
+def test_unknown_action():
+    with pytest.raises(ValueError):
+        Basket().mark('vim', 'upgrade')
+
+
+def test_toggle():
+    basket = Basket()
+    assert basket.toggle('vim', False) == INSTALL
+    assert basket.toggle('bash', True) == REMOVE
+    assert 'vim' in basket
+    assert basket.toggle('vim', False) is None
+    assert 'vim' not in basket
+    assert basket.action('vim') is None
+    assert list(basket) == ['bash']
+
+
+def test_describe_and_clear():
+    basket = Basket()
+    basket.mark('git', INSTALL, '1:2.20.1-2')
+    basket.mark('nano', REMOVE)
+    assert basket.describe('git') == 'install 1:2.20.1-2'
+    assert basket.describe('nano') == 'remove'
+    basket.unmark('nano')
+    basket.unmark('unknown')
+    assert list(basket) == ['git']
+    basket.clear()
+    assert len(basket) == 0
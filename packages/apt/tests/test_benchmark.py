@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+"""Tests regarding the benchmark script.
+"""
+import json
+from benchmark import main, run
+
+
+def test_run_small():
+    results = run(packages=200, installed=20, versions=2, repeat=1)
+    assert 200 == results['parameters']['packages']
+    assert 'store_build' in results['stages']
+    for result in results['stages'].values():
+        assert result['seconds'] >= 0
+        assert result['peak_bytes'] > 0
+
+
+def test_output_file(tmpdir):
+    path = str(tmpdir.join('results.json'))
+    assert 0 == main(['--packages', '100', '--installed', '10', '--repeat', '1',
+                      '--stage', 'dpkg_status', '--output', path])
+    with open(path) as f:
+        results = json.load(f)
+    assert ['dpkg_status'] == list(results['stages'])
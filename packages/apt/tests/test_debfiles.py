@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""Tests regarding the readers of the Debian package management files.
+"""
+import io
+import os
+import pytest
+from debfiles import iter_paragraphs, paragraph_field, DpkgStatus, version_compare, \
+    iter_records, read_records, parse_relations, read_disk_usage, read_translations, translation_files
+
+
+STATUS = b"""Package: bash
+Status: install ok installed
+Priority: required
+Architecture: armhf
+Version: 5.0-4
+Description: GNU Bourne Again SHell
+ Bash is an sh-compatible command language interpreter.
+
+Package: adduser
+Status: deinstall ok config-files
+Architecture: all
+Version: 3.118
+
+Package: zlib1g
+Status: hold ok installed
+Architecture: armhf
+Version: 1:1.2.11.dfsg-1
+
+Package: libc6
+Status: install ok half-installed
+Architecture: armhf
+Version: 2.28-10+rpi1
+
+Package: zlib1g
+Status: install ok installed
+Architecture: arm64
+Version: 1:1.2.11.dfsg-1
+"""
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 64, 1 << 16])
+def test_iter_paragraphs(chunk_size):
+    paragraphs = list(iter_paragraphs(io.BytesIO(STATUS), chunk_size))
+    assert 5 == len(paragraphs)
+    assert paragraphs[0].startswith(b'Package: bash\n')
+    assert paragraphs[-1].endswith(b'Version: 1:1.2.11.dfsg-1')
+
+
+def test_paragraph_field():
+    paragraph = next(iter_paragraphs(io.BytesIO(STATUS)))
+    assert b'bash' == paragraph_field(paragraph, b'Package')
+    assert b'GNU Bourne Again SHell' == paragraph_field(paragraph, b'Description')
+    assert paragraph_field(paragraph, b'Depends') is None
+
+
+def test_installed(tmp_path):
+    path = tmp_path / 'status'
+    path.write_bytes(STATUS)
+    status = DpkgStatus(str(path))
+    assert ['bash', 'zlib1g'] == status.installed()
+    assert not status.changed()
+    path.write_bytes(STATUS + b'\nPackage: vim\nStatus: install ok installed\n')
+    assert status.changed()
+    assert ['bash', 'vim', 'zlib1g'] == status.installed()
+
+
+def test_installed_versions(tmp_path):
+    path = tmp_path / 'status'
+    path.write_bytes(STATUS)
+    assert {'bash': '5.0-4', 'zlib1g': '1:1.2.11.dfsg-1'} == DpkgStatus(str(path)).versions()
+
+
+def test_installed_missing_file(tmp_path):
+    assert [] == DpkgStatus(str(tmp_path / 'status')).installed()
+
+
+@pytest.mark.parametrize('a,b,expected', [('1.0', '1.0', 0),
+                                          ('1.0', '1.0-0', 0),
+                                          ('1.0', '1.00', 0),
+                                          ('1.0', '1.0.1', -1),
+                                          ('1.0~rc1', '1.0', -1),
+                                          ('1.0~~', '1.0~', -1),
+                                          ('1.0a', '1.0', 1),
+                                          ('1.0+b1', '1.0', 1),
+                                          ('1:0.9', '1.0', 1),
+                                          ('10', '9', 1),
+                                          ('2.28-10+rpi1', '2.28-10', 1),
+                                          ('1.0-1~bpo1', '1.0-1', -1),
+                                          ('1.2.11.dfsg-1+deb10u1', '1.2.11.dfsg-1', 1),
+                                          ])
+def test_version_compare(a, b, expected):
+    res = version_compare(a, b)
+    assert expected == (res > 0) - (res < 0)
+    res = version_compare(b, a)
+    assert -expected == (res > 0) - (res < 0)
+
+
+def test_read_translations(tmp_path):
+    lists = tmp_path / 'lists'
+    lists.mkdir()
+    (lists / 'a_main_i18n_Translation-en').write_bytes(
+        b'Package: vim\nDescription-md5: 59e8b8f7757db8b53566d5d119872de8\n'
+        b'Description-en: Vi IMproved - enhanced vi editor\n Vim is ...\n')
+    (lists / 'a_main_i18n_Translation-de').write_bytes(
+        b'Package: vim\nDescription-md5: 59e8b8f7757db8b53566d5d119872de8\n'
+        b'Description-de: Vi IMproved - verbesserter vi-Editor\n')
+    (lists / 'a_main_i18n_Translation-fr.lz4').write_bytes(b'')
+    paths = translation_files(str(lists))
+    assert ['a_main_i18n_Translation-en', 'a_main_i18n_Translation-de'] == [os.path.basename(p) for p in paths]
+    translations = {}
+    for path in paths:
+        read_translations(path, translations)
+    assert {b'59e8b8f7757db8b53566d5d119872de8': b'Vi IMproved - enhanced vi editor'} == translations
+
+
+SHOW = """Package: minicom
+Version: 2.7.1-1+deb10u1
+Depends: libc6 (>= 2.15), libtinfo6 (>= 6)
+Description: friendly menu driven serial communication program
+ Minicom is a clone of the MS-DOS "Telix" communication program.
+ .
+ It emulates <ANSI> & VT102 terminals.
+
+Package: minicom
+Version: 2.7.1-1
+Description: friendly menu driven serial communication program
+"""
+
+
+def test_iter_records():
+    records = list(iter_records(SHOW.split('\n')))
+    assert 2 == len(records)
+    assert ['2.7.1-1+deb10u1', '2.7.1-1'] == [r['Version'] for r in records]
+    assert 'libc6 (>= 2.15), libtinfo6 (>= 6)' == records[0]['Depends']
+    assert records[0]['Description'].startswith('friendly menu driven serial communication program\nMinicom')
+    assert ['Package', 'Version', 'Depends', 'Description'] == list(records[0])
+
+
+def test_record_html():
+    record = next(iter_records(SHOW.split('\n')))
+    assert 'friendly menu driven serial communication program' \
+           ' Minicom is a clone of the MS-DOS "Telix" communication program.' \
+           '<br/><p> It emulates &lt;ANSI&gt; &amp; VT102 terminals.' == record.html('Description')
+
+
+def test_read_records(tmp_path):
+    path = tmp_path / 'status'
+    path.write_bytes(STATUS)
+    records = list(read_records(str(path)))
+    assert 5 == len(records)
+    assert 'Bash is an sh-compatible command language interpreter.' == records[0]['Description'].split('\n')[1]
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
+
+
+def test_parse_relations():
+    assert [['libc6'], ['mawk', 'gawk'], ['python3'], ['foo']] == \
+        parse_relations('libc6 (>= 2.28), mawk | gawk:any (>> 1), python3:any [armhf], foo <!nocheck>')
+    assert [] == parse_relations('')
+
+
+def test_disk_usage(tmp_path):
+    path = tmp_path / 'status'
+    path.write_bytes(b"""Package: small
+Status: install ok installed
+Installed-Size: 10
+
+Package: big
+Status: install ok installed
+Installed-Size: 5000
+
+Package: removed
+Status: deinstall ok config-files
+Installed-Size: 9999
+
+Package: medium
+Status: hold ok installed
+Installed-Size: 300
+
+Package: nosize
+Status: install ok installed
+""")
+    usage = read_disk_usage(str(path), 2)
+    assert [('big', 5000), ('medium', 300)] == usage.largest
+    assert 5310 == usage.total
+    assert 4 == usage.count
+    assert 4 == len(read_disk_usage(str(path)).largest)
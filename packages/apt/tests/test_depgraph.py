@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""Tests regarding the dependency previews.
+"""
+import pytest
+from depgraph import DependencyIndex, InstalledGraph, preview
+from metastore import PackageStore
+
+_PACKAGES = b"""Package: app
+Version: 1.0
+Depends: libfoo (>= 1.0), mail-transport-agent | exim4
+Pre-Depends: libc6
+Size: 1000
+Installed-Size: 10
+
+Package: libfoo
+Version: 1.1
+Depends: libc6, libbar:any
+Size: 2000
+Installed-Size: 20
+
+Package: libfoo
+Version: 1.0
+Depends: libold
+Size: 1
+
+Package: libbar
+Version: 1.0
+Size: 3000
+Installed-Size: 30
+
+Package: postfix
+Version: 3.4
+Provides: mail-transport-agent
+Depends: libc6
+Size: 4000
+Installed-Size: 40
+
+Package: libc6
+Version: 2.28
+Size: 5000
+Installed-Size: 50
+
+Package: broken
+Version: 1.0
+Depends: not-available
+"""
+
+_STATUS = b"""Package: libc6
+Status: install ok installed
+Version: 2.28
+Installed-Size: 50
+
+Package: libbar
+Status: install ok installed
+Version: 1.0
+Depends: libc6
+Installed-Size: 30
+
+Package: libbaz
+Status: install ok installed
+Version: 1.0
+Depends: libbar | libc6
+Installed-Size: 5
+
+Package: exim4
+Status: install ok installed
+Version: 4.92
+Provides: mail-transport-agent
+Depends: libc6
+Installed-Size: 60
+
+Package: mutt
+Status: install ok installed
+Version: 1.10
+Depends: libbar, mail-transport-agent
+Installed-Size: 70
+
+Package: tool
+Status: deinstall ok config-files
+Version: 1.0
+Depends: libbar
+"""
+
+
+@pytest.fixture
+def available(tmp_path):
+    lists = tmp_path / 'lists'
+    lists.mkdir()
+    (lists / 'a_main_binary-armhf_Packages').write_bytes(_PACKAGES)
+    cache = str(tmp_path / 'cache')
+    return DependencyIndex(PackageStore(str(lists), cache), cache)
+
+
+@pytest.fixture
+def installed(tmp_path):
+    path = tmp_path / 'status'
+    path.write_bytes(_STATUS)
+    return InstalledGraph(str(path))
+
+
+def test_depends(available):
+    assert [['libc6'], ['libfoo'], ['mail-transport-agent', 'exim4']] == available.depends('app')
+    # the newest version is used
+    assert [['libc6'], ['libbar']] == available.depends('libfoo')
+    assert [['not-available']] == available.depends('broken')
+    assert (1000, 10) == available.sizes('app')
+    assert available.sizes('unknown') is None
+
+
+def test_install_set(available, installed):
+    # libc6, libbar and a mail-transport-agent are installed already
+    assert ['app', 'libfoo'] == available.install_set('app', installed)
+    assert [] == available.install_set('libbar', installed)
+    assert [] == available.install_set('unknown', installed)
+    assert ['broken'] == available.install_set('broken', installed)
+
+
+def test_install_set_nothing_installed(available, tmp_path):
+    nothing = InstalledGraph(str(tmp_path / 'missing'))
+    assert ['app', 'libbar', 'libc6', 'libfoo', 'postfix'] == available.install_set('app', nothing)
+
+
+def test_removal_set(installed):
+    # libbaz still has libc6, mutt and libbar need libbar
+    assert ['mutt'] == installed.removal_set('libbar')
+    assert ['exim4', 'libbar', 'libbaz', 'mutt'] == installed.removal_set('libc6')
+    # exim4 provides the mail-transport-agent mutt needs
+    assert {'mutt'} == installed.reverse('exim4')
+    assert ['mutt'] == installed.removal_set('exim4')
+    assert [] == installed.removal_set('tool')
+
+
+def test_preview(available, installed):
+    impact = preview(available, installed, 'app')
+    assert not impact.installed
+    assert ['libfoo'] == impact.install
+    assert 3000 == impact.download_size
+    assert 30 == impact.installed_size
+    assert [] == impact.remove
+
+    impact = preview(available, installed, 'libbar')
+    assert impact.installed
+    assert [] == impact.install
+    assert ['mutt'] == impact.remove
+    assert 100 == impact.freed_size
+
+
+def test_preview_updates_once(available, installed, monkeypatch):
+    calls = []
+    update = available._update
+    monkeypatch.setattr(available, '_update', lambda: calls.append(1) or update())
+    preview(available, installed, 'app')
+    assert 1 == len(calls)
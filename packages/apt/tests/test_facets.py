@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""Tests regarding the facets of the available packages.
+"""
+import pytest
+from facets import FacetIndex, SECTION, PRIORITY, ARCHITECTURE, INSTALLED, IS_INSTALLED, NOT_INSTALLED
+from metastore import PackageStore
+
+_PACKAGES = b"""Package: python3-serial
+Architecture: all
+Priority: optional
+Section: python
+
+Package: python3-smbus
+Architecture: armhf
+Priority: optional
+Section: python
+
+Package: bash
+Architecture: armhf
+Priority: required
+Section: shells
+
+Package: frozen-bubble
+Architecture: all
+Section: non-free/games
+
+Package: bash
+Architecture: arm64
+Priority: required
+Section: shells
+"""
+
+
+@pytest.fixture
+def facets(tmp_path):
+    lists = tmp_path / 'lists'
+    lists.mkdir()
+    (lists / 'a_main_binary-armhf_Packages').write_bytes(_PACKAGES)
+    cache = str(tmp_path / 'cache')
+    return FacetIndex(PackageStore(str(lists), cache), cache)
+
+
+def test_counts(facets):
+    assert [('python', 2), ('games', 1), ('shells', 1)] == facets.counts(SECTION)
+    assert [('optional', 2), ('required', 1), ('unknown', 1)] == facets.counts(PRIORITY)
+    assert [('all', 2), ('armhf', 2)] == facets.counts(ARCHITECTURE)
+    assert [(NOT_INSTALLED, 3), (IS_INSTALLED, 1)] == facets.counts(INSTALLED, installed=['bash', 'vim'])
+
+
+def test_select(facets):
+    names = facets.names()
+    assert ['bash', 'frozen-bubble', 'python3-serial', 'python3-smbus'] == list(names)
+    assert facets.select({}) is None
+    rows = facets.select({SECTION: 'python'})
+    assert ['python3-serial', 'python3-smbus'] == [names[r] for r in rows]
+    assert [('all', 1), ('armhf', 1)] == facets.counts(ARCHITECTURE, rows)
+    rows = facets.select({ARCHITECTURE: 'armhf', INSTALLED: NOT_INSTALLED}, installed=['bash'])
+    assert ['python3-smbus'] == [names[r] for r in rows]
+    assert [] == facets.select({SECTION: 'unknown-section'})
+
+
+def test_persisted(facets, tmp_path):
+    facets.names()
+    cache = str(tmp_path / 'cache')
+    index = FacetIndex(PackageStore(facets.lists_dir, cache), cache)
+    assert [('python', 2), ('games', 1), ('shells', 1)] == index.counts(SECTION)
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Tests regarding the index of the installed files.
+"""
+import os
+import pytest
+from fileindex import FileIndex, iter_package_files, list_file
+
+
+@pytest.fixture
+def system(tmp_path):
+    info = tmp_path / 'info'
+    info.mkdir()
+    (info / 'bash.list').write_bytes(b'/.\n/bin\n/bin/bash\n/usr\n/usr/share/doc/bash/README\n')
+    (info / 'libc6:armhf.list').write_bytes(b'/.\n/usr\n/usr/lib/libc.so.6\n/bin/ldd\n')
+    status = tmp_path / 'status'
+    status.write_bytes(b'Package: bash\n')
+    return str(status), str(info), str(tmp_path / 'cache')
+
+
+def test_list_file(system):
+    status, info, cache = system
+    assert os.path.join(info, 'bash.list') == list_file('bash', info)
+    assert os.path.join(info, 'libc6:armhf.list') == list_file('libc6', info)
+    assert list_file('vim', info) is None
+    files = [path for chunk in iter_package_files('libc6', info) for path in chunk]
+    assert ['/usr', '/usr/lib/libc.so.6', '/bin/ldd'] == files
+    assert [] == list(iter_package_files('vim', info))
+
+
+def test_owners(system):
+    index = FileIndex(*system)
+    assert 7 == len(index)
+    assert ['bash'] == index.owners('/bin/bash')
+    assert ['libc6'] == index.owners('/bin/ldd')
+    assert ['bash', 'libc6'] == index.owners('/usr/')
+    assert ['bash'] == index.owners('/bin')
+    assert [] == index.owners('/bin/sh')
+    assert [] == index.owners('/opt/bash')
+
+
+def test_search(system):
+    index = FileIndex(*system)
+    assert [('/bin/bash', 'bash'), ('/usr/share/doc/bash/README', 'bash')] == index.search('bash')
+    assert [('/bin', 'bash'), ('/bin/bash', 'bash'), ('/bin/ldd', 'libc6')] == index.search('/bin')
+    assert [('/bin', 'bash')] == index.search('/bin', limit=1)
+    assert [] == index.search('')
+
+
+def test_search_slash(system):
+    index = FileIndex(*system)
+    assert [('/bin/bash', 'bash'), ('/bin/ldd', 'libc6')] == index.search('n/')
+    assert [('/bin/ldd', 'libc6'), ('/usr/lib/libc.so.6', 'libc6')] == index.search('/l')
+    assert [('/usr/lib/libc.so.6', 'libc6')] == index.search('r/lib/l')
+    assert [('/usr', 'bash'), ('/usr', 'libc6'), ('/usr/lib/libc.so.6', 'libc6'),
+            ('/usr/share/doc/bash/README', 'bash')] == index.search('/usr')
+    assert [('/bin/bash', 'bash')] == index.search('/bin/bash')
+
+
+def test_rebuild(system):
+    status, info, cache = system
+    assert ['libc6'] == FileIndex(*system).owners('/bin/ldd')
+    os.remove(os.path.join(info, 'libc6:armhf.list'))
+    with open(status, 'ab') as f:
+        f.write(b'Status: install ok installed\n')
+    assert [] == FileIndex(*system).owners('/bin/ldd')
+
+
+def test_empty(tmp_path):
+    status = tmp_path / 'status'
+    status.write_bytes(b'')
+    index = FileIndex(str(status), str(tmp_path), str(tmp_path / 'cache'))
+    assert 0 == len(index)
+    assert [] == index.owners('/bin/bash')
+    assert [] == index.search('bash')
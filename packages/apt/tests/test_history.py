@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""Tests regarding the apt history reader.
+"""
+import gzip
+import pytest
+from history import HistoryIndex, history_files, parse_transaction, parse_time
+
+
+def _transaction(day, command, install=''):
+    text = '\nStart-Date: 2019-07-{0:02}  12:00:00\nCommandline: {1}\n'.format(day, command)
+    if install:
+        text += 'Install: {0}\n'.format(install)
+    return text + 'End-Date: 2019-07-{0:02}  12:01:00\n'.format(day)
+
+
+@pytest.fixture
+def logs(tmp_path):
+    path = tmp_path / 'history.log'
+    with gzip.open(str(tmp_path / 'history.log.2.gz'), 'wb') as f:
+        f.write(_transaction(1, 'apt-get install a', 'a:armhf (1.0)').encode())
+    with gzip.open(str(tmp_path / 'history.log.1.gz'), 'wb') as f:
+        f.write((_transaction(2, 'apt-get install b') + _transaction(3, 'apt-get install c')).encode())
+    path.write_bytes(_transaction(4, 'apt-get install d').encode())
+    return path
+
+
+def test_history_files(logs, tmp_path):
+    (tmp_path / 'history.log.10.gz').write_bytes(b'')
+    (tmp_path / 'history.log.bak').write_bytes(b'')
+    assert ['history.log.10.gz', 'history.log.2.gz', 'history.log.1.gz', 'history.log'] == \
+        [p[len(str(tmp_path)) + 1:] for p in history_files(str(logs))]
+
+
+def test_parse_transaction():
+    t = parse_transaction(['Start-Date: 2019-07-10  12:56:29',
+                           'Commandline: apt-get install vim',
+                           'Requested-By: pi (1000)',
+                           'Upgrade: vim-common:all (2:8.1-1, 2:8.1-2), xxd:armhf (2:8.1-1, 2:8.1-2)',
+                           'Install: vim:armhf (2:8.1-2), vim-runtime:all (2:8.1-2, automatic)',
+                           'End-Date: 2019-07-10  12:57:01'])
+    assert 'apt-get install vim' == t.command
+    assert 'pi (1000)' == t.requested_by
+    assert [('Install', [('vim:armhf', '2:8.1-2'), ('vim-runtime:all', '2:8.1-2, automatic')]),
+            ('Upgrade', [('vim-common:all', '2:8.1-1, 2:8.1-2'), ('xxd:armhf', '2:8.1-1, 2:8.1-2')])] \
+        == t.changes
+    assert '' == t.error
+
+
+def test_parse_time():
+    assert parse_time('2019-07-10  12:56:29') < parse_time('2019-07-10 12:56:30')
+    assert 0 == parse_time('garbage')
+
+
+def test_index(logs):
+    index = HistoryIndex(str(logs))
+    index.update()
+    assert 4 == len(index)
+    assert ['apt-get install d', 'apt-get install c', 'apt-get install b', 'apt-get install a'] == \
+        [t.command for t in index.page(0, 10)]
+    assert ['apt-get install b', 'apt-get install a'] == [t.command for t in index.page(2, 2)]
+    assert [('Install', [('a:armhf', '1.0')])] == index.page(3, 1)[0].changes
+    assert index.time(0) > index.time(3)
+    assert [] == index.page(4, 10)
+
+
+def test_index_append_and_rotate(logs, tmp_path):
+    index = HistoryIndex(str(logs))
+    index.update()
+    # apt appends to the current log, a partial line is ignored
+    with open(str(logs), 'a') as f:
+        f.write(_transaction(5, 'apt-get install e') + '\nStart-Da')
+    index.update()
+    assert 5 == len(index)
+    assert 'apt-get install e' == index.page(0, 1)[0].command
+    # logrotate renames the current log
+    logs.rename(tmp_path / 'history.log.1')
+    (tmp_path / 'history.log.1.gz').rename(tmp_path / 'history.log.3.gz')
+    (tmp_path / 'history.log.2.gz').rename(tmp_path / 'history.log.4.gz')
+    logs.write_bytes(_transaction(6, 'apt-get install f').encode())
+    index.update()
+    assert ['f', 'e', 'd', 'c', 'b', 'a'] == [t.command[-1] for t in index.page(0, 10)]
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""Tests regarding the job scheduler.
+"""
+import pytest
+from jobs import Job, Scheduler, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND, \
+    PENDING, RUNNING, FINISHED, CANCELLED
+
+
+class Launcher(object):
+    def __init__(self):
+        self.started = []
+        self.terminated = []
+
+    def launch(self, job):
+        self.started.append(job)
+
+    def terminate(self, job):
+        self.terminated.append(job)
+
+
+@pytest.fixture
+def launcher():
+    return Launcher()
+
+
+@pytest.fixture
+def scheduler(launcher):
+    return Scheduler(launcher.launch, launcher.terminate, max_jobs=2)
+
+
+def test_concurrency_limit(scheduler, launcher):
+    jobs = [scheduler.submit(Job('apt-cache', ['show', str(i)])) for i in range(3)]
+    assert jobs[:2] == launcher.started
+    assert PENDING == jobs[2].state
+    scheduler.finished(jobs[0], 0)
+    assert jobs == launcher.started
+    assert FINISHED == jobs[0].state
+
+
+def test_priorities(scheduler, launcher):
+    scheduler.max_jobs = 1
+    first = scheduler.submit(Job('apt-cache', ['search', 'a']))
+    background = scheduler.submit(Job('apt-cache', ['show', 'a'], priority=PRIORITY_BACKGROUND))
+    interactive = scheduler.submit(Job('apt-cache', ['show', 'b'], priority=PRIORITY_INTERACTIVE))
+    assert [interactive, background] == scheduler.pending
+    scheduler.finished(first, 0)
+    assert [first, interactive] == launcher.started
+
+
+def test_exclusive(scheduler, launcher):
+    query = scheduler.submit(Job('apt-cache', ['search', 'a']))
+    upgrade = scheduler.submit(Job('apt-get', ['upgrade'], exclusive=True))
+    # The pending exclusive job blocks jobs with lower priority
+    later = scheduler.submit(Job('apt-cache', ['show', 'b'], priority=PRIORITY_BACKGROUND))
+    assert [query] == launcher.started
+    scheduler.finished(query, 0)
+    assert [query, upgrade] == launcher.started
+    assert RUNNING == upgrade.state and PENDING == later.state
+    scheduler.finished(upgrade, 0)
+    assert [query, upgrade, later] == launcher.started
+
+
+def test_callbacks_and_cancel(scheduler, launcher):
+    results = []
+    callback = lambda job, code: results.append((job, code))
+    running = scheduler.submit(Job('apt-cache', ['search', 'a'], on_finished=callback))
+    other = scheduler.submit(Job('apt-cache', ['search', 'b'], on_finished=callback))
+    pending = scheduler.submit(Job('apt-cache', ['search', 'c'], on_finished=callback))
+    scheduler.cancel(pending)
+    assert CANCELLED == pending.state
+    assert [] == scheduler.pending
+    scheduler.cancel(running)
+    assert [running] == launcher.terminated
+    scheduler.finished(running, -9)
+    scheduler.finished(other, 0)
+    assert [(other, 0)] == results
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""Tests regarding the package metadata store.
+"""
+import os
+import pytest
+from metastore import PackageStore, SECTION, DEPENDS
+
+
+_MAIN = b"""\
+Package: vim
+Version: 2:8.1.0875-5
+Architecture: armhf
+Maintainer: Debian Vim Maintainers <team+vim@tracker.debian.org>
+Installed-Size: 2833
+Depends: vim-common (= 2:8.1.0875-5), vim-runtime (= 2:8.1.0875-5)
+Priority: optional
+Section: editors
+Size: 1106680
+Description: Vi IMproved - enhanced vi editor
+ Vim is an almost compatible version of the UNIX editor Vi.
+ .
+ Many new features have been added.
+
+Package: bash
+Version: 5.0-4
+Architecture: armhf
+Priority: required
+Section: shells
+Description: GNU Bourne Again SHell
+
+"""
+
+_UPDATES = b"""\
+Package: vim
+Version: 2:8.1.0875-5+deb10u1
+Architecture: armhf
+Installed-Size: 2834
+Priority: optional
+Section: non-free/editors
+Description: Vi IMproved - enhanced vi editor
+
+Package: bash
+Version: 5.0-4
+Architecture: armhf
+Priority: required
+Section: shells
+Description: GNU Bourne Again SHell
+
+Package: nano
+Version: 3.2-3
+Architecture: armhf
+Description-md5: 7e3bd8e44e8f3f9c1a3d7bbb8c2a0a7d
+"""
+
+_TRANSLATIONS = b"""\
+Package: nano
+Description-md5: 7e3bd8e44e8f3f9c1a3d7bbb8c2a0a7d
+Description-en: small, friendly text editor inspired by Pico
+ GNU nano is an easy-to-use text editor.
+"""
+
+
+@pytest.fixture
+def store(tmp_path):
+    lists = tmp_path / 'lists'
+    lists.mkdir()
+    (lists / 'deb_dists_buster_main_binary-armhf_Packages').write_bytes(_MAIN)
+    (lists / 'deb_dists_buster-updates_main_binary-armhf_Packages').write_bytes(_UPDATES)
+    (lists / 'deb_dists_buster-updates_main_i18n_Translation-en').write_bytes(_TRANSLATIONS)
+    return PackageStore(str(lists), str(tmp_path / 'cache'))
+
+
+def test_names(store):
+    assert ['bash', 'nano', 'vim'] == list(store.names())
+    assert ['5.0-4', '3.2-3', '2:8.1.0875-5+deb10u1'] == [store.versions()[i] for i in range(3)]
+    assert 4 == len(store)
+    assert 'vim' in store
+    assert 'emacs' not in store
+    assert [] == store.records('emacs')
+
+
+def test_columns(store):
+    vim = store.packages('vim')
+    assert ['2:8.1.0875-5+deb10u1', '2:8.1.0875-5'] == [p.version for p in vim]
+    assert 'vim' == vim[1].name
+    assert 'non-free/editors' == vim[0].section
+    assert 'editors' == store.field(vim[1].row, SECTION)
+    assert 'optional' == vim[1].priority
+    assert 'armhf' == vim[1].architecture
+    assert 'Debian Vim Maintainers <team+vim@tracker.debian.org>' == vim[1].maintainer
+    assert '' == vim[0].maintainer
+    assert (2833, 1106680) == (vim[1].installed_size, vim[1].size)
+    assert 0 == vim[0].size
+    assert 'Vi IMproved - enhanced vi editor' == vim[0].summary
+
+
+def test_derived_columns(store):
+    # the newest row of each package, the order of the names
+    assert [0, 1, 2] == list(store.newest_rows())
+    pool, ids = store.column(DEPENDS)
+    vim = store.packages('vim')
+    assert '' == pool[ids[vim[0].row]]
+    assert 'vim-common (= 2:8.1.0875-5), vim-runtime (= 2:8.1.0875-5)' == pool[ids[vim[1].row]]
+    assert [0, 0, 2834, 2833] == list(store.numbers('Installed-Size'))
+
+
+def test_translations(store):
+    nano = store.packages('nano')[0]
+    assert 'small, friendly text editor inspired by Pico' == nano.summary
+    assert 'small, friendly text editor inspired by Pico' == store.records('nano')[0]['Description']
+    assert ['GNU Bourne Again SHell', 'small, friendly text editor inspired by Pico',
+            'Vi IMproved - enhanced vi editor'] == list(store.summaries()[i] for i in range(3))
+
+
+def test_records(store):
+    records = store.records('vim')
+    assert 2 == len(records)
+    assert '2:8.1.0875-5' == records[1]['Version']
+    assert records[1]['Description'].startswith('Vi IMproved - enhanced vi editor\nVim is')
+    assert 'Vi IMproved - enhanced vi editor' == store.packages('vim')[0].description
+    assert ['GNU Bourne Again SHell'] == [r['Description'] for r in store.records('bash')]
+
+
+def test_persisted(store, tmp_path):
+    store.names()
+    assert os.path.exists(store.path)
+    loaded = PackageStore(store.lists_dir, str(tmp_path / 'cache'))
+    assert 'shells' == loaded.packages('bash')[0].section
+    assert '5.0-4' == loaded.records('bash')[0]['Version']
+
+
+def test_names_without_update(store, tmp_path):
+    assert store.names(update=False) is None
+    names = store.names()
+    # changed lists are not read
+    (tmp_path / 'lists' / 'deb_dists_buster_main_binary-armhf_Packages').write_bytes(b'Package: emacs\n')
+    assert names is store.names(update=False)
+    assert 'emacs' in store.names()
+
+
+def test_empty(tmp_path):
+    store = PackageStore(str(tmp_path), str(tmp_path / 'cache'))
+    assert 0 == len(store)
+    assert 0 == len(store.names())
+    assert [] == store.packages('vim')
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Tests regarding the processing of the process output.
+"""
+import pytest
+from output import LineAssembler, parse_status
+
+
+def _assemble(chunks):
+    received = []
+    assembler = LineAssembler(received.append)
+    for chunk in chunks:
+        assembler.feed(chunk)
+    assembler.close()
+    return received
+
+
+def test_complete_lines():
+    assert [['bash - GNU Bourne Again SHell', 'vim - Vi IMproved']] \
+           == _assemble([b'bash - GNU Bourne Again SHell\nvim - Vi IMproved\n'])
+
+
+def test_partial_lines():
+    assert [['bash'], ['vim'], ['nano']] == _assemble([b'ba', b'sh', b'\nvi', b'm\nna', b'no'])
+
+
+def test_split_utf8():
+    data = 'Größe\n'.encode('utf-8')
+    assert [['Größe']] == _assemble([data[:3], data[3:]])
+
+
+def test_no_output():
+    assert [] == _assemble([])
+
+
+@pytest.mark.parametrize('line,expected', [('pmstatus:libc6:armhf:42.8571:Unpacking libc6 (armhf)',
+                                            ('pmstatus', 'libc6:armhf', 42.8571, 'Unpacking libc6 (armhf)')),
+                                           ('dlstatus:1:9.5:Retrieving file 1 of 3',
+                                            ('dlstatus', '1', 9.5, 'Retrieving file 1 of 3')),
+                                           ('pmstatus:dpkg-exec:50:Running dpkg',
+                                            ('pmstatus', 'dpkg-exec', 50.0, 'Running dpkg')),
+                                           ('pmerror:/var/cache/apt/archives/x.deb:60:trying to overwrite: a',
+                                            ('pmerror', '/var/cache/apt/archives/x.deb', 60.0, 'trying to overwrite: a')),
+                                           ])
+def test_parse_status(line, expected):
+    assert expected == tuple(parse_status(line))
+
+
+@pytest.mark.parametrize('line', ['E: Unable to locate package foo', '', 'pmstatus:foo'])
+def test_parse_no_status(line):
+    assert parse_status(line) is None
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""Tests regarding the package indexes.
+"""
+import os
+import pytest
+from pkgindex import PackageNames, StringTable, SearchIndex, RecordCache, BitSet, mark_installed, find_upgradable, \
+    PrefixTable
+from metastore import PackageStore
+
+
+def test_package_names():
+    names = PackageNames.from_names(['vim', 'bash', 'python3', b'zlib1g'])
+    assert 4 == len(names)
+    assert ['bash', 'python3', 'vim', 'zlib1g'] == list(names)
+    assert 'zlib1g' == names[-1]
+    assert 2 == names.find('vim')
+    assert -1 == names.find('emacs')
+    assert 'python3' in names
+    assert 1 == names.bisect('p')
+    with pytest.raises(IndexError):
+        names[4]
+
+
+def test_string_table():
+    table = StringTable.from_strings(['5.0-4', b'1.0', '5.0-4'])
+    assert ['5.0-4', '1.0', '5.0-4'] == list(table)
+    assert b'1.0' == table.raw(1)
+    assert [0, 2] == list(table.containing('.0-'))
+    assert [1] == list(table.containing(b'1.0', start=True, end=True))
+    assert [0, 2] == list(table.containing('-4', end=True))
+
+
+def test_package_names_empty():
+    names = PackageNames.from_names([])
+    assert 0 == len(names)
+    assert -1 == names.find('bash')
+
+
+def test_bitset():
+    bits = BitSet(10)
+    bits.add(0)
+    bits.add(9)
+    assert 0 in bits and 9 in bits and 5 not in bits
+    assert 10 not in bits
+    assert [0, 9] == list(bits)
+    bits.resize(20)
+    assert 2 == bits.count()
+    bits.add(17)
+    bits.resize(9)
+    assert [0] == list(bits)
+    bits.discard(0)
+    assert 0 == bits.count()
+
+
+@pytest.mark.parametrize('names', [PackageNames.from_names(['bash', 'nano', 'vim']),
+                                   ['bash', 'nano', 'vim']])
+def test_mark_installed(names):
+    bits = mark_installed(BitSet(len(names)), names, ['emacs', 'vim', 'bash'])
+    assert [0, 2] == list(bits)
+
+
+_SORTED = ['0ad', 'a', 'a2ps', 'abiword', 'bash', 'g++', 'gcc', 'vim', 'vim-tiny']
+
+
+@pytest.mark.parametrize('names', [PackageNames.from_names(_SORTED), _SORTED])
+def test_prefix_table(names):
+    table = PrefixTable(names)
+    assert 9 == len(table)
+    assert ['0', 'a', 'b', 'g', 'v'] == table.prefixes()
+    assert ['a2', 'ab'] == table.prefixes('a')
+    assert ['gc'] == table.prefixes('G')
+    assert [] == table.prefixes('x')
+    assert 0 == table.find('0')
+    assert 1 == table.find('a')
+    assert 2 == table.find('a2')
+    assert 3 == table.find('aa')
+    assert 3 == table.find('Ab')
+    assert 4 == table.find('b')
+    assert 5 == table.find('c')
+    assert 5 == table.find('g+')
+    assert 6 == table.find('gc')
+    assert 7 == table.find('vim')
+    assert 9 == table.find('w')
+    assert 9 == table.find('zz')
+    assert 0 == table.find('-')
+
+
+def test_prefix_table_unsorted():
+    table = PrefixTable(['vim', 'bash', 'vim-tiny', 'busybox'])
+    assert ['b', 'v'] == table.prefixes()
+    assert 1 == table.find('b')
+    assert 3 == table.find('bu')
+    assert 0 == table.find('v')
+
+
+def test_prefix_table_empty():
+    table = PrefixTable([])
+    assert [] == table.prefixes()
+    assert 0 == table.find('a')
+
+
+def _write_packages(path, names, version='1.0'):
+    with open(path, 'w') as f:
+        for name in names:
+            f.write('Package: {0}\nVersion: {1}\nDescription: {0}\n\n'.format(name, version))
+
+
+def test_find_upgradable():
+    names = PackageNames.from_names(['bash', 'nano', 'vim'])
+    versions = StringTable.from_strings(['1.0', '1.1', '1.0'])
+    assert [('nano', '1.0', '1.1')] == find_upgradable({'nano': '1.0', 'vim': '1.0', 'foo': '0.1'},
+                                                       names, versions)
+
+
+def test_record_cache(tmp_path):
+    lists = tmp_path / 'lists'
+    lists.mkdir()
+    cache = RecordCache(maxsize=2, lists_dir=str(lists))
+    cache.put('bash', {'Package': 'bash'})
+    cache.put('vim', {'Package': 'vim'})
+    assert {'Package': 'bash'} == cache.get('bash')
+    # vim is the least recently used record
+    cache.put('nano', {'Package': 'nano'})
+    assert cache.get('vim') is None
+    assert ['vim'] == cache.missing(['bash', 'vim', 'nano'])
+    # Changing the lists invalidates the cache
+    _write_packages(str(lists / 'a_main_binary-armhf_Packages'), ['bash'])
+    assert cache.get('bash') is None
+    assert 0 == len(cache)
+
+
+_SEARCH_PACKAGES = b"""Package: python3-serial
+Version: 3.4-4
+Description: pyserial - module encapsulating access for the serial port
+
+Package: python3
+Version: 3.7.3-1
+Description: interactive high-level object-oriented language (default python3 version)
+
+Package: minicom
+Version: 2.7.1-1
+Description-md5: 0ac3c8ee8d2ed4ff5cc1fb8c6b2e8e83
+Description: friendly menu driven serial communication program
+
+Package: python3-smbus
+Version: 4.1-1
+Description: Python 3 bindings for Linux SMBus access through i2c-dev
+
+Package: vim
+Version: 2:8.1.0875-5
+Description-md5: 59e8b8f7757db8b53566d5d119872de8
+"""
+
+_SEARCH_TRANSLATIONS = b"""Package: vim
+Description-md5: 59e8b8f7757db8b53566d5d119872de8
+Description-en: Vi IMproved - enhanced vi editor
+ Vim is an almost compatible version of the UNIX editor Vi.
+"""
+
+
+@pytest.fixture
+def search_index(tmp_path):
+    lists = tmp_path / 'lists'
+    lists.mkdir()
+    (lists / 'a_main_binary-armhf_Packages').write_bytes(_SEARCH_PACKAGES)
+    (lists / 'a_main_i18n_Translation-en').write_bytes(_SEARCH_TRANSLATIONS)
+    cache = str(tmp_path / 'cache')
+    return SearchIndex(PackageStore(str(lists), cache), cache)
+
+
+@pytest.mark.parametrize('query,expected', [('python3', ['python3', 'python3-smbus', 'python3-serial']),
+                                            ('Serial', ['python3-serial', 'minicom']),
+                                            ('seri pyth', ['python3-serial']),
+                                            ('python3-s', ['python3-smbus', 'python3-serial']),
+                                            ('m', ['minicom']),
+                                            ('i2c', ['python3-smbus']),
+                                            ('vim', ['vim']),
+                                            ('vi edit', ['vim']),
+                                            ('emacs', []),
+                                            ('', []),
+                                            ])
+def test_search(search_index, query, expected):
+    assert expected == [name for name, description in search_index.search(query)]
+
+
+def test_search_limit(search_index):
+    # the shortest names starting with the word first
+    assert ['python3', 'python3-smbus'] == [name for name, description in search_index.search('pyth', 2)]
+    assert ['python3-serial'] == [name for name, description in search_index.search('serial', 1)]
+    assert [] == search_index.search('python3', 0)
+
+
+def test_current(search_index):
+    assert not search_index.current()
+    search_index.update()
+    assert search_index.current()
+    assert search_index.store.current()
+    # changed lists are read by the next update
+    with open(os.path.join(search_index.lists_dir, 'a_main_binary-armhf_Packages'), 'ab') as f:
+        f.write(b'\nPackage: emacs\nDescription: editor\n')
+    assert not search_index.current()
+    assert not search_index.store.current()
+    assert [('emacs', 'editor')] == search_index.search('emacs')
+    assert search_index.current()
+
+
+def test_search_persisted(search_index, tmp_path):
+    search_index.search('python3')
+    cache = str(tmp_path / 'cache')
+    index = SearchIndex(PackageStore(search_index.lists_dir, cache), cache)
+    assert [('minicom', 'friendly menu driven serial communication program')] == index.search('minic')
+
+
+def test_search_without_translations(search_index):
+    os.remove(os.path.join(search_index.lists_dir, 'a_main_i18n_Translation-en'))
+    assert [('vim', '')] == search_index.search('vim')
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""Tests regarding the warm-start snapshot.
+"""
+from snapshot import save_snapshot, load_snapshot, diff_names
+
+
+def test_roundtrip(tmpdir):
+    path = str(tmpdir.join('snapshot.idx'))
+    save_snapshot(['vim', 'bash', 'nano'], ['nano', 'bash'], 'Installed', path)
+    snapshot = load_snapshot(path)
+    assert ['bash', 'nano', 'vim'] == list(snapshot.names)
+    assert ['bash', 'nano'] == list(snapshot.installed)
+    assert 'Installed' == snapshot.command
+
+
+def test_empty(tmpdir):
+    path = str(tmpdir.join('snapshot.idx'))
+    save_snapshot([], [], path=path)
+    snapshot = load_snapshot(path)
+    assert 0 == len(snapshot.names)
+    assert '' == snapshot.command
+
+
+def test_missing_or_invalid(tmpdir):
+    path = str(tmpdir.join('snapshot.idx'))
+    assert load_snapshot(path) is None
+    with open(path, 'wb') as f:
+        f.write(b'garbage')
+    assert load_snapshot(path) is None
+
+
+def test_diff_names():
+    assert ([], []) == diff_names(['a', 'b'], ['a', 'b'])
+    assert (['c', 'd'], ['a']) == diff_names(['a', 'b'], ['b', 'c', 'd'])
+    assert (['a'], []) == diff_names([], ['a'])
+    assert ([], ['a', 'z']) == diff_names(['a', 'z'], [])
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""Tests regarding the verification of the installed files.
+"""
+import hashlib
+import pytest
+import verify
+from verify import Verification, md5sums_files, read_md5sums, read_diversions
+
+
+def _md5(data):
+    return hashlib.md5(data).hexdigest()
+
+
+@pytest.fixture
+def system(tmp_path):
+    root = tmp_path / 'root'
+    (root / 'usr' / 'bin').mkdir(parents=True)
+    info = tmp_path / 'info'
+    info.mkdir()
+    (root / 'usr' / 'bin' / 'good').write_bytes(b'good')
+    (root / 'usr' / 'bin' / 'bad').write_bytes(b'corrupted')
+    (root / 'usr' / 'bin' / 'moved.real').write_bytes(b'moved')
+    (info / 'good:armhf.md5sums').write_bytes('{0}  usr/bin/good\n'.format(_md5(b'good')).encode())
+    (info / 'bad.md5sums').write_bytes('{0}  usr/bin/good\n{1}  usr/bin/bad\n{0}  usr/bin/missing\n'
+                                       .format(_md5(b'good'), _md5(b'bad')).encode())
+    (info / 'moved.md5sums').write_bytes('{0}  usr/bin/moved\n'.format(_md5(b'moved')).encode())
+    diversions = tmp_path / 'diversions'
+    diversions.write_bytes(b'/usr/bin/moved\n/usr/bin/moved.real\nother-package\n')
+    return str(root), str(info), str(diversions)
+
+
+def test_md5sums(system):
+    root, info, diversions = system
+    files = md5sums_files(info)
+    assert ['bad', 'good', 'moved'] == sorted(files)
+    assert [(_md5(b'good'), 'usr/bin/good')] == read_md5sums(files['good'])
+    assert {'/usr/bin/moved': ('/usr/bin/moved.real', 'other-package')} == read_diversions(diversions)
+    assert {} == read_diversions(info + '/missing')
+
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_verification(system, workers):
+    root, info, diversions = system
+    verification = Verification(['good', 'bad', 'moved', 'unknown'], info, root, workers, diversions)
+    assert 0 == verification.progress
+    damaged = verification.run()
+    assert {'bad': ['/usr/bin/bad', '/usr/bin/missing']} == damaged
+    assert verification.done
+    assert 100 == verification.progress
+
+
+def test_background(system):
+    root, info, diversions = system
+    verification = Verification(['bad'], info, root, diversions=diversions)
+    verification.start()
+    verification._thread.join()
+    assert verification.done
+    assert ['bad'] == list(verification.damaged)
+    assert verification.error is None
+
+
+def test_error(system, monkeypatch):
+    root, info, diversions = system
+    # removed by dpkg meanwhile
+    monkeypatch.setattr(verify, 'md5sums_files', lambda path: {'bad': info + '/removed.md5sums'})
+    verification = Verification(['bad'], info, root, diversions=diversions)
+    verification.start()
+    verification._thread.join()
+    assert verification.done
+    assert isinstance(verification.error, OSError)
+    with pytest.raises(OSError):
+        verification.run()
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""\
+Verification of the installed files against the checksums dpkg keeps in
+``/var/lib/dpkg/info/*.md5sums``.
+
+The packages are checked by a bounded pool of threads. Reading a file and
+hashing it release the GIL, so the reads of one thread overlap with the
+hashing of the others.
+"""
+import os
+import errno
+import glob
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from debfiles import DPKG_INFO
+
+DPKG_DIVERSIONS = '/var/lib/dpkg/diversions'
+
+_CHUNK_SIZE = 1 << 16
+
+
+def md5sums_files(info_dir=DPKG_INFO):
+    """\
+    Returns the checksum files of the packages.
+
+    :param str info_dir: The dpkg info directory.
+    :return: A dict mapping the package names (without architecture) to the
+             paths of their ".md5sums" files.
+    """
+    files = {}
+    for path in glob.glob(os.path.join(info_dir, '*.md5sums')):
+        # "libc6:armhf.md5sums" or "bash.md5sums"
+        name = os.path.basename(path)[:-len('.md5sums')].split(':', 1)[0]
+        files[name] = path
+    return files
+
+
+def read_md5sums(path):
+    """\
+    Reads a checksum file.
+
+    :param str path: The ".md5sums" file.
+    :return: A list of tuples ``(md5 digest (hex), path relative to /)``.
+    """
+    sums = []
+    with open(path, 'rb') as f:
+        for line in f:
+            digest, _, name = line.rstrip(b'\n').partition(b'  ')
+            if name:
+                sums.append((digest.decode('ascii', 'replace'), name.decode('utf-8', 'surrogateescape')))
+    return sums
+
+
+def read_diversions(path=DPKG_DIVERSIONS):
+    """\
+    Reads the files diverted by dpkg-divert.
+
+    :param str path: The dpkg diversions file.
+    :return: A dict mapping the original paths to tuples ``(diverted path,
+             diverting package)``.
+    """
+    diversions = {}
+    try:
+        with open(path, 'rb') as f:
+            lines = f.read().decode('utf-8', 'surrogateescape').split('\n')
+    except OSError:
+        return diversions
+    for i in range(0, len(lines) - 2, 3):
+        diversions[lines[i]] = (lines[i + 1], lines[i + 2])
+    return diversions
+
+
+def file_md5(path):
+    """\
+    Returns the md5 digest (hex) of a file.
+    """
+    h = hashlib.md5()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(_CHUNK_SIZE)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class Verification(object):
+    """\
+    Checks the files of installed packages.
+
+    The check runs in a background thread, :attr:`progress` and :attr:`done`
+    may be polled from another thread. If the check failed, :attr:`error`
+    is the exception and :attr:`damaged` is incomplete.
+    """
+    def __init__(self, packages, info_dir=DPKG_INFO, root='/', workers=4,
+                 diversions=DPKG_DIVERSIONS):
+        """\
+        :param packages: The names of the packages to check.
+        :param str info_dir: The dpkg info directory.
+        :param str root: The root directory the packages are installed in.
+        :param int workers: Number of threads.
+        :param str diversions: The dpkg diversions file.
+        """
+        self.packages = list(packages)
+        self.info_dir = info_dir
+        self.root = root
+        self.workers = workers
+        self.diversions_path = diversions
+        self.damaged = {}
+        self.error = None
+        self.done = False
+        self._total = 0
+        self._checked = 0
+        self._cancelled = False
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def progress(self):
+        """\
+        The percentage of the checked files.
+        """
+        with self._lock:
+            if self._total == 0:
+                return 100 if self.done else 0
+            return 100 * self._checked // self._total
+
+    def start(self):
+        """\
+        Starts the check in a background thread.
+        """
+        self._thread = threading.Thread(target=self._background)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def cancel(self):
+        """\
+        Stops the check, packages being checked are finished.
+        """
+        self._cancelled = True
+
+    def _check(self, package, sums, diversions):
+        # Returns the damaged or missing files of a package
+        damaged = []
+        for digest, name in sums:
+            path = '/' + name
+            diversion = diversions.get(path)
+            if diversion is not None and diversion[1] != package:
+                path = diversion[0]
+            try:
+                if file_md5(os.path.join(self.root, path.lstrip('/'))) != digest:
+                    damaged.append(path)
+            except (IOError, OSError) as e:
+                # Files the user may not read can't be checked
+                if e.errno != errno.EACCES:
+                    damaged.append(path)
+            with self._lock:
+                self._checked += 1
+        return package, damaged
+
+    def _collect(self, futures):
+        for future in futures:
+            package, damaged = future.result()
+            if damaged:
+                self.damaged[package] = damaged
+
+    def _background(self):
+        try:
+            self.run()
+        except Exception:
+            # recorded in error
+            pass
+
+    def run(self):
+        """\
+        Checks the packages in the calling thread.
+
+        :return: A dict mapping the damaged packages to the lists of their
+                 damaged or missing files.
+        """
+        try:
+            files = md5sums_files(self.info_dir)
+            diversions = read_diversions(self.diversions_path)
+            work = []
+            for package in self.packages:
+                if package in files:
+                    sums = read_md5sums(files[package])
+                    work.append((package, sums))
+                    self._total += len(sums)
+
+            # Only a few packages are queued at once
+            with ThreadPoolExecutor(self.workers) as pool:
+                pending = set()
+                for package, sums in work:
+                    if self._cancelled:
+                        break
+                    if len(pending) >= 2 * self.workers:
+                        finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        self._collect(finished)
+                    pending.add(pool.submit(self._check, package, sums, diversions))
+                self._collect(wait(pending)[0])
+        except Exception as e:
+            self.error = e
+            raise
+        finally:
+            self.done = True
+        return self.damaged
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""\
+A rotating "i am busy" indicator shared by the apps.
+
+The rotation frames are rendered once into a sprite sheet which is shared
+by all instances, a frame is drawn by copying its part of the sheet. The
+frames are advanced by a timer which schedules ``update()`` calls, so Qt
+coalesces them with other repaints. The timer stops while the indicator
+is hidden, its window is minimized or another window, i.e. a dialog, is
+active.
+
+The CPU time spent by the indicator is counted in :attr:`cpu_time`.
+
+This module is shared by the apps and copied into each app package.
+"""
+import time
+from PyQt4.QtCore import *
+from PyQt4.QtGui import *
+
+# Counts the CPU time of the GUI thread only, other threads may be busy
+_thread_time = getattr(time, 'thread_time', time.process_time)
+
+
+class BusyAnimation(QWidget):
+    """\
+    A rotating ring of dots centered on its parent, optionally with a
+    percentage in the middle.
+    """
+    # Size of the widget in pixels
+    SIZE = 64
+
+    # Size of a dot in pixels
+    DOT_SIZE = 16
+
+    # The ring has 8 dots, so 8 frames make a full turn
+    FRAMES = 8
+
+    # Milliseconds per frame
+    INTERVAL = 200
+
+    DARK = '#808080'
+    BRIGHT = '#fcce04'
+
+    # The sprite sheets by size
+    _sheets = {}
+
+    def __init__(self, parent):
+        """\
+        :param QWidget parent: The widget the indicator is centered on.
+        """
+        super(BusyAnimation, self).__init__(parent)
+        self.cpu_time = 0.0
+        self.frames = 0
+        self.frame = 0
+        self.percent = None
+
+        start = _thread_time()
+        self.sheet = self._sheet(self.SIZE)
+        self.resize(self.SIZE, self.SIZE)
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)
+
+        # the percentage is drawn with a third of the normal font size
+        self.percentFont = QFont(self.font())
+        if self.percentFont.pointSize() < 0:
+            self.percentFont.setPixelSize(max(self.percentFont.pixelSize() // 3, 1))
+        else:
+            self.percentFont.setPointSize(max(self.percentFont.pointSize() // 3, 1))
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.animate)
+
+        # follow the size of the parent and the state of the window
+        parent.installEventFilter(self)
+        self.observed = parent.window()
+        if self.observed is not parent:
+            self.observed.installEventFilter(self)
+        self.center()
+        self.cpu_time += _thread_time() - start
+
+    @classmethod
+    def _sheet(cls, size):
+        # renders the frames side by side once
+        sheet = cls._sheets.get(size)
+        if sheet is not None:
+            return sheet
+        sheet = QPixmap(size * cls.FRAMES, size)
+        sheet.fill(Qt.transparent)
+        painter = QPainter(sheet)
+        painter.setRenderHint(QPainter.Antialiasing, True)
+        painter.setPen(Qt.white)
+        radius = size / 2 - cls.DOT_SIZE
+        for frame in range(cls.FRAMES):
+            painter.save()
+            painter.translate(frame * size + size / 2, size / 2)
+            for dot in range(8):
+                painter.rotate(45)
+                bright = dot == frame % 8
+                painter.setBrush(QBrush(QColor(cls.BRIGHT if bright else cls.DARK)))
+                painter.drawEllipse(QRectF(0, radius, cls.DOT_SIZE - 1, cls.DOT_SIZE - 1))
+            painter.restore()
+        painter.end()
+        cls._sheets[size] = sheet
+        return sheet
+
+    def center(self):
+        parent = self.parentWidget()
+        self.move(QPoint((parent.width() - self.width()) // 2, (parent.height() - self.height()) // 2))
+
+    def running(self):
+        """\
+        Returns ``True`` if the frames are advanced.
+        """
+        return self.timer.isActive()
+
+    def updateTimer(self):
+        # animate only while someone may see it
+        window = self.window()
+        visible = (self.isVisible() and not window.isMinimized() and
+                   (window.isActiveWindow() or QApplication.activeWindow() is None))
+        if visible and not self.timer.isActive():
+            self.timer.start(self.INTERVAL)
+        elif not visible and self.timer.isActive():
+            self.timer.stop()
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Resize and obj is self.parentWidget():
+            self.center()
+        elif event.type() in (QEvent.WindowActivate, QEvent.WindowDeactivate,
+                              QEvent.WindowStateChange):
+            self.updateTimer()
+        return False
+
+    def showEvent(self, event):
+        super(BusyAnimation, self).showEvent(event)
+        self.raise_()
+        self.updateTimer()
+
+    def hideEvent(self, event):
+        super(BusyAnimation, self).hideEvent(event)
+        self.timer.stop()
+
+    def progress(self, perc):
+        """\
+        Shows a percentage, ``None`` hides it.
+        """
+        if perc != self.percent:
+            self.percent = perc
+            self.update()
+
+    def animate(self):
+        start = _thread_time()
+        self.frame = (self.frame + 1) % self.FRAMES
+        self.update()
+        self.cpu_time += _thread_time() - start
+
+    def close(self):
+        self.timer.stop()
+        self.parentWidget().removeEventFilter(self)
+        self.observed.removeEventFilter(self)
+        return super(BusyAnimation, self).close()
+
+    def paintEvent(self, event):
+        start = _thread_time()
+        painter = QPainter(self)
+        painter.drawPixmap(0, 0, self.sheet, self.frame * self.SIZE, 0, self.SIZE, self.SIZE)
+        if self.percent != None:
+            painter.setFont(self.percentFont)
+            painter.drawText(self.rect(), Qt.AlignCenter, str(self.percent) + "%")
+        painter.end()
+        self.frames += 1
+        self.cpu_time += _thread_time() - start
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""\
+Resource control of the processes the apps start.
+
+Heavy jobs like ``apt-get upgrade`` or a configuration script would slow
+down the touchscreen UI on a single core board. The command lines built
+here run them with a lower CPU and I/O priority and optionally in a
+systemd scope with CPU and memory limits.
+
+The commands are started by the caller, i.e. with ``QProcess``. If a
+report is requested the command runs below this module as a small
+wrapper, which writes the CPU time and peak memory of the job to a file
+when the job finished::
+
+    python3 procctl.py --report /tmp/usage --nice 10 -- apt-get update
+
+This module is shared by the apps and copied into each app package.
+"""
+import os
+import sys
+import json
+import argparse
+import shutil
+import signal
+import tempfile
+import subprocess
+from collections import namedtuple
+
+Policy = namedtuple('Policy', ['nice', 'io_class', 'io_level', 'cpu_quota', 'memory_max', 'scope'])
+Policy.__doc__ = """\
+How a job is run.
+
+``nice`` is the CPU niceness (0 to 19). ``io_class`` is one of the
+``IO_*`` constants or ``None``, ``io_level`` the level (0 to 7) of the
+best-effort class. If ``scope`` is ``True`` and ``systemd-run`` is
+available, the job runs in a transient scope limited by ``cpu_quota``
+(i.e. ``'50%'``) and ``memory_max`` (i.e. ``'256M'``), both optional.
+"""
+
+IO_REALTIME, IO_BEST_EFFORT, IO_IDLE = 1, 2, 3
+
+# Jobs the user waits for
+INTERACTIVE = Policy(nice=0, io_class=None, io_level=None, cpu_quota=None, memory_max=None,
+                     scope=False)
+
+# Jobs the user does not wait for, i.e. prefetching
+BACKGROUND = Policy(nice=10, io_class=IO_BEST_EFFORT, io_level=7, cpu_quota=None,
+                    memory_max=None, scope=False)
+
+# Long running jobs which modify the system. They only get the CPU and
+# the disk when the UI does not need them
+MAINTENANCE = Policy(nice=19, io_class=IO_IDLE, io_level=None, cpu_quota=None, memory_max=None,
+                     scope=False)
+
+Usage = namedtuple('Usage', ['cpu_time', 'peak_rss', 'code'])
+Usage.__doc__ = """\
+The resources a job used: the user and system CPU time in seconds, the
+peak resident memory of its largest process in KiB and the exit code.
+"""
+
+
+def command(program, args, policy=INTERACTIVE, report=None, which=shutil.which):
+    """\
+    Returns the command line which runs a program acc. to a policy.
+
+    :param str program: The program, ``sudo`` is recognized and the limits
+                        are applied to the program it runs.
+    :param list args: A list of arguments (strings).
+    :param Policy policy: The policy.
+    :param str report: A file the :class:`Usage` of the job is written to
+                       when it finished, no report by default.
+    :param which: A function returning the path of an executable or
+                  ``None`` if it is not installed.
+    :return: A tuple ``(program, arguments)``.
+    """
+    cmd = [program] + list(args)
+
+    if policy.scope and which('systemd-run') is not None:
+        limits = ['systemd-run', '--scope', '--quiet', '--collect']
+        if policy.cpu_quota is not None:
+            limits += ['-p', 'CPUQuota={0}'.format(policy.cpu_quota)]
+        if policy.memory_max is not None:
+            limits += ['-p', 'MemoryMax={0}'.format(policy.memory_max)]
+        if program == 'sudo':
+            # a system scope, the arguments of sudo itself are not supported
+            cmd = ['sudo'] + limits + cmd[1:]
+        else:
+            cmd = limits[:1] + ['--user'] + limits[1:] + cmd
+
+    if policy.io_class is not None and which('ionice') is not None:
+        ionice = ['ionice', '-c', str(policy.io_class)]
+        if policy.io_class == IO_BEST_EFFORT and policy.io_level is not None:
+            ionice += ['-n', str(policy.io_level)]
+        cmd = ionice + cmd
+
+    if report is not None:
+        # the wrapper sets the niceness itself
+        wrapper = [sys.executable, os.path.abspath(__file__), '--report', report]
+        if policy.nice:
+            wrapper += ['--nice', str(policy.nice)]
+        cmd = wrapper + ['--'] + cmd
+    elif policy.nice:
+        cmd = ['nice', '-n', str(policy.nice)] + cmd
+
+    return cmd[0], cmd[1:]
+
+
+def report_file():
+    """\
+    Returns the path of a new, empty file for a report.
+    """
+    fd, path = tempfile.mkstemp(prefix='procctl-', suffix='.json')
+    os.close(fd)
+    return path
+
+
+def read_report(path):
+    """\
+    Reads and removes a report.
+
+    :param str path: The file passed to :func:`command`.
+    :return: A :class:`Usage` or ``None`` if the wrapper did not finish.
+    """
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return Usage(data['cpu_time'], data['peak_rss'], data['code'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def format_usage(usage):
+    """\
+    Returns a short text describing a :class:`Usage`.
+    """
+    return 'CPU time {0:.1f} s, peak memory {1:.1f} MiB'.format(usage.cpu_time, usage.peak_rss / 1024.0)
+
+
+def run(cmd, report, nice=0):
+    """\
+    Runs a command, waits for it and writes the report.
+
+    SIGTERM, SIGINT and SIGHUP are passed on to the command.
+
+    :param list cmd: The command and its arguments.
+    :param str report: The report file.
+    :param int nice: The niceness to add.
+    :return: The exit code, ``128 + signal`` if the command was killed.
+    """
+    def lower_priority():
+        if nice:
+            os.nice(nice)
+
+    proc = subprocess.Popen(cmd, preexec_fn=lower_priority)
+    for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+        signal.signal(signum, lambda signum, frame: proc.send_signal(signum))
+    while True:
+        try:
+            pid, status, rusage = os.wait4(proc.pid, 0)
+            break
+        except InterruptedError:
+            continue
+    if os.WIFSIGNALED(status):
+        code = 128 + os.WTERMSIG(status)
+    else:
+        code = os.WEXITSTATUS(status)
+    proc.returncode = code
+    # the usage of the command includes the processes it waited for
+    with open(report, 'w') as f:
+        json.dump({'cpu_time': rusage.ru_utime + rusage.ru_stime,
+                   'peak_rss': rusage.ru_maxrss, 'code': code}, f)
+    return code
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Runs a command and reports its resource usage.')
+    parser.add_argument('--report', required=True, help='file the usage is written to (JSON)')
+    parser.add_argument('--nice', type=int, default=0, help='niceness to add')
+    parser.add_argument('command', nargs=argparse.REMAINDER, help='the command after "--"')
+    args = parser.parse_args(argv)
+    cmd = args.command[1:] if args.command[:1] == ['--'] else args.command
+    if not cmd:
+        parser.error('no command')
+    try:
+        return run(cmd, args.report, args.nice)
+    except OSError as e:
+        print('{0}: {1}'.format(cmd[0], e), file=sys.stderr)
+        return 127
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""Tests regarding the resource control of the started processes.
+"""
+import os
+import sys
+import subprocess
+import procctl
+from procctl import command, read_report, format_usage, report_file, Usage, Policy, \
+    INTERACTIVE, BACKGROUND, MAINTENANCE
+
+
+def _all(name):
+    return '/usr/bin/' + name
+
+
+def _none(name):
+    return None
+
+
+def test_interactive():
+    assert ('apt-cache', ['show', 'vim']) == command('apt-cache', ['show', 'vim'], INTERACTIVE, which=_all)
+
+
+def test_background():
+    program, args = command('apt-cache', ['show', 'vim'], BACKGROUND, which=_all)
+    assert 'nice' == program
+    assert ['-n', '10', 'ionice', '-c', '2', '-n', '7', 'apt-cache', 'show', 'vim'] == args
+
+
+def test_missing_tools():
+    # without ionice and systemd-run only the niceness is changed
+    policy = MAINTENANCE._replace(scope=True, cpu_quota='50%')
+    assert ('nice', ['-n', '19', 'sudo', 'apt-get', 'upgrade']) == \
+        command('sudo', ['apt-get', 'upgrade'], policy, which=_none)
+
+
+def test_scope():
+    policy = Policy(nice=0, io_class=None, io_level=None, cpu_quota='50%', memory_max='256M', scope=True)
+    program, args = command('sudo', ['apt-get', 'upgrade'], policy, which=_all)
+    assert 'sudo' == program
+    assert ['systemd-run', '--scope', '--quiet', '--collect', '-p', 'CPUQuota=50%',
+            '-p', 'MemoryMax=256M', 'apt-get', 'upgrade'] == args
+    program, args = command('script', [], policy._replace(memory_max=None), which=_all)
+    assert ('systemd-run', ['--user', '--scope', '--quiet', '--collect', '-p', 'CPUQuota=50%', 'script']) == \
+        (program, args)
+
+
+def test_report_wrapper():
+    program, args = command('sudo', ['script'], MAINTENANCE, report='/tmp/x', which=_none)
+    assert sys.executable == program
+    assert [os.path.abspath(procctl.__file__), '--report', '/tmp/x', '--nice', '19', '--',
+            'sudo', 'script'] == args
+
+
+def test_report(tmp_path):
+    report = str(tmp_path / 'usage.json')
+    program, args = command(sys.executable, ['-c', 'import sys; b = bytearray(32 << 20); sys.exit(3)'],
+                            BACKGROUND._replace(io_class=None), report=report)
+    assert 3 == subprocess.call([program] + args)
+    usage = read_report(report)
+    assert 3 == usage.code
+    assert usage.cpu_time > 0
+    assert usage.peak_rss > 32 << 10
+    assert not os.path.exists(report)
+    assert read_report(report) is None
+
+
+def test_report_killed(tmp_path):
+    report = str(tmp_path / 'usage.json')
+    program, args = command(sys.executable, ['-c', 'import os; os.kill(os.getpid(), 9)'], report=report)
+    assert 128 + 9 == subprocess.call([program] + args)
+    assert 128 + 9 == read_report(report).code
+
+
+def test_report_file():
+    path = report_file()
+    assert os.path.exists(path)
+    assert read_report(path) is None
+    assert not os.path.exists(path)
+
+
+def test_format_usage():
+    assert 'CPU time 1.2 s, peak memory 2.5 MiB' == format_usage(Usage(1.25, 2560, 0))
@@ -0,0 +1 @@
+../common/busyanim.py
\ No newline at end of file
@@ -25,10 +25,8 @@ from functools import partial
 from PyQt4.QtCore import *
 from PyQt4.QtGui import *
 from TouchStyle import TouchApplication, TouchWindow, TouchMessageBox
-try:
-    from TouchStyle import BusyAnimation
-except ImportError:
-    from launcher import BusyAnimation
+from busyanim import BusyAnimation
+from procctl import command, report_file, read_report, format_usage, MAINTENANCE
 
 _parser = configparser.ConfigParser()
 with open(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'manifest'), encoding='utf-8') as f:
@@ -92,7 +90,7 @@ class ConfigApp(TouchApplication):
         :param busy: ``True`` to show a busy animation, ``False`` to stop the animation.
         """
         if busy and self._busy_animation is None:
-            self._busy_animation = BusyAnimation(self, self.win)
+            self._busy_animation = BusyAnimation(self.win)
             self._busy_animation.show()
         elif not busy and self._busy_animation is not None:
             self._busy_animation.close()
@@ -112,10 +110,6 @@ class ConfigApp(TouchApplication):
         self.win.centralWidget.setGraphicsEffect(cw_effect)
         self.win.titlebar.setGraphicsEffect(tb_effect)
 
-    def poll(self):
-        # Called by launcher.BusyAnimation
-        return False
-
 
 class PaneContainer(QStackedWidget):
     """\
@@ -212,19 +206,27 @@ class Pane(QWidget):
         Runs the script with the provided name as background process
         and informs `callback` about the result.
 
+        The script runs with the lowest CPU and I/O priority so the UI
+        stays responsive, the resources it used are logged to stderr.
+
         :param str name: The script name.
         :param list args: A list of arguments (strings)
         :param callback: A function accepting the arguments ``exit_code`` and ``exit_status``
         """
         def on_script_finished(exit_code, exit_status):
+            usage = read_report(report)
+            if usage is not None:
+                sys.stderr.write('{0}: {1}\n'.format(name, format_usage(usage)))
             self.parent()._app.iambusy(False)
             callback(exit_code, exit_status)
 
         self.parent()._app.iambusy(True)
         script = os.path.join(_SCRIPTS_PATH, name)
+        report = report_file()
+        program, arguments = command('sudo', [script] + list(args), MAINTENANCE, report)
         proc = QProcess(self)
         proc.finished.connect(on_script_finished)
-        proc.start('sudo {0} {1}'.format(script, ' '.join(args)))
+        proc.start(program, arguments)
 
     def ask_for_reboot(self):
         """\
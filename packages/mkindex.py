@@ -1,54 +1,224 @@
 #! /usr/bin/env python3
 # -*- coding: utf-8 -*-
 #
+# Builds the package index "00packages" from the manifests of the app
+# directories and rebuilds the zip files of the apps which changed, see
+# mkzip.py for the files of a package.
+#
+# The stamp (mtime, size, mode) and hash of every input file are kept in
+# a cache, unchanged files are not read again and the [files] section of
+# unchanged manifests is not parsed again. "00packages" is only written
+# if an entry changed.
+#
+# Zip files are only rebuilt if they exist, i.e. video.zip contains a
+# movie which is not part of this repository. The zips are built in
+# parallel.
 
 # Improvements:
 # - run manifest through configparser
 #   - only transfer entries needed for the store app
 #   - make sure no mandatory entry is missing
-# - check if zip file needs to be rebuild
-#   - rebuild zip file automatically
 
 import sys
 import os
+import json
+import hashlib
+import argparse
+from mkzip import apps, read_file_patterns, match_files, zip_path, build_all, UNLISTED
+
+INDEX = "00packages"
+CACHE = ".mkindex-cache.json"
+
+HEADER = "; list of packages\n; this file contains all manifests\n"
+
+def file_digest(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def input_digest(app_dir, files, known):
+    """\
+    Returns the hash of the files of an app package.
+
+    :param str app_dir: The app directory.
+    :param list files: The relative paths of the files.
+    :param dict known: Maps the relative paths to the ``[mtime, size, mode,
+                       hash]`` of the last run, files with the same stamp
+                       are not read again.
+    :return: A tuple ``(hash, stamps)``, the stamps for the next run.
+    """
+    h = hashlib.sha1()
+    stamps = {}
+    for name in files:
+        st = os.stat(os.path.join(app_dir, name))
+        stamp = [ st.st_mtime_ns, st.st_size, st.st_mode & 0o777 ]
+        cached = known.get(name)
+        if cached is not None and cached[:3] == stamp:
+            digest = cached[3]
+        else:
+            digest = file_digest(os.path.join(app_dir, name))
+        stamps[name] = stamp + [ digest ]
+        h.update("{0}\0{1:o}\0{2}\n".format(name, stamp[2], digest).encode("utf-8"))
+    return h.hexdigest(), stamps
 
-print("Building package index ...")
-
-pkgfile = open("00packages", "w")
-pkgfile.write("; list of packages\n")
-pkgfile.write("; this file contains all manifests\n")
-
-# scan the directory for app directories
-for l in sorted(os.listdir(".")):
-    if os.path.isdir(l) and l != 'config':
-        m = os.path.join(l, "manifest")
-        if os.path.isfile(m):
-            print("Adding", l, "...")
-            pkgfile.write("\n")
-            pkgfile.write("["+l+"]\n")
-            lang = ""
-
-            # copy manifest contents. Skip [app] entry
-            f = open(m)
-            for line in f:
-                line = line.strip()
-                # ignore empty lines
-                if line != "":
-                    # check if there's a section header in the line
-                    if line[0] == '[':
-                        # check if it's no the app section
-                        if not "[app]" in line:
-                            lang = line[line.find("[")+1:line.find("]")]
+
+def manifest_entry(app, manifest):
+    """\
+    Returns the section of an app in the package index.
+
+    The entries of the [app] section are copied, the entries of language
+    sections get the language code appended, i.e. "desc_de".
+    """
+    lines = [ "", "[" + app + "]" ]
+    lang = ""
+    skip = False
+
+    # copy manifest contents. Skip [app] entry
+    with open(manifest) as f:
+        for line in f:
+            line = line.strip()
+            # ignore empty lines
+            if line != "":
+                # check if there's a section header in the line
+                if line[0] == '[':
+                    # the files of the zip are no index entries
+                    skip = "[files]" in line
+                    # check if it's no the app section
+                    if not "[app]" in line:
+                        lang = line[line.find("[")+1:line.find("]")]
+                elif skip:
+                    pass
+                else:
+                    if lang == "":
+                        # print lines not from a language specific section
+                        # just as they are
+                        lines.append(line)
                     else:
-                        if lang == "":
-                            # print lines not from a language specific section
-                            # just as they are
-                            print(line, file=pkgfile)
-                        else:
-                            # otherwise append language code to identifier
-                            # split at first ':'
-                            parts = line.split(':', 1)
-                            print(parts[0].strip()+"_"+lang+": "+parts[1].strip(), file=pkgfile)
-            f.close()
-
-pkgfile.close()
+                        # otherwise append language code to identifier
+                        # split at first ':'
+                        parts = line.split(':', 1)
+                        lines.append(parts[0].strip()+"_"+lang+": "+parts[1].strip())
+    return "\n".join(lines) + "\n"
+
+
+def file_stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [ st.st_mtime_ns, st.st_size ]
+
+
+def write_if_changed(path, text):
+    """\
+    Writes a text file unless it has this content already.
+
+    :return: ``True`` if the file was written.
+    """
+    try:
+        with open(path) as f:
+            if f.read() == text:
+                return False
+    except OSError:
+        pass
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(text)
+    os.replace(tmp, path)
+    return True
+
+
+def load_cache(path):
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def update(directory=".", force=False, workers=None):
+    """\
+    Updates the package index and the zip files of the changed apps.
+
+    :param str directory: The directory containing the app directories.
+    :param bool force: Ignore the cache and rebuild everything.
+    :param int workers: Number of processes building zip files.
+    :return: A tuple ``(changed apps, index written, rebuilt zip files)``.
+    """
+    cache_path = os.path.join(directory, CACHE)
+    cache = {} if force else load_cache(cache_path)
+    new_cache = {}
+    changed = []
+    entries = []
+    jobs = []
+
+    # scan the directory for app directories
+    for app in apps(directory):
+        app_dir = os.path.join(directory, app)
+        known = cache.get(app, {})
+        manifest = os.path.join(app_dir, "manifest")
+        stamp = file_stamp(manifest)
+        cached = known.get("manifest")
+        if cached is not None and cached[0] == stamp:
+            patterns = cached[1]
+        else:
+            patterns = read_file_patterns(manifest)
+        files = match_files(app_dir, patterns)
+        # the manifest is an input even if it is not packaged
+        inputs = sorted(set(files) | { "manifest" })
+        digest, stamps = input_digest(app_dir, inputs, known.get("files", {}))
+        path = zip_path(directory, app)
+        zipped = file_stamp(path)
+
+        entry = known.get("entry")
+        if digest != known.get("digest") or entry is None:
+            print("Updating", app, "...")
+            changed.append(app)
+            entry = manifest_entry(app, manifest)
+        if zipped is not None and (digest != known.get("digest") or zipped != known.get("zip")):
+            print("Rebuilding", os.path.relpath(path, directory), "...")
+            jobs.append(( app_dir, files, path ))
+
+        if app not in UNLISTED:
+            entries.append(entry)
+        new_cache[app] = { "digest": digest, "files": stamps, "entry": entry, "zip": zipped,
+                           "manifest": [ stamp, patterns ] }
+
+    rebuilt = build_all(jobs, workers)
+    for path in rebuilt:
+        app = os.path.basename(path)[:-len(".zip")]
+        new_cache[app]["zip"] = file_stamp(path)
+
+    written = write_if_changed(os.path.join(directory, INDEX), HEADER + "".join(entries))
+    if written:
+        print("Writing", INDEX, "...")
+    if new_cache != cache:
+        try:
+            write_if_changed(cache_path, json.dumps(new_cache, indent=1, sort_keys=True))
+        except OSError:
+            # not fatal, the next run reads the files again
+            pass
+    return changed, written, rebuilt
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Builds the package index and the app zip files.")
+    parser.add_argument("directory", nargs="?", default=".",
+                        help="directory containing the app directories")
+    parser.add_argument("--force", action="store_true", help="ignore the cache")
+    parser.add_argument("--jobs", type=int, default=None, help="number of processes building zips")
+    args = parser.parse_args(argv)
+
+    print("Building package index ...")
+    changed, written, rebuilt = update(args.directory, args.force, args.jobs)
+    if not changed and not written and not rebuilt:
+        print("Everything is up to date.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Builds the zip files of the apps.
+#
+# The zips are reproducible: the entries are sorted and have a fixed
+# timestamp and permissions, so unchanged files give a byte-identical zip.
+# Files which are compressed already, like PNG images and Qt translations,
+# are stored instead of deflated. Several zips are built in parallel.
+#
+# The files of an app are listed in the [files] section of its manifest,
+# whitespace separated glob patterns relative to the app directory,
+# directories are added with their contents:
+#
+#   [files]
+#   include: *.py manifest icon.png scripts
+#   exclude: benchmark.py
+#
+# Without a [files] section, all files of the app directory are packaged
+# except hidden files, caches, tests and art.
+#
+# Usage: mkzip.py [--jobs N] [app ...]
+
+import sys
+import os
+import glob
+import fnmatch
+import zipfile
+import argparse
+import configparser
+from concurrent.futures import ProcessPoolExecutor
+
+# the timestamp of all entries, the earliest a zip can store
+TIMESTAMP = ( 1980, 1, 1, 0, 0, 0 )
+
+# files which don't get smaller when deflated
+STORED = ( "*.png", "*.jpg", "*.jpeg", "*.gif", "*.qm", "*.zip", "*.gz", "*.xz", "*.bz2",
+           "*.mp3", "*.ogg", "*.mp4", "*.avi" )
+
+# files and directories which are not packaged by default
+IGNORE = ( ".*", "__pycache__", "*.pyc", "*.zip", "art", "tests" )
+
+# apps which are not listed in the package index keep their zip in their
+# directory
+UNLISTED = ( "config", )
+
+
+def ignored(name):
+    return any(fnmatch.fnmatch(name, p) for p in IGNORE)
+
+
+def _walk(app_dir, path):
+    # the files below a directory, relative to the app directory
+    files = []
+    for root, dirs, names in os.walk(path):
+        dirs[:] = [ d for d in dirs if not ignored(d) ]
+        for name in names:
+            if not ignored(name):
+                files.append(os.path.relpath(os.path.join(root, name), app_dir))
+    return files
+
+
+def read_file_patterns(manifest):
+    """\
+    Returns the patterns of the [files] section of a manifest.
+
+    :return: A tuple ``(include, exclude)`` of lists of patterns, ``None``
+             if the manifest has no [files] section.
+    """
+    parser = configparser.ConfigParser(interpolation=None)
+    with open(manifest, encoding="utf-8") as f:
+        parser.read_file(f)
+    if not parser.has_section("files"):
+        return None
+    return ( parser.get("files", "include", fallback="").split(),
+             parser.get("files", "exclude", fallback="").split() )
+
+
+def package_files(app_dir):
+    """\
+    Returns the sorted relative paths of the files of an app package.
+    """
+    return match_files(app_dir, read_file_patterns(os.path.join(app_dir, "manifest")))
+
+
+def match_files(app_dir, patterns):
+    """\
+    Returns the sorted relative paths of the files matching the patterns
+    returned by :func:`read_file_patterns`, all files if ``None``.
+    """
+    if patterns is None:
+        include, exclude = [ "." ], [ ]
+    else:
+        include, exclude = patterns
+    files = set()
+    for pattern in include:
+        for path in glob.glob(os.path.join(app_dir, pattern)):
+            if os.path.isdir(path):
+                files.update(_walk(app_dir, path))
+            else:
+                files.add(os.path.relpath(path, app_dir))
+    files = [ f.replace(os.sep, "/") for f in files ]
+    return sorted(f for f in files if not any(fnmatch.fnmatch(f, p) for p in exclude))
+
+
+def zip_path(directory, app):
+    """\
+    Returns the path of the zip file of an app.
+    """
+    if app in UNLISTED:
+        return os.path.join(directory, app, app + ".zip")
+    return os.path.join(directory, app + ".zip")
+
+
+def build_zip(app_dir, files, path):
+    """\
+    Writes the files of an app package to a zip file.
+
+    The file is replaced atomically.
+
+    :param str app_dir: The app directory.
+    :param list files: The relative paths of the files.
+    :param str path: The zip file.
+    :return: The path of the zip file.
+    """
+    tmp = "{0}.{1}.tmp".format(path, os.getpid())
+    with zipfile.ZipFile(tmp, "w") as zf:
+        for name in sorted(files):
+            src = os.path.join(app_dir, name)
+            info = zipfile.ZipInfo(name, TIMESTAMP)
+            info.create_system = 3
+            mode = 0o755 if os.stat(src).st_mode & 0o111 else 0o644
+            info.external_attr = (0o100000 | mode) << 16
+            if any(fnmatch.fnmatch(name.lower(), p) for p in STORED):
+                info.compress_type = zipfile.ZIP_STORED
+            else:
+                info.compress_type = zipfile.ZIP_DEFLATED
+            with open(src, "rb") as f:
+                zf.writestr(info, f.read())
+    os.replace(tmp, path)
+    return path
+
+
+def _build(job):
+    return build_zip(*job)
+
+
+def build_all(jobs, workers=None):
+    """\
+    Builds several zip files in parallel.
+
+    :param list jobs: A list of tuples ``(app directory, files, zip path)``.
+    :param int workers: Number of processes, the number of CPUs by default.
+    :return: The paths of the zip files.
+    """
+    if len(jobs) <= 1 or workers == 1:
+        return [ _build(job) for job in jobs ]
+    with ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(_build, jobs))
+
+
+def apps(directory):
+    """\
+    Returns the sorted names of the app directories which have a manifest.
+    """
+    return [ l for l in sorted(os.listdir(directory))
+             if os.path.isfile(os.path.join(directory, l, "manifest")) ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Builds the app zip files.")
+    parser.add_argument("apps", nargs="*",
+                        help="the apps to build, all apps which have a zip file by default")
+    parser.add_argument("--directory", default=".", help="directory containing the app directories")
+    parser.add_argument("--jobs", type=int, default=None, help="number of parallel processes")
+    args = parser.parse_args(argv)
+
+    names = args.apps
+    if not names:
+        names = [ a for a in apps(args.directory) if os.path.exists(zip_path(args.directory, a)) ]
+    jobs = []
+    for app in names:
+        app_dir = os.path.join(args.directory, app)
+        if not os.path.isfile(os.path.join(app_dir, "manifest")):
+            parser.error("no such app: " + app)
+        jobs.append(( app_dir, package_files(app_dir), zip_path(args.directory, app) ))
+    for path in build_all(jobs, args.jobs):
+        print("Built", path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
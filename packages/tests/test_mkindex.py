@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""Tests regarding the package index builder.
+"""
+import zipfile
+import pytest
+import mkindex
+from mkindex import update, main, INDEX, CACHE
+from mkzip import package_files
+
+_MANIFEST = """\
+[app]
+name: Demo
+exec: demo.py
+version: 1.0
+
+[de]
+desc: Eine Demo
+"""
+
+
+@pytest.fixture
+def packages(tmp_path):
+    for app in ('demo', 'other'):
+        (tmp_path / app).mkdir()
+        (tmp_path / app / 'manifest').write_text(_MANIFEST)
+        (tmp_path / app / (app + '.py')).write_text('print("hello")\n')
+        (tmp_path / app / '__pycache__').mkdir()
+        (tmp_path / app / '__pycache__' / 'x.pyc').write_bytes(b'')
+        (tmp_path / app / '.gitignore').write_text('*.pyc\n')
+    (tmp_path / 'config').mkdir()
+    (tmp_path / 'config' / 'manifest').write_text(_MANIFEST)
+    (tmp_path / 'common').mkdir()
+    # only existing zips are rebuilt
+    zipfile.ZipFile(str(tmp_path / 'demo.zip'), 'w').close()
+    return tmp_path
+
+
+def _zipped(path):
+    with zipfile.ZipFile(str(path)) as zf:
+        return dict((name, zf.read(name)) for name in zf.namelist())
+
+
+def test_package_files(packages):
+    assert ['demo.py', 'manifest'] == package_files(str(packages / 'demo'))
+
+
+def test_update(packages):
+    assert (['config', 'demo', 'other'], True, [str(packages / 'demo.zip')]) == update(str(packages))
+    assert ('; list of packages\n; this file contains all manifests\n'
+            '\n[demo]\nname: Demo\nexec: demo.py\nversion: 1.0\ndesc_de: Eine Demo\n'
+            '\n[other]\nname: Demo\nexec: demo.py\nversion: 1.0\ndesc_de: Eine Demo\n') == \
+        (packages / INDEX).read_text()
+    assert {'demo.py': b'print("hello")\n', 'manifest': _MANIFEST.encode()} == _zipped(packages / 'demo.zip')
+    assert not (packages / 'other.zip').exists()
+    assert (packages / CACHE).exists()
+
+
+def test_no_change(packages):
+    update(str(packages))
+    index = (packages / INDEX).stat().st_mtime_ns
+    zipped = (packages / 'demo.zip').stat().st_mtime_ns
+    assert ([], False, []) == update(str(packages))
+    assert index == (packages / INDEX).stat().st_mtime_ns
+    assert zipped == (packages / 'demo.zip').stat().st_mtime_ns
+
+
+def test_file_changed(packages):
+    update(str(packages))
+    (packages / 'demo' / 'demo.py').write_text('print("changed")\n')
+    # the entry is the same, the index is not written
+    assert (['demo'], False, [str(packages / 'demo.zip')]) == update(str(packages))
+    assert b'print("changed")\n' == _zipped(packages / 'demo.zip')['demo.py']
+
+
+def test_manifest_changed(packages):
+    update(str(packages))
+    (packages / 'other' / 'manifest').write_text(_MANIFEST.replace('1.0', '1.1'))
+    assert (['other'], True, []) == update(str(packages))
+    assert 'version: 1.1' in (packages / INDEX).read_text()
+
+
+def test_manifest_not_parsed(packages, monkeypatch):
+    update(str(packages))
+    parsed = []
+    monkeypatch.setattr(mkindex, 'read_file_patterns', lambda path: parsed.append(path))
+    (packages / 'demo' / 'new.py').write_text('pass\n')
+    # new files are still found
+    assert (['demo'], False, [str(packages / 'demo.zip')]) == update(str(packages))
+    assert [] == parsed
+    assert 'new.py' in _zipped(packages / 'demo.zip')
+
+
+def test_zip_replaced(packages):
+    update(str(packages))
+    zipfile.ZipFile(str(packages / 'demo.zip'), 'w').close()
+    assert ([], False, [str(packages / 'demo.zip')]) == update(str(packages))
+    assert 'demo.py' in _zipped(packages / 'demo.zip')
+
+
+def test_main(packages, capsys):
+    main([str(packages)])
+    capsys.readouterr()
+    main([str(packages)])
+    assert 'Everything is up to date.' in capsys.readouterr().out
+    zipfile.ZipFile(str(packages / 'demo.zip'), 'w').close()
+    main([str(packages)])
+    assert 'Everything is up to date.' not in capsys.readouterr().out
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""Tests regarding the app zip builder.
+"""
+import os
+import zipfile
+import pytest
+from mkzip import package_files, read_file_patterns, zip_path, build_zip, build_all, main, TIMESTAMP
+
+_MANIFEST = """\
+[app]
+name: Demo
+exec: demo.py
+version: 1.0
+"""
+
+_FILES = """
+[files]
+include: *.py icon.png manifest scripts
+exclude: bench*.py
+"""
+
+
+@pytest.fixture
+def app(tmp_path):
+    app_dir = tmp_path / 'demo'
+    app_dir.mkdir()
+    (app_dir / 'manifest').write_text(_MANIFEST + _FILES)
+    (app_dir / 'demo.py').write_text('print("hello")\n' * 100)
+    (app_dir / 'benchmark.py').write_text('pass\n')
+    (app_dir / 'icon.png').write_bytes(b'\x89PNG\r\n\x1a\n' + b'\0' * 1000)
+    (app_dir / 'icon.svg').write_text('<svg/>\n')
+    (app_dir / 'scripts').mkdir()
+    (app_dir / 'scripts' / 'run').write_text('#!/bin/sh\n')
+    os.chmod(str(app_dir / 'scripts' / 'run'), 0o755)
+    (app_dir / 'scripts' / '__pycache__').mkdir()
+    (app_dir / 'scripts' / '__pycache__' / 'x.pyc').write_bytes(b'')
+    return app_dir
+
+
+def test_read_file_patterns(app):
+    assert (['*.py', 'icon.png', 'manifest', 'scripts'], ['bench*.py']) == \
+        read_file_patterns(str(app / 'manifest'))
+    (app / 'manifest').write_text(_MANIFEST)
+    assert read_file_patterns(str(app / 'manifest')) is None
+
+
+def test_package_files(app):
+    assert ['demo.py', 'icon.png', 'manifest', 'scripts/run'] == package_files(str(app))
+
+
+def test_package_files_without_section(app):
+    (app / 'manifest').write_text(_MANIFEST)
+    assert ['benchmark.py', 'demo.py', 'icon.png', 'icon.svg', 'manifest', 'scripts/run'] == \
+        package_files(str(app))
+
+
+def test_zip_path():
+    assert os.path.join('p', 'demo.zip') == zip_path('p', 'demo')
+    assert os.path.join('p', 'config', 'config.zip') == zip_path('p', 'config')
+
+
+def test_build_zip(app, tmp_path):
+    path = str(tmp_path / 'demo.zip')
+    assert path == build_zip(str(app), package_files(str(app)), path)
+    with zipfile.ZipFile(path) as zf:
+        infos = zf.infolist()
+        assert ['demo.py', 'icon.png', 'manifest', 'scripts/run'] == [i.filename for i in infos]
+        assert all(i.date_time == TIMESTAMP for i in infos)
+        types = dict((i.filename, i.compress_type) for i in infos)
+        assert zipfile.ZIP_DEFLATED == types['demo.py']
+        assert zipfile.ZIP_STORED == types['icon.png']
+        modes = dict((i.filename, (i.external_attr >> 16) & 0o777) for i in infos)
+        assert 0o755 == modes['scripts/run']
+        assert 0o644 == modes['demo.py']
+        assert (app / 'demo.py').read_bytes() == zf.read('demo.py')
+    assert ['demo.zip'] == [p.name for p in tmp_path.glob('*.zip*')]
+
+
+def test_reproducible(app, tmp_path):
+    files = package_files(str(app))
+    first = build_zip(str(app), files, str(tmp_path / 'first.zip'))
+    # the times of the files don't matter
+    os.utime(str(app / 'demo.py'), (0, 0))
+    second = build_zip(str(app), list(reversed(files)), str(tmp_path / 'second.zip'))
+    with open(first, 'rb') as f1, open(second, 'rb') as f2:
+        assert f1.read() == f2.read()
+
+
+def test_build_all(app, tmp_path):
+    jobs = [(str(app), package_files(str(app)), str(tmp_path / (n + '.zip'))) for n in ('a', 'b', 'c')]
+    paths = build_all(jobs, 2)
+    assert [j[2] for j in jobs] == paths
+    contents = set()
+    for path in paths:
+        with open(path, 'rb') as f:
+            contents.add(f.read())
+    assert 1 == len(contents)
+
+
+def test_main(app, tmp_path):
+    assert 0 == main(['--directory', str(tmp_path), '--jobs', '1', 'demo'])
+    assert (tmp_path / 'demo.zip').exists()
+    with pytest.raises(SystemExit):
+        main(['--directory', str(tmp_path), 'nothing'])